@@ -1,9 +1,12 @@
 from flask import Flask
 from flask_login import LoginManager
 from .utils.gpio_utils import GPIOManager
-from .controllers.pump_controller import PumpController
-from .controllers import Controller
+from .controllers import Controller, pump_controller
+from .utils.config_utils import CONTROL_REMOTE, load_secret_key
 from .utils.user_manager import UserManager
+from .utils.api_tokens import load_user_from_request
+from .utils import assets
+from .utils.assets import asset_urls
 from .routes.alert_routes import bp as alerts_api_bp
 from .routes.alerts_config import bp as alerts_config_ui_bp
 from .routes.diagnostic_routes import diagnostics_bp
@@ -14,8 +17,6 @@ from .utils.template_helpers import (
     format_timestamp, get_state_color
 )
 
-# Initialize singleton controller
-pump_controller = PumpController()
 login_manager = LoginManager()
 
 def create_app():
@@ -24,7 +25,8 @@ def create_app():
                 static_folder='static')
 
     app.config['TEMPLATES_AUTO_RELOAD'] = True
-    app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this!
+    # Persisted so sessions survive restarts and are shared by all workers
+    app.config['SECRET_KEY'] = load_secret_key()
 
     # Initialize Flask-Login
     login_manager.init_app(app)
@@ -37,9 +39,17 @@ def create_app():
     def load_user(user_id):
         return UserManager.get_user_by_id(int(user_id))
 
+    # Machine clients authenticate API calls with signed bearer tokens
+    login_manager.request_loader(load_user_from_request)
+
     with app.app_context():
-        # Initialize hardware
-        GPIOManager.initialize()
+        if CONTROL_REMOTE:
+            # Hardware belongs to the controller process, follow its state
+            from .services.control_service import StateSegmentMirror
+            StateSegmentMirror().start()
+        else:
+            # Initialize hardware
+            GPIOManager.initialize()
 
         # Register blueprints
         from .routes.main_routes import bp as main_bp
@@ -57,13 +67,17 @@ def create_app():
 
         app.register_blueprint(diagnostics_bp, url_prefix='/api/diagnostics')
 
+    # Fingerprinted static bundles, see tools/build_assets.py
+    assets.init_app(app)
+
     @app.context_processor
     def inject_template_helpers():
         return {
             'format_duration': format_duration,
             'format_volume': format_volume,
             'format_timestamp': format_timestamp,
-            'get_state_color': get_state_color
+            'get_state_color': get_state_color,
+            'asset_urls': asset_urls
         }
 
     # Register the stats blueprint
@@ -9,16 +9,36 @@ from app.models.tank_state import TankState
 from app.utils.config_utils import *
 from .interfaces import *
 
-# Create instances
-pump_controller = PumpController()
-mode_controller = ModeController()
+from app.utils.config_utils import CONTROL_REMOTE
+from app.utils.stats_manager import StatsManager
+from app.services.notification_service import NotificationService
 
-# Connect controllers
-mode_controller.set_pump_controller(pump_controller)
-pump_controller.set_mode_controller(mode_controller)
+if CONTROL_REMOTE:
+    # The controller process (run_controller.py) owns GPIO, stats and
+    # notifications; this process reaches it through RPC proxies.
+    from app.services.control_service import ControlClient, RemoteProxy, StatsProxy
 
-# Force initial config reload
-ConfigManager.reload_config()
+    _control_client = ControlClient()
+    pump_controller = RemoteProxy(_control_client, 'pump')
+    mode_controller = RemoteProxy(_control_client, 'mode')
+    gpio_manager = RemoteProxy(_control_client, 'gpio')
+    stats_manager = StatsProxy(_control_client)
+    notification_service = RemoteProxy(_control_client, 'notifications')
+else:
+    # Create instances
+    pump_controller = PumpController()
+    mode_controller = ModeController()
+
+    # Connect controllers
+    mode_controller.set_pump_controller(pump_controller)
+    pump_controller.set_mode_controller(mode_controller)
+
+    gpio_manager = GPIOManager
+    stats_manager = StatsManager
+    notification_service = NotificationService()
+
+    # Force initial config reload
+    ConfigManager.reload_config()
 
 
 __all__ = [
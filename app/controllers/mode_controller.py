@@ -1,3 +1,4 @@
+import threading
 from app.controllers.interfaces import IModeController
 from app.models.tank_state import TankState
 from app.services.notification_service import NotificationService
@@ -5,92 +6,146 @@ from app.controllers.mode_handlers.summer_handler import SummerModeHandler
 from app.controllers.mode_handlers.winter_handler import WinterModeHandler
 from app.controllers.mode_handlers.changeover_handler import ChangeoverModeHandler
 from app.utils.gpio_utils import GPIOManager
+from app.utils.config_utils import ConfigManager
 
 class ModeController(IModeController):
+    """Routes control to the handler of the current mode
+
+    Mode changes, manual pump commands and the control loop's handler calls
+    are serialized on _lock, since handlers keep state between calls.
+    Status readers do not take the lock and read each attribute only once.
+    """
+
     def __init__(self):
         self._current_mode = "SUMMER"
         self._pump_controller = None
         self._notification_service = None
         self._handlers = {}
         self._current_handler = None
+        self._lock = threading.RLock()
 
     def set_pump_controller(self, controller):
         """Set pump controller and initialize handlers"""
-        self._pump_controller = controller
-        self._notification_service = NotificationService()
-        
-        # Initialize mode handlers
-        self._handlers = {
-            "SUMMER": SummerModeHandler(self._pump_controller, self._notification_service),
-            "WINTER": WinterModeHandler(self._pump_controller, self._notification_service),
-            "CHANGEOVER": ChangeoverModeHandler(self._pump_controller, self._notification_service)
-        }
-        
-        # Set initial handler
-        self._current_handler = self._handlers.get(self._current_mode)
-        if self._current_handler:
-            self._current_handler.on_mode_enter()
+        with self._lock:
+            self._pump_controller = controller
+            self._notification_service = NotificationService()
+            self._notification_service.start()
+
+            # Initialize mode handlers
+            self._handlers = {
+                "SUMMER": SummerModeHandler(self._pump_controller, self._notification_service),
+                "WINTER": WinterModeHandler(self._pump_controller, self._notification_service),
+                "CHANGEOVER": ChangeoverModeHandler(self._pump_controller, self._notification_service)
+            }
+
+            # Set initial handler
+            self._current_handler = self._handlers.get(self._current_mode)
+            if self._current_handler:
+                self._current_handler.on_mode_enter()
 
     def get_current_mode(self) -> str:
         return self._current_mode
 
+    def set_manual_well_pump(self, running: bool) -> dict:
+        """Manually set the well pump, through the changeover handler in CHANGEOVER mode"""
+        with self._lock:
+            if self._current_mode == 'CHANGEOVER':
+                return self._handlers['CHANGEOVER'].set_manual_well_pump(running)
+            return self._pump_controller.set_well_pump(running)
+
+    def set_winter_low_timeout(self, timeout: int) -> dict:
+        """Set how long the winter tank may stay LOW, in seconds"""
+        ConfigManager.set_value('winter_low_timeout', timeout)
+        return {
+            'status': 'success',
+            'message': f'Winter mode low state timeout set to {timeout} seconds'
+        }
+
+    def get_handler_info(self) -> dict:
+        """Get current mode handler details for diagnostics"""
+        handler = self._current_handler
+        current_mode = self._current_mode
+        handler_state = None
+        if handler and current_mode == 'WINTER' and hasattr(handler, 'get_handler_state'):
+            handler_state = handler.get_handler_state()
+        return {
+            'current_mode': current_mode,
+            'handler_active': handler is not None,
+            'handler_type': type(handler).__name__ if handler else None,
+            'handler_state': handler_state
+        }
+
+    def get_mode_specific_status(self) -> dict:
+        """Get status details specific to the current mode"""
+        if self._current_mode == 'WINTER':
+            config = ConfigManager.get_config()
+            handler = self._current_handler
+            return {
+                'low_timeout': config.get('winter_low_timeout', 300),
+                # The handler may still be switching over to winter mode
+                'low_state_active': getattr(handler, '_low_state_time', None) is not None
+            }
+        return {}
+
     def request_mode_change(self, new_mode: str, confirm: bool = False):
         """Handle mode change requests"""
-        print(f"Mode change request: new_mode={new_mode}, confirm={confirm}")
+        with self._lock:
+            print(f"Mode change request: new_mode={new_mode}, confirm={confirm}")
         
-        if new_mode not in ["SUMMER", "WINTER", "CHANGEOVER"]:
-            print(f"Invalid mode specified: {new_mode}")
-            return {"status": "error", "message": "Invalid mode specified"}
+            if new_mode not in ["SUMMER", "WINTER", "CHANGEOVER"]:
+                print(f"Invalid mode specified: {new_mode}")
+                return {"status": "error", "message": "Invalid mode specified"}
 
-        if new_mode == self._current_mode:
-            print(f"System is already in {new_mode} mode")
-            return {"status": "error", "message": f"System is already in {new_mode} mode"}
+            if new_mode == self._current_mode:
+                print(f"System is already in {new_mode} mode")
+                return {"status": "error", "message": f"System is already in {new_mode} mode"}
 
-        if confirm:
-            print(f"Confirming mode change from {self._current_mode} to {new_mode}")
-            # Exit current mode handler
-            if self._current_handler:
-                print(f"Exiting current handler: {type(self._current_handler).__name__}")
-                try:
-                    self._current_handler.on_mode_exit()
-                except Exception as e:
-                    print(f"Error exiting current mode: {e}")
-                    import traceback
-                    print(traceback.format_exc())
-
-            self._current_mode = new_mode
+            if confirm:
+                print(f"Confirming mode change from {self._current_mode} to {new_mode}")
+                # Exit current mode handler
+                if self._current_handler:
+                    print(f"Exiting current handler: {type(self._current_handler).__name__}")
+                    try:
+                        self._current_handler.on_mode_exit()
+                    except Exception as e:
+                        print(f"Error exiting current mode: {e}")
+                        import traceback
+                        print(traceback.format_exc())
+
+                self._current_mode = new_mode
         
-        # Enter new mode handler
-            self._current_handler = self._handlers.get(new_mode)
-            if self._current_handler:
-                print(f"Entering new handler: {type(self._current_handler).__name__}")
-                try:
-                    self._current_handler.on_mode_enter()
-                except Exception as e:
-                    print(f"Error entering new mode: {e}")
-                    import traceback
-                    print(traceback.format_exc())
-
-            return {"status": "success", "message": f"Mode changed to {new_mode}"}
-        else:
-            print(f"Requesting confirmation for mode change to {new_mode}")
-            return {
-                "status": "confirm",
-                "message": f"Please confirm changing to {new_mode} mode",
-                "data": {"new_mode": new_mode}
-            }
+            # Enter new mode handler
+                self._current_handler = self._handlers.get(new_mode)
+                if self._current_handler:
+                    print(f"Entering new handler: {type(self._current_handler).__name__}")
+                    try:
+                        self._current_handler.on_mode_enter()
+                    except Exception as e:
+                        print(f"Error entering new mode: {e}")
+                        import traceback
+                        print(traceback.format_exc())
+
+                return {"status": "success", "message": f"Mode changed to {new_mode}"}
+            else:
+                print(f"Requesting confirmation for mode change to {new_mode}")
+                return {
+                    "status": "confirm",
+                    "message": f"Please confirm changing to {new_mode} mode",
+                    "data": {"new_mode": new_mode}
+                }
 
     def handle_mode_controls(self, tank_state):
         """Route control to appropriate mode handler"""
-        try:
-            print(f"Mode controller handling tank state: {tank_state.state} in mode: {self._current_mode}")
+        with self._lock:
+            try:
+                print(f"Mode controller handling tank state: {tank_state.state} in mode: {self._current_mode}")
         
-            if self._current_handler:
-                print(f"Routing to handler: {type(self._current_handler).__name__}")
-                self._current_handler.handle(tank_state)
-            else:
-                print(f"No handler for current mode: {self._current_mode}")
-        except Exception as e:
-            print(f"Error in mode controller: {e}")
-            import traceback
-            print(traceback.format_exc())
+                if self._current_handler:
+                    print(f"Routing to handler: {type(self._current_handler).__name__}")
+                    self._current_handler.handle(tank_state)
+                else:
+                    print(f"No handler for current mode: {self._current_mode}")
+            except Exception as e:
+                print(f"Error in mode controller: {e}")
+                import traceback
+                print(traceback.format_exc())
@@ -6,11 +6,15 @@ from app.utils.config_utils import (
     SUMMER_HIGH, SUMMER_LOW, SUMMER_EMPTY,
     WINTER_HIGH, WINTER_LOW
 )
+from .condition_tracker import ConditionTracker
 
 class BaseModeHandler(ABC):
     def __init__(self, pump_controller, notification_service):
         self.pump_controller = pump_controller
         self.notification_service = notification_service
+        # Alerts for conditions checked every tick go through here, so they
+        # fire on change rather than on every tick
+        self.conditions = ConditionTracker(notification_service)
 
     def get_tank_states(self) -> dict:
         """Get current states of all tank sensors"""
@@ -3,6 +3,9 @@ from .base_handler import BaseModeHandler
 from app.models.tank_state import TankState
 from app.utils.notification_config import AlertType
 
+# Seconds between repeats of a tank alert while the condition holds
+TANK_ALERT_REMINDER_SECONDS = 3600
+
 class ChangeoverModeHandler(BaseModeHandler):
     def __init__(self, pump_controller, notification_service):
         super().__init__(pump_controller, notification_service)
@@ -15,6 +18,7 @@ class ChangeoverModeHandler(BaseModeHandler):
         # Ensure well pump is off initially
         self.pump_controller.set_well_pump(False)
         self._manual_well_pump_state = False
+        self.conditions.reset()
         self.notification_service.send_alert(
             AlertType.MODE_CHANGE,
             "Entered changeover mode - distribution pump started",
@@ -27,27 +31,35 @@ class ChangeoverModeHandler(BaseModeHandler):
         self.pump_controller.set_well_pump(False)
         self.pump_controller.set_distribution_pump(False)
         self._manual_well_pump_state = False
+        self.conditions.reset()
 
     def handle(self, tank_state: TankState):
         """In changeover mode, we only monitor states but don't control pumps automatically"""
         # Monitor both tanks' states for notifications
-        summer_states = self.get_tank_states()['summer']
-        winter_states = self.get_tank_states()['winter']
+        tank_states = self.get_tank_states()
+        summer_states = tank_states['summer']
+        winter_states = tank_states['winter']
 
-        # Log critical states
-        if summer_states['empty'] and not summer_states['low']:
-            self.notification_service.send_alert(
-                AlertType.TANK_EMPTY,
-                "Summer tank is empty in changeover mode",
-                {"Tank": "Summer"}
-            )
+        # Alert when a critical state starts, with reminders while it lasts
+        self.conditions.update(
+            'summer_empty',
+            summer_states['empty'] and not summer_states['low'],
+            AlertType.TANK_EMPTY,
+            "Summer tank is empty in changeover mode",
+            {"Tank": "Summer"},
+            reminder_seconds=TANK_ALERT_REMINDER_SECONDS,
+            clear_message="Summer tank is no longer empty in changeover mode"
+        )
 
-        if not winter_states['low']:
-            self.notification_service.send_alert(
-                AlertType.TANK_LOW,
-                "Winter tank is low in changeover mode",
-                {"Tank": "Winter"}
-            )
+        self.conditions.update(
+            'winter_low',
+            not winter_states['low'],
+            AlertType.TANK_LOW,
+            "Winter tank is low in changeover mode",
+            {"Tank": "Winter"},
+            reminder_seconds=TANK_ALERT_REMINDER_SECONDS,
+            clear_message="Winter tank is no longer low in changeover mode"
+        )
 
     def set_manual_well_pump(self, state: bool) -> dict:
         """Handle manual well pump control"""
@@ -0,0 +1,106 @@
+import time
+
+# Seconds between attempts at an alert the notification service did not
+# queue, e.g. because its type was rate limited
+UNSENT_RETRY_SECONDS = 10
+
+
+class ConditionTracker:
+    """Edge-triggered alerts for conditions checked on every control tick
+
+    Handlers call update() each tick with whether a condition holds. An
+    alert is sent when the condition becomes true and, if asked for, again
+    every reminder interval while it holds and once when it clears. Each
+    condition keeps a single [active, since, last alert, next attempt]
+    entry, so a steady condition costs a couple of comparisons per tick and
+    sends nothing.
+
+    An alert only counts as sent once the notification service queued it.
+    A condition whose start alert was not queued (say it re-entered within
+    the rate limit of its last clear) stays un-alerted and is retried every
+    UNSENT_RETRY_SECONDS until it goes out.
+    """
+
+    def __init__(self, notification_service):
+        self.notification_service = notification_service
+        self._conditions = {}  # name -> [active, since, last alert time or None, next attempt]
+
+    def update(self, name, active, alert_type, message, data=None,
+               reminder_seconds=None, clear_message=None):
+        """Record whether a condition holds, alerting on its edges
+
+        Args:
+            name: Key of the condition, unique within the handler
+            active: Whether the condition holds on this tick
+            alert_type: AlertType sent for the condition
+            message: Alert message when the condition starts (and for reminders)
+            data: Optional alert details
+            reminder_seconds: Repeat the alert this often while the
+                condition holds, or None for no reminders
+            clear_message: Alert message sent when an alerted condition
+                clears, or None to clear silently
+
+        Returns:
+            True if an alert was queued
+        """
+        state = self._conditions.get(name)
+        if state is None:
+            state = self._conditions[name] = [False, None, None, 0.0]
+
+        if active == state[0]:
+            # Steady: only an active condition that is unsent or due a reminder has work to do
+            if not active:
+                return False
+            if state[2] is not None:
+                if reminder_seconds is None:
+                    return False
+                now = time.monotonic()
+                if now - state[2] < reminder_seconds:
+                    return False
+                minutes = int((now - state[1]) / 60)
+                text = f"{message} (ongoing for {minutes} min)"
+            else:
+                now = time.monotonic()
+                text = message
+            if now < state[3]:
+                return False
+            return self._alert(state, now, alert_type, text, data)
+
+        now = time.monotonic()
+        if active:
+            state[:] = [True, now, None, 0.0]
+            return self._alert(state, now, alert_type, message, data)
+
+        alerted = state[2] is not None
+        state[:] = [False, None, None, 0.0]
+        if clear_message is not None and alerted:
+            return self._send(alert_type, clear_message, data)
+        return False
+
+    def _alert(self, state, now, alert_type, message, data):
+        """Send an alert for an active condition, recording whether it was queued"""
+        if self._send(alert_type, message, data):
+            state[2] = now
+            return True
+        state[3] = now + UNSENT_RETRY_SECONDS
+        return False
+
+    def _send(self, alert_type, message, data):
+        try:
+            return bool(self.notification_service.send_alert(alert_type, message, data))
+        except Exception as e:
+            print(f"Error sending notification: {e}")
+            return False
+
+    def is_active(self, name):
+        state = self._conditions.get(name)
+        return bool(state and state[0])
+
+    def get_active(self):
+        """Get the active conditions and how many seconds each has held"""
+        now = time.monotonic()
+        return {name: now - state[1] for name, state in self._conditions.items() if state[0]}
+
+    def reset(self):
+        """Forget all conditions, so those still holding alert again on the next tick"""
+        self._conditions.clear()
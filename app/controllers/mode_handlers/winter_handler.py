@@ -19,6 +19,7 @@ class WinterModeHandler(BaseModeHandler):
         self._pump_started_from_low = False
         self._last_state = None
         self._low_state_time = None
+        self.conditions.reset()
         # Start with pumps off
         self.pump_controller.set_well_pump(False)
         self.pump_controller.set_distribution_pump(True)
@@ -28,6 +29,7 @@ class WinterModeHandler(BaseModeHandler):
         """Cleanup when exiting winter mode"""
         self.pump_controller.set_well_pump(False)
         self.pump_controller.set_distribution_pump(False)
+        self.conditions.reset()
         print("Exited winter mode")
 
     def handle(self, tank_state):
@@ -53,6 +55,7 @@ class WinterModeHandler(BaseModeHandler):
                     return
             
             # Keep track of last state for state change detection
+            previous_state = self._last_state
             if self._last_state != current_state:
                 print(f"State CHANGED from {self._last_state} to {current_state}")
                 self._last_state = current_state
@@ -63,6 +66,16 @@ class WinterModeHandler(BaseModeHandler):
             current_pump_state = self.pump_controller.get_well_pump_state()
             print(f"Current pump state: {'ON' if current_pump_state else 'OFF'}")
 
+            # Alert once when the tank enters ERROR, not on every tick in it
+            self.conditions.update(
+                'winter_error',
+                current_state == 'ERROR',
+                AlertType.TANK_ERROR,
+                "Winter tank in ERROR state",
+                {"previous_state": previous_state, "pump_state": current_pump_state},
+                clear_message="Winter tank recovered from ERROR state"
+            )
+
             # Handle pump control based on tank state
             if current_state == 'LOW':
                 if not self._pump_started_from_low:
@@ -98,14 +111,6 @@ class WinterModeHandler(BaseModeHandler):
                 print(f"Pump emergency stop result: {result}")
                 self._pump_started_from_low = False
                 self._low_state_time = None
-                self.notification_service.send_alert(
-                    AlertType.TANK_ERROR,
-                    "Winter tank in ERROR state",
-                    {
-                        "previous_state": self._last_state,
-                        "pump_state": self.pump_controller.get_well_pump_state()
-                    }
-                )
         
             # Verify final state
             final_pump_state = self.pump_controller.get_well_pump_state()
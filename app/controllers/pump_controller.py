@@ -7,9 +7,20 @@ from app.controllers.interfaces import IPumpController
 from typing import Dict, Any
 # Add this to your imports
 from app.utils.stats_manager import StatsManager
+from app.utils.tick_archive import TickArchive
+from app.utils.config_utils import SUMMER_HIGH, SUMMER_LOW, SUMMER_EMPTY, WINTER_HIGH, WINTER_LOW
+from app.services.state_publisher import StatePublisher
 import time
 
 class PumpController(IPumpController):
+    """Owns the control loop thread and the pump outputs
+
+    Threading rules: the loop's bookkeeping (_well_running, _last_*_update)
+    is only touched by the control thread. Pump outputs are changed by both
+    the control thread and request threads, so set_* hold _output_lock to
+    make check-then-set atomic. Never call into ModeController while holding
+    it; the lock order is ModeController -> PumpController -> GPIOManager.
+    """
     _instance = None
 
     def __new__(cls):
@@ -33,6 +44,8 @@ class PumpController(IPumpController):
         
             self.running = False
             self.pump_thread = None
+            self._thread_lock = threading.Lock()
+            self._output_lock = threading.RLock()
             self._last_state = None
             self._state_timestamp = 0
             self.mode_controller = None
@@ -80,22 +93,35 @@ class PumpController(IPumpController):
 
     def start(self):
         """Start the pump controller thread"""
-        if not self.running:
-            try:
-                self.running = True
-                self.pump_thread = threading.Thread(target=self._control_loop, daemon=True)
-                self.pump_thread.start()
-                print("Pump controller thread started")
-                return True
-            except Exception as e:
-                print(f"Error starting pump controller: {e}")
-                return False
-        return True
+        # Request threads may race here through get_system_state()
+        with self._thread_lock:
+            if not self.is_running:
+                try:
+                    self.running = True
+                    self.pump_thread = threading.Thread(target=self._control_loop, daemon=True)
+                    self.pump_thread.start()
+                    print("Pump controller thread started")
+                    return True
+                except Exception as e:
+                    print(f"Error starting pump controller: {e}")
+                    self.running = False
+                    return False
+            return True
+
+    def stop(self, timeout=5):
+        """Stop the pump controller thread"""
+        with self._thread_lock:
+            self.running = False
+            thread = self.pump_thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+        print("Pump controller thread stopped")
 
     def _control_loop(self):
         """Main control loop"""
         print("Starting pump controller loop")
-        while self.running:
+        # A restart replaces pump_thread, which retires this loop
+        while self.running and self.pump_thread is threading.current_thread():
             try:
                 # Create current tank states based on mode
                 current_mode = self.mode_controller.get_current_mode() if self.mode_controller else "WINTER"
@@ -126,19 +152,41 @@ class PumpController(IPumpController):
                 current_dist_running = self.get_distribution_pump_state()
                 current_time = time.time()
 
-                # Update well pump stats if state has changed or pump is running
-                if current_well_running != self._well_running or current_well_running:
-                    elapsed = current_time - self._last_well_update
-                    StatsManager.update_pump_stats('well_pump', current_well_running, elapsed)
-                    self._last_well_update = current_time
-                    self._well_running = current_well_running
-
-                # Update distribution pump stats if state has changed or pump is running
-                if current_dist_running != self._dist_running or current_dist_running:
-                    elapsed = current_time - self._last_dist_update
-                    StatsManager.update_pump_stats('dist_pump', current_dist_running, elapsed)
-                    self._last_dist_update = current_time
-                    self._dist_running = current_dist_running
+                # Archive the raw levels of this tick
+                TickArchive.record_tick(
+                    current_time,
+                    TickArchive.encode_inputs({
+                        SUMMER_HIGH: tank_state.summer_high,
+                        SUMMER_LOW: tank_state.summer_low,
+                        SUMMER_EMPTY: tank_state.summer_empty,
+                        WINTER_HIGH: tank_state.winter_high,
+                        WINTER_LOW: tank_state.winter_low
+                    }),
+                    TickArchive.encode_outputs(current_well_running, current_dist_running),
+                    current_mode
+                )
+
+                # Publish both pump updates to readers as a single snapshot
+                with StatsManager.batch():
+                    # Record pump cycles on ON/OFF transitions
+                    self._track_pump_cycle('well_pump', self._well_running, current_well_running,
+                                           current_mode, tank_state.state)
+                    self._track_pump_cycle('dist_pump', self._dist_running, current_dist_running,
+                                           current_mode, tank_state.state)
+
+                    # Update well pump stats if state has changed or pump is running
+                    if current_well_running != self._well_running or current_well_running:
+                        elapsed = current_time - self._last_well_update
+                        StatsManager.update_pump_stats('well_pump', current_well_running, elapsed)
+                        self._last_well_update = current_time
+                        self._well_running = current_well_running
+
+                    # Update distribution pump stats if state has changed or pump is running
+                    if current_dist_running != self._dist_running or current_dist_running:
+                        elapsed = current_time - self._last_dist_update
+                        StatsManager.update_pump_stats('dist_pump', current_dist_running, elapsed)
+                        self._last_dist_update = current_time
+                        self._dist_running = current_dist_running
 
                 # Update cached state
                 current_state = {
@@ -155,6 +203,9 @@ class PumpController(IPumpController):
                 # Log current system state
                 print(
                     f"Current system state: well={current_state['well_pump']['state']}, dist={current_state['dist_pump']['state']}")
+                # Publish the full state for push streams and API readers
+                self.publish_state()
+
                 print("=== End Control Loop Iteration ===")
 
                 time.sleep(1)
@@ -165,56 +216,68 @@ class PumpController(IPumpController):
                 print(traceback.format_exc())
                 time.sleep(1)
 
+    def _track_pump_cycle(self, pump_name, was_running, is_running, mode, tank_state):
+        """Start or finish a pump cycle record when a pump changes state"""
+        try:
+            if is_running and not was_running:
+                StatsManager.start_pump_cycle(pump_name, mode, tank_state)
+            elif was_running and not is_running:
+                StatsManager.end_pump_cycle(pump_name, tank_state)
+        except Exception as e:
+            print(f"Error tracking {pump_name} cycle: {e}")
+
     def set_well_pump(self, state: bool) -> dict:
         """Set well pump state"""
-        try:
-            print("\n=== Setting Well Pump State ===")
-            print(f"Requested State: {state}")
+        with self._output_lock:
+            try:
+                print("\n=== Setting Well Pump State ===")
+                print(f"Requested State: {state}")
         
-            current_state = GPIOManager.get_pump_state(WELL_PUMP)
-            print(f"Current State: {current_state}")
+                current_state = GPIOManager.get_pump_state(WELL_PUMP)
+                print(f"Current State: {current_state}")
         
-            if current_state == state:
-                print("Pump already in requested state")
-                return {
-                    'status': 'success',
-                    'pump_running': current_state,
-                    'message': 'Pump already in requested state'
-                }
+                if current_state == state:
+                    print("Pump already in requested state")
+                    return {
+                        'status': 'success',
+                        'pump_running': current_state,
+                        'message': 'Pump already in requested state'
+                    }
         
-            print("Setting new pump state...")
-            success = GPIOManager.set_pump(WELL_PUMP, state)
-            actual_state = GPIOManager.get_pump_state(WELL_PUMP)
+                print("Setting new pump state...")
+                success = GPIOManager.set_pump(WELL_PUMP, state)
+                actual_state = GPIOManager.get_pump_state(WELL_PUMP)
         
-            print(f"Set Pump Result:")
-            print(f"  Success: {success}")
-            print(f"  Actual State: {actual_state}")
-            print(f"  Requested State: {state}")
-            print("=== End Setting Well Pump ===\n")
+                print(f"Set Pump Result:")
+                print(f"  Success: {success}")
+                print(f"  Actual State: {actual_state}")
+                print(f"  Requested State: {state}")
+                print("=== End Setting Well Pump ===\n")
         
-            return {
-                'status': 'success' if success and actual_state == state else 'error',
-                'pump_running': actual_state,
-                'message': 'Pump state changed successfully' if success else 'Failed to change pump state'
-            }
-        except Exception as e:
-            print(f"Error controlling well pump: {e}")
-            import traceback
-            print(traceback.format_exc())
-            return {'status': 'error', 'message': str(e)}
+                return {
+                    'status': 'success' if success and actual_state == state else 'error',
+                    'pump_running': actual_state,
+                    'message': 'Pump state changed successfully' if success else 'Failed to change pump state'
+                }
+            except Exception as e:
+                print(f"Error controlling well pump: {e}")
+                import traceback
+                print(traceback.format_exc())
+                return {'status': 'error', 'message': str(e)}
 
     def set_distribution_pump(self, state: bool) -> dict:
         """Set distribution pump state"""
-        try:
-            GPIOManager.set_pump(DIST_PUMP, state)
-            actual_state = GPIOManager.get_pump_state(DIST_PUMP)
-            return {
-                'status': 'success' if actual_state == state else 'error',
-                'pump_running': actual_state
-            }
-        except Exception as e:
-            print(f"Error controlling distribution pump: {e}")
-            return {'status': 'error', 'message': str(e)}
+        with self._output_lock:
+            try:
+                GPIOManager.set_pump(DIST_PUMP, state)
+                actual_state = GPIOManager.get_pump_state(DIST_PUMP)
+                return {
+                    'status': 'success' if actual_state == state else 'error',
+                    'pump_running': actual_state
+                }
+            except Exception as e:
+                print(f"Error controlling distribution pump: {e}")
+                return {'status': 'error', 'message': str(e)}
 
     def get_well_pump_state(self) -> bool:
         """Get current well pump state"""
@@ -307,6 +370,88 @@ class PumpController(IPumpController):
                 'tank_state': {'state': 'ERROR'}
             }
 
+    def get_diagnostics(self) -> dict:
+        """Get controller thread details for diagnostics"""
+        return {
+            'initialized': self._initialized,
+            'running': bool(self.is_running),
+            'thread_active': bool(self.pump_thread and self.pump_thread.is_alive()),
+            'last_system_state': self._last_state
+        }
+
+    def read_tank_state(self, name: str) -> dict:
+        """Read a tank's state and raw sensor values from GPIO
+
+        Args:
+            name: 'Summer' or 'Winter'
+        """
+        tank = TankState(name)
+        tank.update_from_sensors(GPIOManager)
+        return {
+            'name': tank.name,
+            'state': tank.state,
+            'summer_high': tank.summer_high,
+            'summer_low': tank.summer_low,
+            'summer_empty': tank.summer_empty,
+            'winter_high': tank.winter_high,
+            'winter_low': tank.winter_low
+        }
+
+    def get_gpio_states(self) -> dict:
+        """Get raw GPIO states of all sensors and pumps"""
+        return {
+            'summer_tank': {
+                'high': self._sensor_gpio_state(SUMMER_HIGH),
+                'low': self._sensor_gpio_state(SUMMER_LOW),
+                'empty': self._sensor_gpio_state(SUMMER_EMPTY)
+            },
+            'winter_tank': {
+                'high': self._sensor_gpio_state(WINTER_HIGH),
+                'low': self._sensor_gpio_state(WINTER_LOW)
+            },
+            'pumps': {
+                'well': {
+                    'pin': WELL_PUMP,
+                    'value': GPIOManager.get_pump_state(WELL_PUMP),
+                    'reverse_mode': GPIOManager.get_well_pump_reverse_state(),
+                    'output_inverted': GPIOManager.get_well_output_invert_state()
+                },
+                'distribution': {
+                    'pin': DIST_PUMP,
+                    'value': GPIOManager.get_pump_state(DIST_PUMP)
+                }
+            }
+        }
+
+    @staticmethod
+    def _sensor_gpio_state(pin):
+        value = GPIOManager.get_sensor_state(pin)
+        return {
+            'pin': pin,
+            'raw_value': value,
+            'inverted_value': not value
+        }
+
+    def build_state(self) -> dict:
+        """Build the complete state served by /api/state"""
+        state = self.get_system_state()
+        state['current_mode'] = self.mode_controller.get_current_mode() if self.mode_controller else None
+        state['mode_specific'] = self.mode_controller.get_mode_specific_status() if self.mode_controller else {}
+        state['well_pump_reverse'] = GPIOManager.get_well_pump_reverse_state()
+        state['gpio_states'] = self.get_gpio_states()
+        return state
+
+    def publish_state(self):
+        """Publish the current state to StatePublisher
+
+        Called every control loop iteration, and by routes right after a
+        change so that push clients see it without waiting for the next tick.
+        """
+        try:
+            StatePublisher.publish(self.build_state())
+        except Exception as e:
+            print(f"Error publishing state: {e}")
+
     @property
     def is_running(self):
         """Check if pump controller is running"""
@@ -6,6 +6,15 @@ from ..utils.notification_config import AlertConfig, AlertType, AlertChannel
 # Change the blueprint name to be unique
 bp = Blueprint('alerts_config_api', __name__, url_prefix='/api/alerts')
 
+def _get_channel_health():
+    """Get channel health from the notification service, empty if it can't be reached"""
+    try:
+        from ..controllers import notification_service
+        return notification_service.get_channel_health()
+    except Exception as e:
+        current_app.logger.warning(f"Channel health unavailable: {str(e)}")
+        return {}
+
 @bp.route('/config', methods=['GET'])
 @login_required
 @operator_required
@@ -17,7 +26,8 @@ def get_alert_config():
         
         return jsonify({
             'status': 'success',
-            **alert_config  # Spread the config directly into response
+            **alert_config,  # Spread the config directly into response
+            'channel_health': _get_channel_health()
         })
         
     except Exception as e:
@@ -27,7 +37,8 @@ def get_alert_config():
             'message': str(e),
             'channels': {},
             'alert_types': {},
-            'rate_limits': {}
+            'rate_limits': {},
+            'channel_health': {}
         }), 500
 
 @bp.route('/channels', methods=['POST'])
@@ -117,8 +128,19 @@ def configure_alert_types():
                 
             channel_enums = [AlertChannel(c) for c in channels]
             
+            # Optional digest settings, checked before anything is saved
+            coalesce_window = None
+            if 'coalesce_window' in data:
+                coalesce_window = int(data['coalesce_window'])
+                if coalesce_window < 0:
+                    raise ValueError("Digest window cannot be negative")
+
             config = AlertConfig()
             config.configure_alert(alert_type, channel_enums)
+            if coalesce_window is not None:
+                config.set_coalesce_window(alert_type, coalesce_window)
+            if 'urgent' in data:
+                config.set_urgent(alert_type, bool(data['urgent']))
             
             return jsonify({
                 'status': 'success',
@@ -161,10 +183,11 @@ def test_alert():
                 'message': f'Channel {channel.value} not configured'
             }), 400
             
-        from ..services.notification_service import NotificationService
-        service = NotificationService()
-        success = service.send_test_message(
-            channel,
+        # Sent by the process that delivers alerts, so the test probes and
+        # resets the channel's real circuit breaker and connections
+        from ..controllers import notification_service
+        success = notification_service.send_test_message(
+            channel.value,
             "This is a test message from the Water System Alert Configuration"
         )
         
@@ -184,4 +207,24 @@ def test_alert():
         return jsonify({
             'status': 'error',
             'message': f'Error sending test: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@bp.route('/metrics', methods=['GET'])
+@login_required
+@operator_required
+def get_delivery_metrics():
+    """Get alert queue depth, delivery counts and latency per channel"""
+    try:
+        from ..controllers import notification_service
+        return jsonify({
+            'status': 'success',
+            'channels': notification_service.get_delivery_metrics(),
+            'health': notification_service.get_channel_health(),
+            'mail': notification_service.get_mail_stats()
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error getting alert metrics: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
@@ -1,79 +1,68 @@
-from flask import Blueprint, jsonify, request
+import time
+import threading
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from flask_login import login_required, current_user
 from ..models.user import UserRole, operator_required
-from ..controllers import pump_controller, mode_controller
+from ..controllers import pump_controller, mode_controller, gpio_manager
 from ..utils.config_utils import (
     WELL_PUMP, DIST_PUMP, SUMMER_HIGH, SUMMER_LOW,
     SUMMER_EMPTY, WINTER_HIGH, WINTER_LOW
 )
-from ..utils.gpio_utils import GPIOManager
-from RPi import GPIO
-from ..models.tank_state import TankState
-from ..utils.config_utils import ConfigManager
-from app.models.tank_state import TankState
+from ..services.state_publisher import StatePublisher, SECTIONS
+from ..utils.http_cache import conditional, get_boot_id
+from ..utils.json_utils import dumps_bytes, json_bytes_response
 
 bp = Blueprint('api', __name__)
-diagnostics_bp = Blueprint('diagnostics', __name__, url_prefix='/diagnostics')
+
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 3000
+# Open streams per worker process; each one holds a worker thread. With the
+# long-poll cap this leaves threads free for controls and logins.
+MAX_STREAMS = 6
+_streams = threading.BoundedSemaphore(MAX_STREAMS)
+
+# Long-poll waiters per worker process; each one holds a worker thread
+MAX_STATE_WAITERS = 8
+STATE_WAIT_DEFAULT_SECONDS = 30
+STATE_WAIT_MAX_SECONDS = 60
+_state_waiters = threading.BoundedSemaphore(MAX_STATE_WAITERS)
+
+# Keys of the published state that are not part of the mode status pump_states
+MODE_STATUS_EXCLUDED_KEYS = ('current_mode', 'well_pump_reverse', 'gpio_states', 'mode_specific')
+
+
+def _state_versions():
+    """ETag versions for responses built from the published state"""
+    version = StatePublisher.get_version()
+    return (version,) if version else None
+
+
+def _state_response(name, build=None):
+    """Serve a view of the published state from its cached JSON bytes
+
+    Args:
+        name: Cache key of the view
+        build: Function mapping the state to the response object,
+            default the whole state
+    """
+    if not StatePublisher.get_version():
+        pump_controller.publish_state()
+
+    _, body = StatePublisher.get_encoded(name, build)
+    if body is None:
+        state = pump_controller.build_state()
+        return jsonify(build(state) if build else state)
+    return json_bytes_response(body)
 
 
 @bp.route('/state', methods=['GET'])
 @login_required
+@conditional(_state_versions)
 def get_state():
     """Get current system state"""
     try:
-        # Get basic system state
-        state = pump_controller.get_system_state()
-
-        # Add current mode and well pump reverse state
-        state['current_mode'] = mode_controller.get_current_mode()
-        state['well_pump_reverse'] = GPIOManager.get_well_pump_reverse_state()
-
-        # Add detailed GPIO states
-        state['gpio_states'] = {
-            'summer_tank': {
-                'high': {
-                    'pin': SUMMER_HIGH,
-                    'raw_value': GPIOManager.get_sensor_state(SUMMER_HIGH),
-                    'inverted_value': not GPIOManager.get_sensor_state(SUMMER_HIGH)
-                },
-                'low': {
-                    'pin': SUMMER_LOW,
-                    'raw_value': GPIOManager.get_sensor_state(SUMMER_LOW),
-                    'inverted_value': not GPIOManager.get_sensor_state(SUMMER_LOW)
-                },
-                'empty': {
-                    'pin': SUMMER_EMPTY,
-                    'raw_value': GPIOManager.get_sensor_state(SUMMER_EMPTY),
-                    'inverted_value': not GPIOManager.get_sensor_state(SUMMER_EMPTY)
-                }
-            },
-            'winter_tank': {
-                'high': {
-                    'pin': WINTER_HIGH,
-                    'raw_value': GPIOManager.get_sensor_state(WINTER_HIGH),
-                    'inverted_value': not GPIOManager.get_sensor_state(WINTER_HIGH)
-                },
-                'low': {
-                    'pin': WINTER_LOW,
-                    'raw_value': GPIOManager.get_sensor_state(WINTER_LOW),
-                    'inverted_value': not GPIOManager.get_sensor_state(WINTER_LOW)
-                }
-            },
-            'pumps': {
-                'well': {
-                    'pin': WELL_PUMP,
-                    'value': GPIOManager.get_pump_state(WELL_PUMP),
-                    'reverse_mode': GPIOManager.get_well_pump_reverse_state(),
-                    'output_inverted': GPIOManager.get_well_output_invert_state()
-                },
-                'distribution': {
-                    'pin': DIST_PUMP,
-                    'value': GPIOManager.get_pump_state(DIST_PUMP)
-                }
-            }
-        }
-
-        return jsonify(state)
+        return _state_response('state')
     except Exception as e:
         print(f"Error in get_state: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -81,58 +70,174 @@ def get_state():
 
 @bp.route('/gpio_states', methods=['GET'])
 @login_required
+@conditional(_state_versions)
 def get_gpio_states():
     """Get raw GPIO states"""
     try:
-        states = {
-            'summer_tank': {
-                'high': {
-                    'pin': SUMMER_HIGH,
-                    'raw_value': GPIOManager.get_sensor_state(SUMMER_HIGH),
-                    'inverted_value': not GPIOManager.get_sensor_state(SUMMER_HIGH)
-                },
-                'low': {
-                    'pin': SUMMER_LOW,
-                    'raw_value': GPIOManager.get_sensor_state(SUMMER_LOW),
-                    'inverted_value': not GPIOManager.get_sensor_state(SUMMER_LOW)
-                },
-                'empty': {
-                    'pin': SUMMER_EMPTY,
-                    'raw_value': GPIOManager.get_sensor_state(SUMMER_EMPTY),
-                    'inverted_value': not GPIOManager.get_sensor_state(SUMMER_EMPTY)
-                }
-            },
-            'winter_tank': {
-                'high': {
-                    'pin': WINTER_HIGH,
-                    'raw_value': GPIOManager.get_sensor_state(WINTER_HIGH),
-                    'inverted_value': not GPIOManager.get_sensor_state(WINTER_HIGH)
-                },
-                'low': {
-                    'pin': WINTER_LOW,
-                    'raw_value': GPIOManager.get_sensor_state(WINTER_LOW),
-                    'inverted_value': not GPIOManager.get_sensor_state(WINTER_LOW)
-                }
-            },
-            'pumps': {
-                'well': {
-                    'pin': WELL_PUMP,
-                    'value': GPIOManager.get_pump_state(WELL_PUMP),
-                    'reverse_mode': GPIOManager.get_well_pump_reverse_state(),
-                    'output_inverted': GPIOManager.get_well_output_invert_state()
-                },
-                'distribution': {
-                    'pin': DIST_PUMP,
-                    'value': GPIOManager.get_pump_state(DIST_PUMP)
-                }
-            }
-        }
-        return jsonify(states)
+        return _state_response('gpio_states', lambda state: state['gpio_states'])
     except Exception as e:
         print(f"Error in get_gpio_states: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+def _dashboard_payload(version, sections):
+    """Assemble the {version, sections} JSON from pre-serialized sections"""
+    return b'{"version":' + dumps_bytes(_version_token(version)) + b',"sections":' + sections + b'}'
+
+
+def _version_token(version):
+    """Client-facing state version, tied to this process's boot"""
+    return f"{get_boot_id()}.{version}"
+
+
+def _parse_version_token(token):
+    """Parse a version token, returning None if absent, invalid or from a previous boot"""
+    if not token:
+        return None
+    boot_id, _, version = token.rpartition('.')
+    if boot_id != get_boot_id() or not version.isdigit():
+        return None
+    return int(version)
+
+
+@bp.route('/dashboard', methods=['GET'])
+@login_required
+@conditional(_state_versions)
+def get_dashboard():
+    """Get dashboard state sections, optionally only those changed since a version
+
+    Query args:
+        fields: Comma separated sections (mode, pumps, tanks, stats, gpio),
+            default all
+        since: Version token from a previous response; only sections
+            changed after it are returned
+    """
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in SECTIONS]
+    if unknown:
+        return jsonify({'status': 'error', 'message': f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    try:
+        if not StatePublisher.get_version():
+            pump_controller.publish_state()
+
+        since = _parse_version_token(request.args.get('since'))
+        version, sections = StatePublisher.get_sections_encoded(since=since, fields=fields or None)
+        return json_bytes_response(_dashboard_payload(version, sections))
+    except Exception as e:
+        print(f"Error in get_dashboard: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@bp.route('/stream', methods=['GET'])
+@login_required
+def stream_state():
+    """Stream dashboard state changes as Server-Sent Events
+
+    Each event carries the dashboard sections that changed since the
+    previous event (all sections on a fresh connection), with the version
+    token as the event id. Reconnecting clients send it back as
+    Last-Event-ID and only receive what changed while they were away.
+    Comment lines are sent as heartbeats while nothing changes, and the
+    stream closes after STREAM_MAX_SECONDS so the worker thread is released;
+    EventSource reconnects on its own. Beyond MAX_STREAMS open streams a
+    503 is returned and the client falls back to polling.
+    """
+    # Refuse rather than queue, so streams never starve other requests of threads
+    if not _streams.acquire(blocking=False):
+        response = jsonify({'status': 'error', 'message': 'Too many open streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    since = _parse_version_token(last_event_id)
+
+    def generate(version):
+        yield f"retry: {STREAM_RETRY_MS}\n\n".encode()
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            if StatePublisher.wait_for_change(version, timeout=STREAM_HEARTBEAT_SECONDS) is None:
+                yield b": heartbeat\n\n"
+                continue
+            version, sections = StatePublisher.get_sections_encoded(since=version)
+            data = _dashboard_payload(version, sections)
+            yield f"id: {_version_token(version)}\nevent: state\ndata: ".encode() + data + b"\n\n"
+
+    try:
+        response = Response(
+            stream_with_context(generate(since)),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+    except Exception:
+        _streams.release()
+        raise
+    # Called by the server once the response is finished or the client left,
+    # even if the generator never started
+    response.call_on_close(_streams.release)
+    return response
+
+
+@bp.route('/state/wait', methods=['GET'])
+@login_required
+def wait_for_state():
+    """Long-poll for the next state change, for clients that cannot use SSE
+
+    Returns the state as soon as its version differs from `since`, or
+    straight away when `since` is missing or from a previous boot. The
+    response is {"version": token, "state": {...}}; pass the token back as
+    `since` on the next call. When nothing changes before the timeout, a
+    bodyless 204 is returned with the unchanged token in X-State-Version.
+    (Not 304: this is not a conditional request, and caches and clients
+    treat a 304 as a revalidation.)
+
+    Query args:
+        since: Version token from a previous response
+        timeout: Seconds to wait, at most STATE_WAIT_MAX_SECONDS
+            (default: STATE_WAIT_DEFAULT_SECONDS)
+    """
+    try:
+        timeout = float(request.args.get('timeout', STATE_WAIT_DEFAULT_SECONDS))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'timeout must be a number'}), 400
+    timeout = min(STATE_WAIT_MAX_SECONDS, max(0.0, timeout))
+    since = _parse_version_token(request.args.get('since'))
+
+    # Refuse rather than queue, so waiters never starve other requests of threads
+    if not _state_waiters.acquire(blocking=False):
+        response = jsonify({'status': 'error', 'message': 'Too many waiting clients'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+    try:
+        if not StatePublisher.get_version():
+            pump_controller.publish_state()
+
+        if StatePublisher.wait_for_change(since, timeout=timeout) is None:
+            response = Response(status=204)
+            if since is not None:
+                response.headers['X-State-Version'] = _version_token(since)
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+
+        version, body = StatePublisher.get_encoded('state')
+        response = json_bytes_response(b'{"version":' + dumps_bytes(_version_token(version))
+                                       + b',"state":' + body + b'}')
+        response.headers['X-State-Version'] = _version_token(version)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    except Exception as e:
+        print(f"Error in wait_for_state: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        _state_waiters.release()
+
+
 @bp.route('/pump', methods=['POST'])
 @login_required
 @operator_required
@@ -143,15 +248,10 @@ def control_pump():
         if not data or 'running' not in data:
             return jsonify({'status': 'error', 'message': 'Running state not specified'}), 400
 
-        current_mode = mode_controller.get_current_mode()
-        if current_mode == 'CHANGEOVER':
-            # In changeover mode, use the handler's manual control
-            handler = mode_controller._handlers['CHANGEOVER']
-            result = handler.set_manual_well_pump(bool(data['running']))
-        else:
-            # In other modes, use the pump controller directly
-            result = pump_controller.set_well_pump(bool(data['running']))
+        # Goes through the changeover handler's manual control in CHANGEOVER mode
+        result = mode_controller.set_manual_well_pump(bool(data['running']))
 
+        pump_controller.publish_state()
         return jsonify(result)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -168,6 +268,7 @@ def control_distribution_pump():
             return jsonify({'status': 'error', 'message': 'Running state not specified'}), 400
 
         result = pump_controller.set_distribution_pump(bool(data['running']))
+        pump_controller.publish_state()
         return jsonify(result)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -187,7 +288,8 @@ def change_mode():
             return jsonify({'status': 'error', 'message': 'Invalid mode specified'}), 400
 
         result = mode_controller.request_mode_change(new_mode, confirm)
-        if isinstance(result, tuple):
+        pump_controller.publish_state()
+        if isinstance(result, (tuple, list)):
             return jsonify(result[0]), result[1]
         return jsonify(result)
     except Exception as e:
@@ -206,7 +308,8 @@ def toggle_well_pump_reverse():
         if not data or 'enabled' not in data:
             return jsonify({'status': 'error', 'message': 'Enabled state not specified'}), 400
 
-        result = GPIOManager.set_well_pump_reverse(bool(data['enabled']))
+        result = gpio_manager.set_well_pump_reverse(bool(data['enabled']))
+        pump_controller.publish_state()
         return jsonify(result)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -224,7 +327,8 @@ def toggle_pump_output_invert():
         if not data or 'enabled' not in data:
             return jsonify({'status': 'error', 'message': 'Enabled state not specified'}), 400
 
-        result = GPIOManager.set_well_output_invert(bool(data['enabled']))
+        result = gpio_manager.set_well_output_invert(bool(data['enabled']))
+        pump_controller.publish_state()
         return jsonify(result)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -244,45 +348,37 @@ def configure_winter_mode():
         if timeout < 0:
             return jsonify({'status': 'error', 'message': 'Timeout must be positive'}), 400
 
-        config = ConfigManager.get_config()
-        config['winter_low_timeout'] = timeout
-        ConfigManager.save_config()
-
-        return jsonify({
-            'status': 'success',
-            'message': f'Winter mode low state timeout set to {timeout} seconds'
-        })
+        result = mode_controller.set_winter_low_timeout(timeout)
+        pump_controller.publish_state()
+        return jsonify(result)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @bp.route('/mode/status', methods=['GET'])
 @login_required
+@conditional(_state_versions)
 def get_mode_status():
     """Get detailed mode status"""
     try:
-        current_mode = mode_controller.get_current_mode()
-        handler = mode_controller._current_handler
-
-        status = {
-            'current_mode': current_mode,
-            'tank_states': handler.get_tank_states() if handler else {},
-            'pump_states': pump_controller.get_system_state(),
-            'mode_specific': {}
-        }
-
-        # Add mode-specific information
-        if current_mode == 'WINTER':
-            config = ConfigManager.get_config()
-            status['mode_specific'] = {
-                'low_timeout': config.get('winter_low_timeout', 300),
-                'low_state_active': handler._low_state_time is not None if handler else False
-            }
-
-        return jsonify(status)
+        return _state_response('mode_status', _build_mode_status)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+
+def _build_mode_status(state):
+    """Build the mode status response from a published state"""
+    gpio_states = state['gpio_states']
+    return {
+        'current_mode': state['current_mode'],
+        'tank_states': {
+            tank: {sensor: values['raw_value'] for sensor, values in gpio_states[f'{tank}_tank'].items()}
+            for tank in ('summer', 'winter')
+        },
+        'pump_states': {key: value for key, value in state.items() if key not in MODE_STATUS_EXCLUDED_KEYS},
+        'mode_specific': state.get('mode_specific', {})
+    }
+
 """
 @bp.route('/diagnostics/winter', methods=['GET'])
 @login_required
@@ -310,11 +406,11 @@ def test_control_flow():
         })
 
         # Step 2: Get handler
-        handler = mode_controller._current_handler
+        handler_info = mode_controller.get_handler_info()
         steps.append({
             'step': 'Get Handler',
-            'handler': type(handler).__name__ if handler else None,
-            'status': 'ok' if handler else 'error'
+            'handler': handler_info['handler_type'],
+            'status': 'ok' if handler_info['handler_active'] else 'error'
         })
 
         # Step 3: Test pump controller
@@ -352,77 +448,6 @@ def test_control_flow():
         print(traceback.format_exc())
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-from flask import Blueprint, jsonify
-from flask_login import login_required
-from ..controllers import pump_controller, mode_controller
-from ..utils.config_utils import (
-    WELL_PUMP, DIST_PUMP, WINTER_HIGH, WINTER_LOW
-)
-from ..utils.gpio_utils import GPIOManager
-from RPi import GPIO
-from datetime import datetime
-
-@diagnostics_bp.route('/system', methods=['GET'])
-@login_required
-def system_diagnostics():
-    """Get complete system diagnostics"""
-    try:
-        # Get mode information
-        mode_info = {
-            'current_mode': mode_controller.get_current_mode(),
-            'handler_active': mode_controller._current_handler is not None,
-            'handler_type': type(mode_controller._current_handler).__name__ if mode_controller._current_handler else None
-        }
-
-        # Get GPIO states
-        gpio_states = {
-            'winter_tank': {
-                'high': {
-                    'pin': WINTER_HIGH,
-                    'raw': GPIOManager.get_raw_sensor_state(WINTER_HIGH),
-                    'processed': GPIOManager.get_sensor_state(WINTER_HIGH)
-                },
-                'low': {
-                    'pin': WINTER_LOW,
-                    'raw': GPIOManager.get_raw_sensor_state(WINTER_LOW),
-                    'processed': GPIOManager.get_sensor_state(WINTER_LOW)
-                }
-            },
-            'pumps': {
-                'well': {
-                    'pin': WELL_PUMP,
-                    'raw_state': GPIO.input(WELL_PUMP),
-                    'processed_state': GPIOManager.get_pump_state(WELL_PUMP),
-                    'reverse_mode': GPIOManager.get_well_pump_reverse_state(),
-                    'inverted': GPIOManager.get_well_output_invert_state()
-                },
-                'distribution': {
-                    'pin': DIST_PUMP,
-                    'raw_state': GPIO.input(DIST_PUMP),
-                    'processed_state': GPIOManager.get_pump_state(DIST_PUMP)
-                }
-            }
-        }
-
-        # Get pump controller state
-        pump_info = {
-            'initialized': pump_controller._initialized,
-            'running': pump_controller.is_running,
-            'thread_active': pump_controller.pump_thread and pump_controller.pump_thread.is_alive() if hasattr(pump_controller, 'pump_thread') else False
-        }
-
-        return jsonify({
-            'mode': mode_info,
-            'gpio': gpio_states,
-            'pump_controller': pump_info,
-            'last_system_state': pump_controller._last_state
-        })
-    except Exception as e:
-        import traceback
-        print(f"Error in system diagnostics: {e}")
-        print(traceback.format_exc())
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-
 
 @bp.route('/diagnostics/winter', methods=['GET'])
 @login_required
@@ -433,49 +458,47 @@ def winter_diagnostics():
         winter_sensors = {
             'high': {
                 'pin': WINTER_HIGH,
-                'raw': GPIOManager.get_raw_sensor_state(WINTER_HIGH),
-                'processed': GPIOManager.get_sensor_state(WINTER_HIGH)
+                'raw': gpio_manager.get_raw_sensor_state(WINTER_HIGH),
+                'processed': gpio_manager.get_sensor_state(WINTER_HIGH)
             },
             'low': {
                 'pin': WINTER_LOW,
-                'raw': GPIOManager.get_raw_sensor_state(WINTER_LOW),
-                'processed': GPIOManager.get_sensor_state(WINTER_LOW)
+                'raw': gpio_manager.get_raw_sensor_state(WINTER_LOW),
+                'processed': gpio_manager.get_sensor_state(WINTER_LOW)
             }
         }
 
         # Get pump states
         well_pump = {
             'pin': WELL_PUMP,
-            'raw_state': GPIO.input(WELL_PUMP),
-            'logical_state': GPIOManager.get_pump_state(WELL_PUMP),
-            'reverse_mode': GPIOManager.get_well_pump_reverse_state(),
-            'inverted': GPIOManager.get_well_output_invert_state()
+            'raw_state': gpio_manager.read_pin(WELL_PUMP),
+            'logical_state': gpio_manager.get_pump_state(WELL_PUMP),
+            'reverse_mode': gpio_manager.get_well_pump_reverse_state(),
+            'inverted': gpio_manager.get_well_output_invert_state()
         }
 
         # Get current mode info
-        current_mode = mode_controller.get_current_mode()
-        handler = mode_controller._current_handler
+        handler_info = mode_controller.get_handler_info()
 
-        # Create tank state and update it
-        tank_state = TankState('Winter')
-        tank_state.update_from_sensors(GPIOManager)
+        # Read the winter tank state
+        tank_state = pump_controller.read_tank_state('Winter')
 
         diagnostics = {
             'mode': {
-                'current': current_mode,
-                'handler_active': handler is not None,
-                'handler_type': type(handler).__name__ if handler else None
+                'current': handler_info['current_mode'],
+                'handler_active': handler_info['handler_active'],
+                'handler_type': handler_info['handler_type']
             },
             'sensors': winter_sensors,
             'well_pump': well_pump,
             'tank_state': {
                 'raw': {
-                    'winter_high': tank_state.winter_high,
-                    'winter_low': tank_state.winter_low
+                    'winter_high': tank_state['winter_high'],
+                    'winter_low': tank_state['winter_low']
                 },
-                'computed_state': tank_state.state
+                'computed_state': tank_state['state']
             },
-            'handler_state': handler.get_handler_state() if handler and current_mode == 'WINTER' else None,
+            'handler_state': handler_info['handler_state'],
             'system_state': pump_controller.get_system_state()
         }
 
@@ -1,13 +1,25 @@
 import os
+import math
 import traceback
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from ..utils.user_manager import UserManager
+from ..utils.api_tokens import ApiTokenManager
+from ..utils.login_throttle import LoginThrottle
 from ..models.user import UserRole
 
 bp = Blueprint('auth', __name__)
 
+LOOPBACK_ADDRS = ('127.0.0.1', '::1')
+
+
+def _client_ip():
+    """Get the client address, trusting X-Real-IP only from the local nginx proxy"""
+    if request.remote_addr in LOOPBACK_ADDRS:
+        return request.headers.get('X-Real-IP', request.remote_addr)
+    return request.remote_addr
+
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -15,22 +27,35 @@ def login():
         if request.method == 'POST':
             username = request.form['username']
             password = request.form['password']
+            ip = _client_ip()
             print(f"Login attempt for user: {username}")
 
+            # Checked before hashing, so a flood of attempts costs no CPU
+            retry_after = LoginThrottle.check(ip, username)
+            if retry_after:
+                print(f"Login throttled for {username} from {ip}")
+                flash(f'Too many login attempts. Try again in {math.ceil(retry_after)} seconds.')
+                return render_template('auth/login.html', UserRole=UserRole), 429, {
+                    'Retry-After': str(math.ceil(retry_after))
+                }
+
             user = UserManager.get_user_by_username(username)
             if not user:
                 print("User not found")
+                LoginThrottle.record_failure(ip, username)
                 flash('Invalid username or password')
                 return render_template('auth/login.html', UserRole=UserRole)
 
             if user.check_password(password):
                 print("Password check passed, attempting login")
+                LoginThrottle.record_success(ip, username)
                 login_user(user)
                 next_page = request.args.get('next')
                 print(f"Redirecting to: {next_page or 'main.index'}")
                 return redirect(next_page or url_for('main.index'))
 
             print("Invalid password")
+            LoginThrottle.record_failure(ip, username)
             flash('Invalid username or password')
 
         return render_template('auth/login.html', UserRole=UserRole)
@@ -55,7 +80,7 @@ def user_list():
     if not current_user.has_role(UserRole.ADMINISTRATOR):
         flash('Access denied')
         return redirect(url_for('main.index'))
-    return render_template('auth/users.html', users=UserManager._users.values(), UserRole=UserRole)
+    return render_template('auth/users.html', users=UserManager.get_all_users(), UserRole=UserRole)
 
 @bp.route('/users/create_user', methods=['GET', 'POST'])
 @login_required
@@ -106,8 +131,14 @@ def delete_user(user_id):
             flash('Cannot delete the last administrator account')
             return redirect(url_for('auth.user_list'))
     
-    result = UserManager.delete_user(user_id)
+    try:
+        result = UserManager.delete_user(user_id)
+    except Exception as e:
+        print(f"Error deleting user: {str(e)}")
+        flash(f'Error deleting user: {str(e)}')
+        return redirect(url_for('auth.user_list'))
     if result:
+        ApiTokenManager.revoke_user_tokens(user_id)
         flash('User deleted successfully')
     else:
         flash('User not found')
@@ -172,7 +203,11 @@ def edit_user(user_id):
                 return redirect(url_for('auth.user_list'))
         
         try:
+            old_role = user.role
             UserManager.update_user_role(user_id, new_role)
+            # Tokens carry the role they were issued with
+            if new_role != old_role and ApiTokenManager.revoke_user_tokens(user_id):
+                flash(f'API tokens of {user.username} were revoked because their role changed')
             flash(f'Role for {user.username} has been updated successfully')
             return redirect(url_for('auth.user_list'))
         except Exception as e:
@@ -180,4 +215,44 @@ def edit_user(user_id):
             print(traceback.format_exc())
             flash(f'Error updating user role: {str(e)}')
     
-    return render_template('auth/edit_user.html', user=user, roles=UserRole, UserRole=UserRole)
\ No newline at end of file
+    return render_template('auth/edit_user.html', user=user, roles=UserRole, UserRole=UserRole)
+
+@bp.route('/users/tokens/<int:user_id>', methods=['GET', 'POST'])
+@login_required
+def api_tokens(user_id):
+    if not current_user.has_role(UserRole.ADMINISTRATOR):
+        flash('Access denied')
+        return redirect(url_for('main.index'))
+
+    user = UserManager.get_user_by_id(user_id)
+    if not user:
+        flash('User not found')
+        return redirect(url_for('auth.user_list'))
+
+    new_token = None
+    if request.method == 'POST':
+        try:
+            new_token, _ = ApiTokenManager.issue_token(
+                user,
+                days=int(request.form.get('days', 365)),
+                label=request.form.get('label', '').strip()
+            )
+        except ValueError as e:
+            flash(f'Error issuing token: {str(e)}')
+
+    # A new token is shown once on this page and never stored
+    return render_template('auth/api_tokens.html', user=user, new_token=new_token,
+                           tokens=ApiTokenManager.get_user_tokens(user_id), UserRole=UserRole)
+
+@bp.route('/users/tokens/<int:user_id>/revoke/<token_id>', methods=['POST'])
+@login_required
+def revoke_api_token(user_id, token_id):
+    if not current_user.has_role(UserRole.ADMINISTRATOR):
+        flash('Access denied')
+        return redirect(url_for('main.index'))
+
+    if ApiTokenManager.revoke_token(token_id):
+        flash('Token revoked')
+    else:
+        flash('Token not found')
+    return redirect(url_for('auth.api_tokens', user_id=user_id))
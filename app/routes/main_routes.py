@@ -3,13 +3,22 @@ from flask_login import login_required
 from ..controllers import pump_controller, mode_controller  # Import at the top level
 from ..utils.config_utils import MODES
 from ..models.user import UserRole
+from ..services.state_publisher import StatePublisher
+from ..utils.render_cache import cached_render, skip_render_cache
 import logging
 
 bp = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
+
+def _state_versions():
+    """Render cache versions for pages built from the published state"""
+    version = StatePublisher.get_version()
+    return (version,) if version else None
+
 @bp.route('/')
 @login_required
+@cached_render(_state_versions)
 def index():
     try:
         state = pump_controller.get_system_state()
@@ -30,6 +39,7 @@ def index():
                              UserRole=UserRole)
     except Exception as e:
         logger.error(f"Error in index route: {e}", exc_info=True)
+        skip_render_cache()
         return render_template('index.html',
                              current_mode='Error',
                              available_modes=MODES,
@@ -1,30 +1,54 @@
-from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, render_template, jsonify, request, flash, redirect, url_for
 from flask_login import login_required, current_user
 from ..models.user import UserRole, operator_required
-from ..utils.stats_manager import StatsManager
-from ..controllers import pump_controller
+from ..utils.http_cache import conditional
+from ..utils.render_cache import cached_render, skip_render_cache
+from ..controllers import pump_controller, stats_manager
 
 bp = Blueprint('stats', __name__, url_prefix='/stats')
 
+PUMP_NAMES = ('well_pump', 'dist_pump')
+
+
+def _parse_time_arg(name):
+    """Parse an optional ISO 8601 timestamp query argument
+
+    Times with a UTC offset are converted to naive local time, like the
+    recorded stats and the defaults they are compared with.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' timestamp: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
 @bp.route('/')
 @login_required
+@cached_render(lambda: stats_manager.get_part_versions('pump_stats', 'tank_history',
+                                                       'current_tank_states', 'config'))
 def stats_dashboard():
     """Stats dashboard page"""
     try:
         # Get current pump stats
-        pump_stats = StatsManager.get_pump_stats()
+        pump_stats = stats_manager.get_pump_stats()
         
         # Get pump configuration
-        pump_config = StatsManager.get_config()
+        pump_config = stats_manager.get_config()
         
         # Get tank states history
         tank_history = {
-            'summer': StatsManager.get_tank_history('summer', max_entries=20),
-            'winter': StatsManager.get_tank_history('winter', max_entries=20)
+            'summer': stats_manager.get_tank_history('summer', max_entries=20),
+            'winter': stats_manager.get_tank_history('winter', max_entries=20)
         }
         
         # Get current tank states
-        current_tank_states = StatsManager.get_current_tank_states()
+        current_tank_states = stats_manager.get_current_tank_states()
         
         return render_template('stats/dashboard.html', 
                               pump_stats=pump_stats,
@@ -34,6 +58,7 @@ def stats_dashboard():
                               UserRole=UserRole)
     except Exception as e:
         print(f"Error in stats dashboard: {e}")
+        skip_render_cache()
         import traceback
         print(traceback.format_exc())
         flash(f"Error loading stats: {str(e)}", "error")
@@ -59,7 +84,7 @@ def pump_config():
                 flash("Flow rates must be positive numbers", "warning")
                 return redirect(url_for('stats.pump_config'))
             
-            config = StatsManager.update_pump_config(well_gpm=well_gpm, dist_gpm=dist_gpm)
+            config = stats_manager.update_pump_config(well_gpm=well_gpm, dist_gpm=dist_gpm)
             flash("Pump configuration updated successfully", "success")
             
             return redirect(url_for('stats.stats_dashboard'))
@@ -69,7 +94,7 @@ def pump_config():
             flash(f"Error updating configuration: {str(e)}", "error")
     
     # Get current configuration
-    pump_config = StatsManager.get_config()
+    pump_config = stats_manager.get_config()
     
     return render_template('stats/config.html', 
                          pump_config=pump_config,
@@ -77,10 +102,11 @@ def pump_config():
 
 @bp.route('/api/pump_stats')
 @login_required
+@conditional(lambda: stats_manager.get_part_versions('pump_stats'))
 def api_pump_stats():
     """API endpoint to get pump stats"""
     try:
-        pump_stats = StatsManager.get_pump_stats()
+        pump_stats = stats_manager.get_pump_stats()
         return jsonify({
             'status': 'success',
             'data': pump_stats
@@ -100,11 +126,11 @@ def api_tank_history():
         max_entries = int(request.args.get('max_entries', 20))
         
         if tank_name:
-            history = StatsManager.get_tank_history(tank_name, max_entries=max_entries)
+            history = stats_manager.get_tank_history(tank_name, max_entries=max_entries)
         else:
-            history = StatsManager.get_tank_history(max_entries=max_entries)
+            history = stats_manager.get_tank_history(max_entries=max_entries)
             
-        current_states = StatsManager.get_current_tank_states()
+        current_states = stats_manager.get_current_tank_states()
         
         return jsonify({
             'status': 'success',
@@ -115,4 +141,182 @@ def api_tank_history():
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@bp.route('/api/pump_cycles')
+@login_required
+def api_pump_cycles():
+    """API endpoint to get pump cycles, paginated and filtered by time range
+
+    Query args:
+        pump: 'well_pump' or 'dist_pump' (default: both)
+        from, to: ISO 8601 bounds on the cycle start time
+        page: Page number starting at 1 (default: 1)
+        per_page: Cycles per page, at most 500 (default: 50)
+        order: 'desc' for newest first (default) or 'asc'
+    """
+    try:
+        pump_name = request.args.get('pump') or None
+        if pump_name is not None and pump_name not in PUMP_NAMES:
+            raise ValueError(f"Invalid pump: {pump_name}")
+
+        start = _parse_time_arg('from')
+        end = _parse_time_arg('to')
+        if start and end and start > end:
+            raise ValueError("'from' must not be after 'to'")
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(500, max(1, int(request.args.get('per_page', 50))))
+        newest_first = request.args.get('order', 'desc') != 'asc'
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    try:
+        result = stats_manager.get_pump_cycles(pump_name=pump_name, start=start, end=end,
+                                              offset=(page - 1) * per_page, limit=per_page,
+                                              newest_first=newest_first)
+        total = result['total']
+
+        return jsonify({
+            'status': 'success',
+            'data': result['cycles'],
+            'open_cycles': result['open_cycles'],
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@bp.route('/api/analytics')
+@login_required
+def api_analytics():
+    """API endpoint to get pump and tank analytics
+
+    Query args:
+        days: Length of the analysis window in days (default: 365)
+    """
+    try:
+        days = min(3650, max(1, int(request.args.get('days', 365))))
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': 'days must be an integer'
+        }), 400
+
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': stats_manager.get_analytics(days)
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@bp.route('/api/ticks')
+@login_required
+def api_ticks():
+    """API endpoint to get raw archived ticks within a time range
+
+    Query args:
+        from: ISO 8601 start of the range (default: one hour ago)
+        to: ISO 8601 end of the range (default: now)
+        limit: Maximum number of ticks, at most 100000 (default: 10000)
+    """
+    try:
+        end = _parse_time_arg('to') or datetime.now()
+        start = _parse_time_arg('from') or end - timedelta(hours=1)
+        limit = min(100000, max(1, int(request.args.get('limit', 10000))))
+        if start > end:
+            raise ValueError("'from' must not be after 'to'")
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    try:
+        from ..utils.tick_archive import TickArchive
+        ticks = TickArchive.read_range(start, end, limit=limit)
+        return jsonify({
+            'status': 'success',
+            'count': int(len(ticks['timestamp'])),
+            'data': TickArchive.decode_rows(ticks)
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@bp.route('/api/export')
+@login_required
+def api_export():
+    """Stream an export of pump cycles, tank history or raw ticks
+
+    Rows are streamed as they are read, so memory use does not grow with
+    the range. When more rows remain, the X-Next-Cursor header (and a Link
+    header with rel="next") carries the cursor of the next page.
+
+    Query args:
+        type: 'pump_cycles' (default), 'tank_history' or 'ticks'
+        format: 'ndjson' (default) or 'csv'
+        from: ISO 8601 start of the range (default: 30 days before 'to')
+        to: ISO 8601 end of the range (default: now)
+        limit: Rows per page, at most 100000 (default: 10000)
+        cursor: Cursor of the page to fetch; replaces type, from and to
+    """
+    from ..services.data_export import ExportError, prepare_export, iter_csv, iter_ndjson
+
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            raise ValueError(f"Invalid format: {export_format}")
+        end = _parse_time_arg('to') or datetime.now()
+        start = _parse_time_arg('from') or end - timedelta(days=30)
+        limit = min(100000, max(1, int(request.args.get('limit', 10000))))
+
+        fields, rows, next_cursor = prepare_export(request.args.get('type', 'pump_cycles'),
+                                                   start, end, request.args.get('cursor'), limit)
+    except (ValueError, ExportError) as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+    def generate():
+        try:
+            yield from (iter_csv(rows, fields) if export_format == 'csv' else iter_ndjson(rows))
+        except Exception as e:
+            # Headers are already sent; the client sees a short page
+            print(f"Error streaming export: {e}")
+
+    if export_format == 'csv':
+        response = Response(generate(), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename=export.csv'
+    else:
+        response = Response(generate(), mimetype='application/x-ndjson')
+
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        next_args = {'format': export_format, 'limit': limit, 'cursor': next_cursor}
+        response.headers['Link'] = f'<{url_for("stats.api_export", **next_args)}>; rel="next"'
+    # Let nginx pass rows through as they are produced
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,89 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Spool size at which finished entries are compacted away
+MAX_SPOOL_BYTES = 256 * 1024
+
+
+class AlertOutbox:
+    """Append-only spool of the alerts pending on one channel
+
+    Each line is a JSON record: {"op": "add", "id", "created", "args"} when
+    an alert is accepted and {"op": "done", "id"} once it has been
+    delivered (or given up on). Entries added but not done are replayed
+    after a restart, so delivery is at-least-once. When the file outgrows
+    MAX_SPOOL_BYTES it is rewritten with only the pending entries.
+    """
+
+    def __init__(self, path, max_bytes=MAX_SPOOL_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+
+    def load(self):
+        """Read the entries still pending and start a fresh, compacted spool
+
+        Returns:
+            List of pending entry dicts, oldest first
+        """
+        pending = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        if record['op'] == 'add':
+                            pending[record['id']] = record
+                        elif record['op'] == 'done':
+                            pending.pop(record['id'], None)
+                    except (ValueError, KeyError, TypeError):
+                        # A line cut short by a crash mid-write
+                        logger.warning(f"Skipping corrupt record in {self.path}")
+        entries = list(pending.values())
+        self.compact(entries)
+        return entries
+
+    def _write(self, record, sync=False):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def add(self, entry):
+        """Record a new pending entry, synced to disk before returning"""
+        self._write(dict(entry, op='add'), sync=True)
+
+    def done(self, entry_id):
+        """Record that an entry no longer needs delivering
+
+        Not synced: losing it in a crash only means a duplicate delivery.
+        """
+        self._write({'op': 'done', 'id': entry_id})
+
+    def needs_compaction(self):
+        return self._file is not None and self._file.tell() > self.max_bytes
+
+    def compact(self, pending):
+        """Rewrite the spool with only the given pending entries"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for entry in pending:
+                f.write(json.dumps(dict(entry, op='add'), separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,145 @@
+import time
+import threading
+from collections import deque
+from .notification_dispatcher import describe_error
+
+# Consecutive failures that open a channel's circuit breaker
+FAILURE_THRESHOLD = 3
+# Seconds an open breaker fails fast before letting one probe through,
+# doubling after each failed probe up to the cap
+OPEN_BASE_SECONDS = 30.0
+OPEN_MAX_SECONDS = 600.0
+# Recent send attempts kept per channel for the success rate and latency
+HEALTH_SAMPLES = 100
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending while a channel's breaker is open"""
+
+    def __init__(self, channel, retry_after):
+        super().__init__(f"{channel} circuit open, next probe in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class ChannelHealth:
+    """Circuit breaker and rolling send statistics of one channel
+
+    After FAILURE_THRESHOLD consecutive failures the breaker opens and
+    before_attempt() raises CircuitOpenError at once, so alerts to a dead
+    channel don't each wait out a connect timeout. Once the open period
+    has passed a single probe is let through (half open): success closes
+    the breaker, failure opens it again for twice as long.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = OPEN_BASE_SECONDS
+        self.opened_at = None
+        self.probe_at = 0.0
+        self.samples = deque(maxlen=HEALTH_SAMPLES)  # (succeeded, latency)
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.times_opened = 0
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+
+    def before_attempt(self, force=False):
+        """Check the breaker before sending
+
+        Args:
+            force: Send even if the breaker is open, e.g. for a test
+                message; the result still counts as a probe
+
+        Raises:
+            CircuitOpenError: If the breaker is open and no probe is due
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if force or (self.state == OPEN and now >= self.probe_at):
+                self.state = HALF_OPEN
+                return
+            # Open, or half open with a probe already in flight
+            self.short_circuited += 1
+            raise CircuitOpenError(self.name, max(0.0, self.probe_at - now))
+
+    def record_success(self, latency):
+        with self._lock:
+            self.samples.append((True, latency))
+            self.successes += 1
+            self.last_success = time.time()
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.open_seconds = OPEN_BASE_SECONDS
+            self.opened_at = None
+
+    def record_failure(self, latency, error):
+        with self._lock:
+            self.samples.append((False, latency))
+            self.failures += 1
+            self.last_failure = time.time()
+            self.last_error = describe_error(error)
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                # Failed probe: stay open for longer
+                self.open_seconds = min(OPEN_MAX_SECONDS, self.open_seconds * 2)
+            elif self.consecutive_failures < FAILURE_THRESHOLD:
+                return
+            if self.state == CLOSED:
+                self.times_opened += 1
+                self.opened_at = time.time()
+            self.state = OPEN
+            self.probe_at = time.monotonic() + self.open_seconds
+
+    def record_rejection(self, latency, error):
+        """Record events the channel reached but refused (PermanentDeliveryError)
+
+        The send counts as failed, but the channel is up, so it closes the
+        breaker like a success rather than counting towards opening it.
+        """
+        with self._lock:
+            self.samples.append((False, latency))
+            self.failures += 1
+            self.last_failure = time.time()
+            self.last_error = describe_error(error)
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.open_seconds = OPEN_BASE_SECONDS
+            self.opened_at = None
+
+    def get_stats(self):
+        with self._lock:
+            samples = list(self.samples)
+            state = self.state
+            probe_in = max(0.0, self.probe_at - time.monotonic()) if state != CLOSED else None
+            stats = {
+                'state': state,
+                'consecutive_failures': self.consecutive_failures,
+                'successes': self.successes,
+                'failures': self.failures,
+                'short_circuited': self.short_circuited,
+                'times_opened': self.times_opened,
+                'opened_at': self.opened_at,
+                'next_probe_in': probe_in,
+                'last_success': self.last_success,
+                'last_failure': self.last_failure,
+                'last_error': self.last_error
+            }
+        latencies = sorted(latency for succeeded, latency in samples if succeeded)
+        stats.update({
+            'samples': len(samples),
+            'success_rate': sum(1 for succeeded, _ in samples if succeeded) / len(samples) if samples else None,
+            'latency_avg': sum(latencies) / len(latencies) if latencies else None,
+            'latency_p95': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+        })
+        return stats
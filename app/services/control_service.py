@@ -0,0 +1,393 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import socket
+import threading
+import socketserver
+from datetime import datetime
+
+from app.utils import http_cache
+from app.utils.config_utils import CONTROL_SOCKET, STATE_SEGMENT
+from app.utils.json_utils import dumps_bytes
+from app.services.state_publisher import StatePublisher
+from app.utils.stats_manager import StatsManager
+
+# Methods the web app may call in the controller process, per target
+RPC_METHODS = {
+    'pump': frozenset((
+        'get_system_state', 'build_state', 'publish_state', 'get_gpio_states',
+        'set_well_pump', 'set_distribution_pump', 'get_well_pump_state',
+        'get_distribution_pump_state', 'get_diagnostics', 'read_tank_state'
+    )),
+    'mode': frozenset((
+        'get_current_mode', 'request_mode_change', 'set_manual_well_pump',
+        'set_winter_low_timeout', 'get_handler_info', 'get_mode_specific_status'
+    )),
+    'gpio': frozenset((
+        'get_sensor_state', 'get_raw_sensor_state', 'read_pin', 'get_pump_state',
+        'get_well_pump_reverse_state', 'get_well_output_invert_state',
+        'set_well_pump_reverse', 'set_well_output_invert'
+    )),
+    'stats': frozenset((
+        'get_pump_stats', 'get_config', 'get_tank_history', 'get_current_tank_states',
+        'get_pump_cycles', 'get_part_versions', 'update_pump_config', 'get_analytics'
+    )),
+    'notifications': frozenset((
+        'get_delivery_metrics', 'get_channel_health', 'get_mail_stats',
+        'send_test_message'
+    ))
+}
+
+SEGMENT_MAGIC = b'PCSTATE1'
+# magic, sequence (odd while a write is in progress), payload length, payload crc32
+SEGMENT_HEADER = struct.Struct('<8sQII')
+SEGMENT_SEQUENCE = struct.Struct('<Q')
+SEGMENT_SEQUENCE_OFFSET = 8
+SEGMENT_SIZE = 1 << 20
+
+RPC_TIMEOUT = 10.0
+MAX_MESSAGE_SIZE = 1 << 20
+
+
+class ControlError(Exception):
+    """Raised when a call to the controller process fails"""
+    pass
+
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return {'__datetime__': obj.isoformat()}
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1 and '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+def _encode_message(message):
+    return json.dumps(message, default=_json_default, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def _decode_message(line):
+    return json.loads(line, object_hook=_json_object_hook)
+
+
+class StateSegment:
+    """Shared memory segment holding the latest published state
+
+    A single writer updates the segment under a sequence lock: the sequence
+    is odd while a write is in progress and advances to the next even value
+    once the payload, its length and its crc32 are in place. Readers retry
+    until they see the same even sequence before and after copying the
+    payload and the checksum matches, so they never block the writer.
+    """
+
+    def __init__(self, path, writer=False, size=SEGMENT_SIZE):
+        self._path = path
+        self._writer = writer
+        self._lock = threading.Lock()
+
+        if writer:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o640)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            magic, sequence, _, _ = SEGMENT_HEADER.unpack_from(self._map, 0)
+            # Keep counting from a previous run so readers see the change
+            self._sequence = sequence + (sequence % 2) if magic == SEGMENT_MAGIC else 0
+            self._map[0:len(SEGMENT_MAGIC)] = SEGMENT_MAGIC
+        else:
+            with open(path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def write(self, payload):
+        """Publish a payload (writer only)"""
+        if SEGMENT_HEADER.size + len(payload) > len(self._map):
+            raise ValueError(f"State payload of {len(payload)} bytes does not fit the segment")
+
+        with self._lock:
+            sequence = self._sequence + 1
+            SEGMENT_SEQUENCE.pack_into(self._map, SEGMENT_SEQUENCE_OFFSET, sequence)
+            self._map[SEGMENT_HEADER.size:SEGMENT_HEADER.size + len(payload)] = payload
+            struct.pack_into('<II', self._map, SEGMENT_SEQUENCE_OFFSET + 8, len(payload), zlib.crc32(payload))
+            SEGMENT_SEQUENCE.pack_into(self._map, SEGMENT_SEQUENCE_OFFSET, sequence + 1)
+            self._sequence = sequence + 1
+
+    def read_sequence(self):
+        return SEGMENT_SEQUENCE.unpack_from(self._map, SEGMENT_SEQUENCE_OFFSET)[0]
+
+    def read(self, attempts=50):
+        """Read a consistent copy of the payload
+
+        Returns:
+            Tuple of (sequence, payload bytes), or None if nothing has been
+            published or no consistent copy could be read
+        """
+        for _ in range(attempts):
+            magic, sequence, length, crc = SEGMENT_HEADER.unpack_from(self._map, 0)
+            if magic != SEGMENT_MAGIC or sequence == 0:
+                return None
+            if sequence % 2 == 0 and SEGMENT_HEADER.size + length <= len(self._map):
+                payload = self._map[SEGMENT_HEADER.size:SEGMENT_HEADER.size + length]
+                if self.read_sequence() == sequence and zlib.crc32(payload) == crc:
+                    return sequence, payload
+            time.sleep(0.001)
+        return None
+
+    def close(self):
+        self._map.close()
+
+
+class StateSegmentMirror:
+    """Mirror the controller's published state into this process's StatePublisher
+
+    Polls the segment sequence (a single 8 byte read) and only copies and
+    decodes the payload when it has moved. The stats part versions
+    published alongside the state are kept in stats_part_versions.
+    """
+
+    stats_part_versions = None
+
+    def __init__(self, path=STATE_SEGMENT, interval=0.1):
+        self._path = path
+        self._interval = interval
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        segment = None
+        last_sequence = None
+        while True:
+            try:
+                if segment is None:
+                    if not os.path.exists(self._path):
+                        time.sleep(1)
+                        continue
+                    segment = StateSegment(self._path)
+
+                if segment.read_sequence() != last_sequence:
+                    result = segment.read()
+                    if result is not None:
+                        last_sequence, payload = result
+                        self._apply(json.loads(payload))
+            except Exception as e:
+                print(f"Error mirroring controller state: {e}")
+                segment = None
+                time.sleep(1)
+            time.sleep(self._interval)
+
+    @classmethod
+    def _apply(cls, data):
+        # A new boot id means the controller restarted and its versions did too
+        reset = data['boot_id'] != http_cache.get_boot_id()
+        if reset:
+            http_cache.set_boot_id(data['boot_id'])
+        cls.stats_part_versions = data.get('stats_part_versions')
+        if data['state'] is not None:
+            StatePublisher.mirror(data['version'], data['state'], data['section_versions'], reset=reset)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_MESSAGE_SIZE)
+            if not line:
+                return
+            request_id = None
+            try:
+                request = _decode_message(line)
+                request_id = request.get('id')
+                response = _encode_message({'id': request_id, 'result': self.server.dispatch(request)})
+            except Exception as e:
+                response = _encode_message({'id': request_id, 'error': str(e)})
+            self.wfile.write(response)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Every worker thread may be mid-call at once; the default backlog of 5
+    # makes connects fail with EAGAIN under a burst
+    request_queue_size = 128
+
+    def __init__(self, path, dispatch):
+        self.dispatch = dispatch
+        super().__init__(path, _RequestHandler)
+
+
+class ControlServer:
+    """Serve the controller to web workers
+
+    State is published into a shared memory segment, and commands are
+    accepted as JSON lines on a Unix socket. Only the methods listed in
+    RPC_METHODS can be called. The segment also carries the stats part
+    versions, rewritten whenever the stats change, so workers can check
+    stats ETags without a round trip.
+    """
+
+    def __init__(self, targets, socket_path=CONTROL_SOCKET, segment_path=STATE_SEGMENT):
+        """
+        Args:
+            targets: Dict mapping RPC target name to the object serving it
+            socket_path: Path of the Unix socket to listen on
+            segment_path: Path of the shared memory state segment
+        """
+        self._targets = targets
+        self._socket_path = socket_path
+        self._segment = StateSegment(segment_path, writer=True)
+        self._server = None
+        self._publish_lock = threading.Lock()
+        self._state = (0, None, {})  # version, state, section versions
+        self._stats_part_versions = {}
+
+    def start(self):
+        """Start publishing state to the segment and bind the socket"""
+        StatePublisher.add_listener(self._publish)
+        StatsManager.add_listener(self._publish_stats)
+        self._stats_part_versions = dict(StatsManager.get_snapshot()['part_versions'])
+        version, state = StatePublisher.get_snapshot()
+        self._publish(version, state, StatePublisher.get_section_versions())
+
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)  # Left behind by a previous run
+        self._server = _UnixServer(self._socket_path, self.dispatch)
+        os.chmod(self._socket_path, 0o660)
+        print(f"Control server listening on {self._socket_path}")
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+
+    def _publish(self, version, state, section_versions):
+        with self._publish_lock:
+            self._state = (version, state, section_versions)
+            self._write()
+
+    def _publish_stats(self, version, part_versions):
+        # Runs with the stats writer lock held
+        with self._publish_lock:
+            self._stats_part_versions = part_versions
+            self._write()
+
+    def _write(self):
+        """Write the latest state and stats part versions to the segment. Publish lock held."""
+        version, state, section_versions = self._state
+        try:
+            self._segment.write(dumps_bytes({
+                'boot_id': http_cache.get_boot_id(),
+                'version': version,
+                'section_versions': section_versions,
+                'state': state,
+                'stats_part_versions': self._stats_part_versions
+            }))
+        except Exception as e:
+            print(f"Error writing state segment: {e}")
+
+    def dispatch(self, request):
+        """Call an allowed method
+
+        Args:
+            request: Dict with 'method' ('target.name'), optional 'args'
+                list and 'kwargs' dict
+
+        Returns:
+            The method's return value
+        """
+        target_name, _, name = str(request.get('method', '')).partition('.')
+        if name not in RPC_METHODS.get(target_name, ()) or target_name not in self._targets:
+            raise ControlError(f"Method not allowed: {request.get('method')}")
+        method = getattr(self._targets[target_name], name)
+        return method(*request.get('args', []), **request.get('kwargs', {}))
+
+
+class ControlClient:
+    """Call methods in the controller process over its Unix socket"""
+
+    def __init__(self, socket_path=CONTROL_SOCKET, timeout=RPC_TIMEOUT):
+        self._socket_path = socket_path
+        self._timeout = timeout
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+
+    def call(self, method, *args, **kwargs):
+        """Call a method and return its result
+
+        Raises:
+            ControlError: If the controller is unreachable or the call failed
+        """
+        with self._id_lock:
+            self._next_id += 1
+            request_id = self._next_id
+
+        message = _encode_message({'id': request_id, 'method': method, 'args': args, 'kwargs': kwargs})
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self._timeout)
+                sock.connect(self._socket_path)
+                sock.sendall(message)
+                with sock.makefile('rb') as reader:
+                    line = reader.readline(MAX_MESSAGE_SIZE)
+        except OSError as e:
+            raise ControlError(f"Controller unavailable: {e}")
+
+        if not line:
+            raise ControlError("Controller closed the connection")
+        response = _decode_message(line)
+        if 'error' in response:
+            raise ControlError(response['error'])
+        return response.get('result')
+
+
+class RemoteProxy:
+    """Stand-in for a controller object whose allowed methods run remotely"""
+
+    def __init__(self, client, target):
+        self._client = client
+        self._target = target
+
+    def __getattr__(self, name):
+        if name not in RPC_METHODS.get(self._target, ()):
+            raise AttributeError(f"'{self._target}' has no remote method '{name}'")
+
+        def call(*args, **kwargs):
+            return self._client.call(f'{self._target}.{name}', *args, **kwargs)
+        call.__name__ = name
+        return call
+
+
+class StatsProxy(RemoteProxy):
+    """RemoteProxy for the stats manager that reads part versions from the state segment
+
+    Stats ETag checks run on every conditional request, so they use the
+    versions mirrored by StateSegmentMirror and only fall back to a call
+    before the first segment has been read.
+    """
+
+    def __init__(self, client):
+        super().__init__(client, 'stats')
+
+    def get_part_versions(self, *parts):
+        part_versions = StateSegmentMirror.stats_part_versions
+        if part_versions is None:
+            # JSON turns the tuple into a list, which callers can't use as a key
+            return tuple(self._client.call('stats.get_part_versions', *parts))
+        return tuple(part_versions.get(part, 0) for part in parts)
@@ -0,0 +1,256 @@
+import io
+import csv
+import json
+import base64
+from datetime import datetime
+
+from app.controllers import stats_manager
+from app.utils.json_utils import dumps_bytes
+from app.utils.tick_archive import TickArchive
+
+# Rows fetched from the stats manager per call while streaming
+FETCH_CHUNK = 500
+# Bytes of CSV buffered before each write to the response
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+class ExportError(ValueError):
+    """Raised for invalid export parameters or cursors"""
+    pass
+
+
+def encode_cursor(data):
+    """Encode cursor data as an opaque URL-safe token"""
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token made by encode_cursor
+
+    Raises:
+        ExportError: If the token is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError
+        return data
+    except ValueError:
+        raise ExportError("Invalid cursor")
+
+
+class PumpCycleExport:
+    """Completed pump cycles, ordered by start time
+
+    Positions are (start_time ISO string, number of cycles with that start
+    time already exported).
+    """
+    fields = ('pump', 'start_time', 'end_time', 'duration', 'gallons',
+              'mode', 'tank_state_start', 'tank_state_end')
+
+    @staticmethod
+    def check_position_key(key):
+        """Raise TypeError or ValueError unless key is a position key of this export"""
+        if datetime.fromisoformat(key).tzinfo is not None:
+            raise ValueError("Position times are naive local times")
+
+    @staticmethod
+    def _start(position, start):
+        return datetime.fromisoformat(position[0]) if position else start
+
+    def iter_rows(self, position, start, end, limit):
+        first = self._start(position, start)
+        offset = position[1] if position else 0
+        remaining = limit
+        while remaining > 0:
+            result = stats_manager.get_pump_cycles(start=first, end=end, offset=offset,
+                                                   limit=min(FETCH_CHUNK, remaining),
+                                                   newest_first=False)
+            cycles = result['cycles']
+            for cycle in cycles:
+                yield cycle
+            if len(cycles) < min(FETCH_CHUNK, remaining):
+                return
+            offset += len(cycles)
+            remaining -= len(cycles)
+
+    def next_position(self, position, start, end, limit):
+        first = self._start(position, start)
+        skip = position[1] if position else 0
+        result = stats_manager.get_pump_cycles(start=first, end=end, offset=skip + limit,
+                                               limit=1, newest_first=False)
+        if not result['cycles']:
+            return None
+
+        key = result['cycles'][0]['start_time']
+        from_key = stats_manager.get_pump_cycles(start=datetime.fromisoformat(key), end=end,
+                                                 limit=0, newest_first=False)['total']
+        # Cycles before the next one that share its start time
+        return [key, skip + limit - (result['total'] - from_key)]
+
+
+class TankHistoryExport:
+    """Completed tank states of both tanks, ordered by start time
+
+    The history kept in memory is short, so it is filtered as a whole.
+    Positions are (start_time ISO string, number of states with that start
+    time already exported).
+    """
+    fields = ('tank', 'state', 'start_time', 'end_time', 'duration')
+
+    check_position_key = staticmethod(PumpCycleExport.check_position_key)
+
+    @staticmethod
+    def _rows(start, end):
+        rows = []
+        for tank, history in stats_manager.get_tank_history(max_entries=0).items():
+            for entry in history:
+                started = datetime.fromisoformat(entry['start_time'])
+                if start <= started < end:
+                    rows.append((started, dict(entry, tank=tank)))
+        rows.sort(key=lambda item: item[0])
+        return rows
+
+    @staticmethod
+    def _first_index(rows, position):
+        if not position:
+            return 0
+        key = datetime.fromisoformat(position[0])
+        index = next((i for i, (started, _) in enumerate(rows) if started >= key), len(rows))
+        return index + position[1]
+
+    def iter_rows(self, position, start, end, limit):
+        rows = self._rows(start, end)
+        first = self._first_index(rows, position)
+        for _, row in rows[first:first + limit]:
+            yield row
+
+    def next_position(self, position, start, end, limit):
+        rows = self._rows(start, end)
+        index = self._first_index(rows, position) + limit
+        if index >= len(rows):
+            return None
+        key = rows[index][0]
+        ties = sum(1 for started, _ in rows[:index] if started == key)
+        return [rows[index][1]['start_time'], ties]
+
+
+class TickExport:
+    """Raw archived ticks, read a day at a time
+
+    Positions are (epoch deciseconds, number of ticks at that time already
+    exported).
+    """
+    fields = ('timestamp', 'inputs', 'outputs', 'mode', 'well_pump', 'dist_pump')
+
+    @staticmethod
+    def check_position_key(key):
+        """Raise TypeError unless key is a position key of this export"""
+        if not isinstance(key, int) or isinstance(key, bool):
+            raise TypeError("Tick positions are integers")
+
+    @staticmethod
+    def _bounds(position, start, end):
+        first = position[0] if position else TickArchive.to_deciseconds(start)
+        return first, TickArchive.to_deciseconds(end), position[1] if position else 0
+
+    def iter_rows(self, position, start, end, limit):
+        first, last, skip = self._bounds(position, start, end)
+        remaining = limit
+        for part in TickArchive.iter_range(first, last, skip=skip):
+            columns = TickArchive.decode_rows({name: values[:remaining] for name, values in part.items()})
+            for values in zip(*(columns[field] for field in self.fields)):
+                yield dict(zip(self.fields, values))
+            remaining -= len(columns['timestamp'])
+            if remaining <= 0:
+                return
+
+    def next_position(self, position, start, end, limit):
+        first, last, skip = self._bounds(position, start, end)
+        located = TickArchive.locate(first, last, skip + limit)
+        return list(located) if located else None
+
+
+EXPORTS = {
+    'pump_cycles': PumpCycleExport(),
+    'tank_history': TankHistoryExport(),
+    'ticks': TickExport()
+}
+
+
+def iter_ndjson(rows):
+    """Encode rows as newline-delimited JSON, one row per chunk"""
+    for row in rows:
+        yield dumps_bytes(row) + b'\n'
+
+
+def iter_csv(rows, fields):
+    """Encode rows as CSV with a header row, in chunks of CSV_CHUNK_SIZE"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def prepare_export(export_type, start, end, cursor, limit):
+    """Resolve an export request into its rows and the cursor of the next page
+
+    Args:
+        export_type: Key of EXPORTS (ignored when a cursor is given)
+        start: datetime lower bound (ignored when a cursor is given)
+        end: datetime upper bound (ignored when a cursor is given)
+        cursor: Cursor token from a previous page, or None
+        limit: Maximum number of rows in this page
+
+    Returns:
+        Tuple of (CSV field names, row generator, next cursor token or None)
+
+    Raises:
+        ExportError: If the parameters or cursor are invalid
+    """
+    position = None
+    if cursor:
+        data = decode_cursor(cursor)
+        try:
+            export_type = data['type']
+            start = datetime.fromisoformat(data['from'])
+            end = datetime.fromisoformat(data['to'])
+            position = data['pos']
+            # Cursors are made from naive local times and never skip backwards
+            if start.tzinfo is not None or end.tzinfo is not None:
+                raise ValueError
+            if not (isinstance(position, list) and len(position) == 2
+                    and isinstance(position[1], int) and position[1] >= 0):
+                raise ValueError
+            # The key's type depends on the export; a wrong one would fail mid-query
+            if export_type in EXPORTS:
+                EXPORTS[export_type].check_position_key(position[0])
+        except (KeyError, TypeError, ValueError):
+            raise ExportError("Invalid cursor")
+
+    export = EXPORTS.get(export_type)
+    if export is None:
+        raise ExportError(f"Invalid export type: {export_type}")
+    if start > end:
+        raise ExportError("'from' must not be after 'to'")
+
+    # Positions are found before streaming so the next cursor can go in a header
+    next_position = export.next_position(position, start, end, limit)
+    next_cursor = None
+    if next_position is not None:
+        next_cursor = encode_cursor({
+            'type': export_type,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'pos': next_position
+        })
+
+    return export.fields, export.iter_rows(position, start, end, limit), next_cursor
@@ -0,0 +1,212 @@
+import ssl
+import time
+import socket
+import struct
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait on the broker before giving up on a connection
+MQTT_TIMEOUT = 10.0
+MQTT_KEEPALIVE = 60
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+
+class MqttError(Exception):
+    pass
+
+
+def _encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _encode_string(text):
+    data = text.encode('utf-8')
+    return struct.pack('!H', len(data)) + data
+
+
+def _packet(header, body=b''):
+    return bytes((header,)) + _encode_length(len(body)) + body
+
+
+class MqttClient:
+    """Minimal MQTT 3.1.1 publisher over one persistent connection
+
+    Only what an alert sink needs: CONNECT with optional credentials and
+    TLS, PUBLISH at QoS 0 or 1, and PINGREQ to check a connection that has
+    been idle for half the keepalive before reusing it. QoS 1 messages in
+    one publish_many() call are sent back to back and then their PUBACKs
+    collected, so a batch costs one round trip rather than one per message.
+    """
+
+    def __init__(self, host, port=1883, client_id='pump-control', username=None, password=None,
+                 keepalive=MQTT_KEEPALIVE, use_tls=False, timeout=MQTT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._buffer = b''
+        self._last_used = 0.0
+        self._next_packet_id = 1
+        self.connects = 0
+        self.reconnects = 0
+        self.published = 0
+
+    def _read(self, count):
+        while len(self._buffer) < count:
+            data = self._sock.recv(4096)
+            if not data:
+                raise MqttError("Connection closed by broker")
+            self._buffer += data
+        data, self._buffer = self._buffer[:count], self._buffer[count:]
+        return data
+
+    def _read_packet(self):
+        """Read one packet, returning (packet type, body)"""
+        header = self._read(1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self._read(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header & 0xF0, self._read(length)
+
+    def _connect(self):
+        """Open a connection and wait for the broker to accept it. Lock held."""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            if self.use_tls:
+                sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+            flags = 0x02  # Clean session
+            payload = _encode_string(self.client_id)
+            if self.username:
+                flags |= 0x80
+                payload += _encode_string(self.username)
+                if self.password:
+                    flags |= 0x40
+                    payload += _encode_string(self.password)
+            body = _encode_string('MQTT') + struct.pack('!BBH', 4, flags, self.keepalive) + payload
+            sock.sendall(_packet(CONNECT, body))
+
+            self._sock, self._buffer = sock, b''
+            packet_type, body = self._read_packet()
+            if packet_type != CONNACK or len(body) < 2:
+                raise MqttError("Unexpected reply to CONNECT")
+            if body[1] != 0:
+                raise MqttError(f"Broker refused connection (code {body[1]})")
+        except Exception:
+            self._sock = None
+            sock.close()
+            raise
+        self._last_used = time.monotonic()
+        self.connects += 1
+
+    def _drop(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _ensure_connection(self):
+        """Get a live connection, pinging one that has been idle. Lock held."""
+        if self._sock is not None and time.monotonic() - self._last_used > self.keepalive / 2:
+            try:
+                self._sock.sendall(_packet(PINGREQ))
+                while self._read_packet()[0] != PINGRESP:
+                    pass
+                self._last_used = time.monotonic()
+            except (OSError, MqttError):
+                logger.info("MQTT connection went stale, reconnecting")
+                self.reconnects += 1
+                self._drop()
+        if self._sock is None:
+            self._connect()
+
+    def _publish(self, topic, payloads, qos, dup):
+        """Send PUBLISH packets and wait for their PUBACKs. Lock held."""
+        unacked = set()
+        packets = []
+        for payload in payloads:
+            body = _encode_string(topic)
+            if qos:
+                packet_id = self._next_packet_id
+                self._next_packet_id = packet_id % 65535 + 1
+                body += struct.pack('!H', packet_id)
+                unacked.add(packet_id)
+            packets.append(_packet(PUBLISH | (0x08 if dup else 0) | (qos << 1), body + payload))
+        self._sock.sendall(b''.join(packets))
+        while unacked:
+            packet_type, body = self._read_packet()
+            if packet_type == PUBACK:
+                unacked.discard(struct.unpack('!H', body[:2])[0])
+        self._last_used = time.monotonic()
+
+    def publish_many(self, topic, payloads, qos=1):
+        """Publish messages on the persistent connection
+
+        A connection that fails mid-batch is replaced once and the whole
+        batch resent with the DUP flag, so delivery is at-least-once.
+
+        Args:
+            topic: Topic to publish on
+            payloads: Message bodies as bytes
+            qos: 0 (fire and forget) or 1 (wait for the broker's PUBACK)
+
+        Raises:
+            OSError, MqttError: If the messages could not be published
+        """
+        if qos not in (0, 1):
+            raise ValueError("Only QoS 0 and 1 are supported")
+        with self._lock:
+            for attempt in range(2):
+                self._ensure_connection()
+                try:
+                    self._publish(topic, payloads, qos, dup=attempt > 0)
+                    self.published += len(payloads)
+                    return
+                except (OSError, MqttError):
+                    self._drop()
+                    if attempt:
+                        raise
+                    self.reconnects += 1
+                    logger.info("MQTT connection lost while publishing, reconnecting")
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                try:
+                    self._sock.sendall(_packet(DISCONNECT))
+                except OSError:
+                    pass
+                self._drop()
+
+    def get_stats(self):
+        return {
+            'connected': self._sock is not None,
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'published': self.published
+        }
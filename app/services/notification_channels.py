@@ -0,0 +1,384 @@
+from email.mime.text import MIMEText
+import os
+import smtplib
+import json
+import time
+import socket
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .smtp_client import SmtpClient
+from .notification_dispatcher import PermanentDeliveryError
+from .mqtt_client import MqttClient, MQTT_KEEPALIVE
+
+logger = logging.getLogger(__name__)
+
+# Webhook timeouts in seconds; channels may override them with
+# 'connect_timeout' and 'read_timeout' in their config
+WEBHOOK_CONNECT_TIMEOUT = 5.0
+WEBHOOK_READ_TIMEOUT = 10.0
+# Attempts per webhook message when rate limited (HTTP 429)
+WEBHOOK_MAX_ATTEMPTS = 3
+# Longer Retry-After waits fail the message rather than hold up the channel
+WEBHOOK_MAX_RETRY_AFTER = 30.0
+
+# Events per POST to a JSON webhook, and seconds the first event waits for
+# others to share its request; both can be set per channel
+WEBHOOK_BATCH_SIZE = 20
+WEBHOOK_BATCH_DELAY = 1.0
+# Messages per MQTT publish batch
+MQTT_BATCH_SIZE = 20
+MQTT_TOPIC = 'pump_control/alerts'
+
+_registry = {}
+
+
+def register_channel(cls):
+    """Class decorator adding a NotificationChannel to the registry under its name"""
+    _registry[cls.name] = cls
+    return cls
+
+
+def get_channel_class(name):
+    """Get the registered channel class for a channel name, or None"""
+    return _registry.get(name)
+
+
+def get_channel_names():
+    return list(_registry)
+
+
+def _check_status(response, ok, label):
+    """Raise unless the response status is ok
+
+    Raises:
+        PermanentDeliveryError: For a 4xx other than 429, which a retry
+            would only repeat
+        Exception: For any other unexpected status
+    """
+    if ok(response.status_code):
+        return
+    error = f"{label} error: {response.status_code} - {response.text[:200]}"
+    if 400 <= response.status_code < 500 and response.status_code != 429:
+        raise PermanentDeliveryError(error)
+    raise Exception(error)
+
+
+def _retry_after(response):
+    """Seconds to wait before retrying a 429 response, from the header or Discord's JSON body"""
+    try:
+        return max(0.0, float(response.headers['Retry-After']))
+    except (KeyError, ValueError):
+        pass
+    try:
+        return max(0.0, float(response.json()['retry_after']))
+    except (ValueError, KeyError, TypeError):
+        return 1.0
+
+
+class NotificationChannel:
+    """Base class of the channel plugins
+
+    A channel turns alert events into messages on one transport. Events
+    are dicts with 'id', 'created' (epoch seconds), 'type' (alert type
+    name) and 'message'. One instance serves a channel for the life of the
+    process, so it can keep connections open between alerts; send methods
+    are called from the channel's dispatcher thread, and from a control
+    server thread for test messages. Only the process delivering alerts
+    creates channels, so web workers never hold connections of their own.
+
+    To add a channel, subclass this, set name (a value of AlertChannel)
+    and required_keys, implement send(), and decorate with
+    @register_channel. Channels able to carry several events per request
+    override send_batch() and get_batch_policy().
+    """
+
+    name = None
+    # Config keys that must be present for the channel to be saved
+    required_keys = ()
+
+    @classmethod
+    def validate(cls, config):
+        """Check a channel config before it is saved"""
+        return all(key in config for key in cls.required_keys)
+
+    def get_batch_policy(self, config):
+        """Get (max events per send_batch call, seconds to wait for a batch to fill)"""
+        return 1, 0.0
+
+    def send(self, event, config):
+        """Send one event
+
+        Raises:
+            PermanentDeliveryError: If the receiver rejected the event
+            Exception: If sending failed and may succeed later
+        """
+        raise NotImplementedError
+
+    def send_batch(self, events, config):
+        """Send several events; all succeed or the batch is retried"""
+        for event in events:
+            self.send(event, config)
+
+    def close(self):
+        """Release connections held open between alerts"""
+
+    def get_stats(self):
+        """Get transport statistics, or None if the channel keeps none"""
+        return None
+
+
+class HttpChannel(NotificationChannel):
+    """Channel posting JSON over a persistent HTTP session
+
+    Connections are kept alive between alerts, so a message on a warm
+    connection costs one round trip instead of DNS, TCP and TLS setup.
+    Failed connection attempts are retried; requests that reached the
+    server are not, so a message is never posted twice.
+    """
+
+    required_keys = ('webhook_url',)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+
+    def _get_session(self):
+        session = self._session
+        if session is None:
+            with self._lock:
+                session = self._session
+                if session is None:
+                    session = requests.Session()
+                    retries = Retry(total=2, connect=2, read=0, status=0, other=0,
+                                    backoff_factor=0.5, allowed_methods=None,
+                                    respect_retry_after_header=False, raise_on_status=False)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=retries)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers['Content-Type'] = 'application/json'
+                    self._session = session
+        return session
+
+    def _post(self, config, payload, headers=None):
+        """POST a payload, waiting out 429 responses as told by Retry-After
+
+        Returns:
+            The final response
+        """
+        timeout = (float(config.get('connect_timeout', WEBHOOK_CONNECT_TIMEOUT)),
+                   float(config.get('read_timeout', WEBHOOK_READ_TIMEOUT)))
+        session = self._get_session()
+        for attempt in range(WEBHOOK_MAX_ATTEMPTS):
+            response = session.post(config['webhook_url'], json=payload, headers=headers, timeout=timeout)
+            if response.status_code != 429 or attempt == WEBHOOK_MAX_ATTEMPTS - 1:
+                return response
+            delay = _retry_after(response)
+            if delay > WEBHOOK_MAX_RETRY_AFTER:
+                return response
+            logger.info(f"{self.name} webhook rate limited, retrying in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+@register_channel
+class EmailChannel(NotificationChannel):
+    name = 'email'
+    required_keys = ('smtp_server', 'smtp_port', 'username', 'password', 'from_email', 'to_emails')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+
+    def _get_client(self, config):
+        """Get the SMTP client for the config, replacing it if the config changed"""
+        with self._lock:
+            client = self._client
+            if client is None or client.config != config:
+                if client is not None:
+                    client.close()
+                client = self._client = SmtpClient(dict(config))
+            return client
+
+    # No batch policy: SMTP accepts messages one at a time, so a failure
+    # part way through a batch would have the ones already accepted sent
+    # again on retry. Consecutive alerts still share the open session.
+
+    @staticmethod
+    def _build_message(event, config):
+        msg = MIMEText(event['message'])
+        msg['Subject'] = f"Water System Alert: {event['type']}"
+        msg['From'] = config['from_email']
+        msg['To'] = ', '.join(config['to_emails'])
+        return msg
+
+    def send(self, event, config):
+        self.send_batch([event], config)
+
+    def send_batch(self, events, config):
+        try:
+            # Reuses the logged-in connection left open by the last alert
+            self._get_client(config).send_messages([self._build_message(event, config) for event in events])
+            logger.info(f"Email alerts sent: {len(events)}")
+        except smtplib.SMTPRecipientsRefused as e:
+            logger.error(f"Email recipients refused: {e}")
+            raise PermanentDeliveryError(f"Recipients refused: {e}") from e
+        except smtplib.SMTPResponseException as e:
+            logger.error(f"Error sending email: {e}")
+            if e.smtp_code >= 500:
+                raise PermanentDeliveryError(f"SMTP error {e.smtp_code}: {e.smtp_error!r}") from e
+            raise
+        except Exception as e:
+            logger.error(f"Error sending email: {e}")
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+
+    def get_stats(self):
+        client = self._client
+        return client.get_stats() if client is not None else None
+
+
+@register_channel
+class SlackChannel(HttpChannel):
+    name = 'slack'
+
+    def send(self, event, config):
+        try:
+            payload = {
+                "text": f"*Water System Alert: {event['type']}*\n{event['message']}"
+            }
+
+            response = self._post(config, payload)
+            _check_status(response, lambda status: status == 200, "Slack API")
+
+            logger.info(f"Slack alert sent: {event['type']}")
+
+        except Exception as e:
+            logger.error(f"Error sending Slack alert: {e}")
+            raise
+
+
+@register_channel
+class DiscordChannel(HttpChannel):
+    name = 'discord'
+
+    def send(self, event, config):
+        try:
+            payload = {
+                "content": f"**Water System Alert: {event['type']}**\n{event['message']}"
+            }
+
+            response = self._post(config, payload)
+            # Discord returns 204 on success
+            _check_status(response, lambda status: status == 204, "Discord API")
+
+            logger.info(f"Discord alert sent: {event['type']}")
+
+        except Exception as e:
+            logger.error(f"Error sending Discord alert: {e}")
+            raise
+
+
+@register_channel
+class WebhookChannel(HttpChannel):
+    """Generic JSON sink for a collector of our own
+
+    Posts {"source": "pump_control", "host": ..., "events": [...]} with up
+    to 'batch_size' events per request. An event waits up to
+    'batch_delay' seconds for others to join it, so a burst becomes a
+    handful of requests. An optional 'auth_token' is sent as a bearer
+    token. Any 2xx response counts as delivered.
+    """
+
+    name = 'webhook'
+
+    def get_batch_policy(self, config):
+        return (max(1, int(config.get('batch_size') or WEBHOOK_BATCH_SIZE)),
+                max(0.0, float(config.get('batch_delay') or WEBHOOK_BATCH_DELAY)))
+
+    def send(self, event, config):
+        self.send_batch([event], config)
+
+    def send_batch(self, events, config):
+        headers = None
+        if config.get('auth_token'):
+            headers = {'Authorization': f"Bearer {config['auth_token']}"}
+        payload = {'source': 'pump_control', 'host': socket.gethostname(), 'events': events}
+        response = self._post(config, payload, headers)
+        _check_status(response, lambda status: 200 <= status < 300, "Webhook")
+        logger.info(f"Webhook delivered {len(events)} events")
+
+
+@register_channel
+class MqttChannel(NotificationChannel):
+    """Publishes each event as JSON on an MQTT topic over one persistent connection
+
+    Config: 'host', and optionally 'port' (1883), 'topic', 'username',
+    'password', 'client_id', 'tls', 'qos' (0 or 1, default 1) and
+    'keepalive'. The client id defaults to one made from the host name
+    and process id.
+    """
+
+    name = 'mqtt'
+    required_keys = ('host',)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_config = None
+
+    @staticmethod
+    def _default_client_id():
+        # Brokers drop the older session when a client id connects twice,
+        # so two processes sharing one id would knock each other off
+        return f"pump-control-{socket.gethostname()}-{os.getpid()}"
+
+    def _get_client(self, config):
+        with self._lock:
+            if self._client is None or self._client_config != config:
+                if self._client is not None:
+                    self._client.close()
+                self._client = MqttClient(
+                    config['host'],
+                    port=int(config.get('port') or 1883),
+                    client_id=config.get('client_id') or self._default_client_id(),
+                    username=config.get('username') or None,
+                    password=config.get('password') or None,
+                    keepalive=int(config.get('keepalive') or MQTT_KEEPALIVE),
+                    use_tls=str(config.get('tls', '')).lower() in ('1', 'true', 'yes', 'on')
+                )
+                self._client_config = dict(config)
+            return self._client
+
+    def get_batch_policy(self, config):
+        return MQTT_BATCH_SIZE, 0.0
+
+    def send(self, event, config):
+        self.send_batch([event], config)
+
+    def send_batch(self, events, config):
+        qos = int(config.get('qos', 1))
+        payloads = [json.dumps(event, separators=(',', ':')).encode('utf-8') for event in events]
+        self._get_client(config).publish_many(config.get('topic') or MQTT_TOPIC, payloads, qos)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+
+    def get_stats(self):
+        client = self._client
+        return client.get_stats() if client is not None else None
@@ -0,0 +1,488 @@
+import os
+import re
+import time
+import uuid
+import queue
+import random
+import logging
+import threading
+from itertools import islice
+from collections import deque
+from .alert_outbox import AlertOutbox
+
+logger = logging.getLogger(__name__)
+
+# Alerts waiting per channel before the drop policy applies
+QUEUE_SIZE = 100
+# Delivery latencies kept per channel for the metrics
+LATENCY_SAMPLES = 200
+
+# Alerts kept for retrying per channel; beyond this the oldest is given up
+MAX_PENDING = 500
+# Alerts older than this are given up rather than delivered late
+MAX_PENDING_AGE = 24 * 3600
+# Retry delay after the first failure, doubling per failure up to the cap,
+# each scaled by a random factor in [0.5, 1] so channels don't retry in step
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+# Parts of error messages that may carry credentials: full URLs, the
+# path urllib3 reports after 'url:' (a webhook URL's path is its secret),
+# bearer tokens and key=value secrets
+_SECRET_PATTERNS = (
+    (re.compile(r'[a-zA-Z][\w+.-]*://\S+'), '<url>'),
+    (re.compile(r'(url: )\S+', re.IGNORECASE), r'\1<redacted>'),
+    (re.compile(r'(bearer )\S+', re.IGNORECASE), r'\1<redacted>'),
+    (re.compile(r'((?:password|passwd|token|secret|key)=)[^\s&,;]+', re.IGNORECASE), r'\1<redacted>'),
+)
+
+
+def describe_error(error):
+    """Get an error's message with URLs and credentials removed, safe to show in metrics"""
+    message = str(error)
+    for pattern, replacement in _SECRET_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a deliver function when retrying cannot help
+
+    E.g. the receiver rejected the message itself. The alerts being
+    delivered are given up instead of retried.
+    """
+    pass
+
+
+class ChannelQueue:
+    """Queue, pending alerts and delivery metrics of one channel"""
+
+    def __init__(self, name, maxsize, outbox=None):
+        self.name = name
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.outbox = outbox
+        self.pending = deque()
+        self.windows = {}  # coalescing key -> open digest window
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.batch_due = 0.0
+        self.thread = None
+        self.enqueued = 0
+        self.delivered = 0
+        self.batches = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retries = 0
+        self.dropped = 0
+        self.expired = 0
+        self.coalesced = 0
+        self.digests = 0
+        self.max_depth = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.last_error = None
+        self.last_delivery = None
+
+    def get_metrics(self):
+        latencies = sorted(self.latencies)
+        return {
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'capacity': self.queue.maxsize,
+            'pending': len(self.pending),
+            'held': sum(len(window['held']) for window in list(self.windows.values())),
+            'enqueued': self.enqueued,
+            'delivered': self.delivered,
+            'batches': self.batches,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'retries': self.retries,
+            'dropped': self.dropped,
+            'expired': self.expired,
+            'coalesced': self.coalesced,
+            'digests': self.digests,
+            'next_retry_in': max(0.0, self.next_attempt - time.monotonic()) if self.failures else None,
+            'latency_avg': sum(latencies) / len(latencies) if latencies else None,
+            'latency_p95': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+            'latency_max': latencies[-1] if latencies else None,
+            'last_delivery': self.last_delivery,
+            'last_error': self.last_error
+        }
+
+
+class NotificationDispatcher:
+    """Deliver alerts on background threads, one worker per channel
+
+    submit() only appends to the channel's bounded in-memory queue, so
+    callers on the control thread never wait on a mail server, webhook or
+    disk, and a slow channel only delays its own alerts. When a queue is
+    full the drop policy decides which alert is lost: DROP_OLDEST keeps
+    the most recent alerts, DROP_NEWEST keeps the backlog.
+
+    The worker moves queued alerts into the channel's pending list and,
+    when a spool directory is given, records them in the channel's
+    AlertOutbox first. Pending alerts are delivered oldest first; a failed
+    delivery is retried with exponential backoff and jitter, and later
+    alerts wait behind it so they go out in order, unless it raised
+    PermanentDeliveryError, in which case it is given up at once.
+    recover() replays the alerts left in the spools by a previous run.
+
+    With a coalesce policy, an alert opens a window for its key and is
+    sent at once; alerts with the same key arriving while the window is
+    open are held (still spooled) and sent as one digest when it closes.
+    A window that produced a digest stays open for another period, so a
+    sustained storm yields one message per window.
+
+    With a batch policy, a channel that can carry several alerts per
+    request gets up to its batch size of pending alerts in one call, and
+    the oldest may wait a short delay for others to join it.
+    """
+
+    def __init__(self, deliver=None, queue_size=QUEUE_SIZE, drop_policy=DROP_OLDEST, spool_dir=None,
+                 coalesce=None, make_digest=None, deliver_batch=None, batch_policy=None):
+        """
+        Args:
+            deliver: Function called as deliver(channel, *args) on the
+                channel's worker thread; an exception means the delivery
+                failed and will be retried. Not used when deliver_batch
+                is given.
+            queue_size: Maximum queued alerts per channel
+            drop_policy: DROP_OLDEST or DROP_NEWEST
+            spool_dir: Directory of the per-channel outbox spools, or None
+                to keep pending alerts in memory only. Spooled alert
+                arguments must be JSON serializable.
+            coalesce: Optional function called as coalesce(channel, args)
+                returning (key, window seconds) for an alert that may be
+                batched, or None to send it at once
+            make_digest: Function called as make_digest(channel, key,
+                entries) returning the deliver arguments of a digest of
+                the held entries (dicts with 'created' and 'args')
+            deliver_batch: Function called as deliver_batch(channel,
+                entries) instead of deliver, with entries as dicts with
+                'id', 'created' and 'args'. The entries keep their id and
+                creation time across retries, so receivers can use them
+                to drop duplicates.
+            batch_policy: Function called as batch_policy(channel)
+                returning (batch size, seconds the oldest alert may wait
+                for a batch to fill)
+        """
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Invalid drop policy: {drop_policy}")
+        if deliver is None and deliver_batch is None:
+            raise ValueError("Either deliver or deliver_batch is required")
+        self._deliver = deliver
+        self._queue_size = queue_size
+        self._drop_policy = drop_policy
+        self._spool_dir = spool_dir
+        self._coalesce = coalesce
+        self._make_digest = make_digest
+        self._deliver_batch = deliver_batch
+        self._batch_policy = batch_policy
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def _get_channel(self, channel, recovered=None):
+        """Get a channel's queue, starting its worker on first use
+
+        Args:
+            channel: Channel name
+            recovered: Pending entries replayed from the spool, only
+                used when the channel is first started
+        """
+        channel_queue = self._channels.get(channel)
+        if channel_queue is None:
+            with self._lock:
+                channel_queue = self._channels.get(channel)
+                if channel_queue is None:
+                    outbox = None
+                    if self._spool_dir:
+                        outbox = AlertOutbox(os.path.join(self._spool_dir, f'{channel}.log'))
+                    channel_queue = ChannelQueue(channel, self._queue_size, outbox)
+                    # Coalesced again, so a storm replayed after a restart
+                    # still goes out as digests; the worker isn't running yet
+                    for entry in recovered or ():
+                        self._accept(channel_queue, entry, spool=False)
+                    channel_queue.thread = threading.Thread(
+                        target=self._run, args=(channel, channel_queue),
+                        name=f'notify-{channel}', daemon=True
+                    )
+                    channel_queue.thread.start()
+                    self._channels[channel] = channel_queue
+        return channel_queue
+
+    def recover(self):
+        """Start delivering the alerts left pending in the spools
+
+        Call once at startup in the process that owns notifications.
+
+        Returns:
+            Number of alerts recovered
+        """
+        if not self._spool_dir or not os.path.isdir(self._spool_dir):
+            return 0
+        count = 0
+        for filename in sorted(os.listdir(self._spool_dir)):
+            channel, ext = os.path.splitext(filename)
+            if ext != '.log' or channel in self._channels:
+                continue
+            try:
+                entries = AlertOutbox(os.path.join(self._spool_dir, filename)).load()
+            except OSError as e:
+                logger.error(f"Error reading alert outbox {filename}: {e}")
+                continue
+            if entries:
+                logger.info(f"Replaying {len(entries)} pending {channel} alerts")
+                self._get_channel(channel, recovered=entries)
+                count += len(entries)
+        return count
+
+    def submit(self, channel, *args, timeout=0):
+        """Queue an alert for delivery on a channel
+
+        Args:
+            channel: Channel name
+            args: Passed to the deliver function after the channel
+            timeout: Seconds to wait for room in a full queue before the
+                drop policy applies; 0 (the default) never blocks
+
+        Returns:
+            True if the alert was queued, False if it was dropped
+        """
+        if self._stopping:
+            return False
+        channel_queue = self._get_channel(channel)
+        item = {'id': uuid.uuid4().hex, 'created': time.time(), 'args': list(args)}
+        try:
+            if timeout:
+                channel_queue.queue.put(item, timeout=timeout)
+            else:
+                channel_queue.queue.put_nowait(item)
+        except queue.Full:
+            channel_queue.dropped += 1
+            if self._drop_policy == DROP_NEWEST:
+                logger.warning(f"Notification queue for {channel} full, dropped new alert")
+                return False
+            try:
+                channel_queue.queue.get_nowait()
+                channel_queue.queue.task_done()
+            except queue.Empty:
+                pass
+            logger.warning(f"Notification queue for {channel} full, dropped oldest alert")
+            try:
+                channel_queue.queue.put_nowait(item)
+            except queue.Full:
+                return False
+
+        channel_queue.enqueued += 1
+        channel_queue.max_depth = max(channel_queue.max_depth, channel_queue.queue.qsize())
+        return True
+
+    def _accept(self, channel_queue, item, spool=True):
+        """Move a queued alert to the pending list, spooling it first
+
+        Args:
+            spool: False for an alert replayed from the spool
+        """
+        if spool and channel_queue.outbox is not None:
+            try:
+                channel_queue.outbox.add(item)
+            except OSError as e:
+                logger.error(f"Error spooling {channel_queue.name} alert: {e}")
+
+        policy = None
+        if self._coalesce is not None:
+            try:
+                policy = self._coalesce(channel_queue.name, item['args'])
+            except Exception as e:
+                logger.error(f"Error in {channel_queue.name} coalesce policy: {e}")
+        if policy and policy[1] > 0:
+            key, window = policy
+            now = time.monotonic()
+            open_window = channel_queue.windows.get(key)
+            if open_window is not None and now < open_window['end']:
+                open_window['held'].append(item)
+                channel_queue.coalesced += 1
+                return
+            channel_queue.windows[key] = {'end': now + window, 'window': window, 'held': []}
+
+        channel_queue.pending.append(item)
+        while len(channel_queue.pending) > MAX_PENDING:
+            self._finish(channel_queue, channel_queue.pending.popleft())
+            channel_queue.dropped += 1
+
+    def _close_windows(self, channel_queue):
+        """Turn the alerts held by expired coalescing windows into digests"""
+        now = time.monotonic()
+        for key, window in list(channel_queue.windows.items()):
+            if now < window['end']:
+                continue
+            held = window['held']
+            if not held:
+                del channel_queue.windows[key]
+                continue
+            try:
+                args = self._make_digest(channel_queue.name, key, held)
+            except Exception as e:
+                logger.error(f"Error building {channel_queue.name} digest: {e}")
+                channel_queue.pending.extend(held)
+            else:
+                # The held alerts stay spooled until the digest is delivered
+                channel_queue.pending.append({
+                    'id': uuid.uuid4().hex,
+                    'created': held[0]['created'],
+                    'args': list(args),
+                    'entries': held
+                })
+                channel_queue.digests += 1
+            window['held'] = []
+            window['end'] = now + window['window']
+
+    @staticmethod
+    def _spooled_entries(channel_queue):
+        """Get the spooled entries not yet finished, for compaction"""
+        entries = []
+        for entry in channel_queue.pending:
+            entries.extend(entry.get('entries') or (entry,))
+        for window in channel_queue.windows.values():
+            entries.extend(window['held'])
+        return entries
+
+    def _finish(self, channel_queue, entry):
+        """Forget an entry that was delivered or given up on"""
+        if channel_queue.outbox is not None:
+            try:
+                for part in entry.get('entries') or (entry,):
+                    channel_queue.outbox.done(part['id'])
+                if channel_queue.outbox.needs_compaction():
+                    channel_queue.outbox.compact(self._spooled_entries(channel_queue))
+            except OSError as e:
+                logger.error(f"Error updating {channel_queue.name} alert outbox: {e}")
+
+    def _get_batch_policy(self, channel):
+        if self._batch_policy is None:
+            return 1, 0.0
+        try:
+            return self._batch_policy(channel)
+        except Exception as e:
+            logger.error(f"Error in {channel} batch policy: {e}")
+            return 1, 0.0
+
+    def _batch_wait(self, channel, channel_queue):
+        """Seconds the oldest pending alert should still wait for a batch to fill"""
+        size, delay = self._get_batch_policy(channel)
+        if size <= 1 or delay <= 0 or len(channel_queue.pending) >= size:
+            return 0.0
+        return max(0.0, delay - (time.time() - channel_queue.pending[0]['created']))
+
+    def _attempt(self, channel, channel_queue):
+        """Try to deliver the oldest pending alerts"""
+        pending = channel_queue.pending
+        now = time.time()
+        while pending and now - pending[0]['created'] > MAX_PENDING_AGE:
+            channel_queue.expired += 1
+            self._finish(channel_queue, pending.popleft())
+        if not pending:
+            return
+
+        size = self._get_batch_policy(channel)[0] if self._deliver_batch is not None else 1
+        batch = list(islice(pending, size)) if size > 1 else [pending[0]]
+        try:
+            if self._deliver_batch is not None:
+                self._deliver_batch(channel, batch)
+            else:
+                self._deliver(channel, *batch[0]['args'])
+        except PermanentDeliveryError as e:
+            channel_queue.failed += 1
+            channel_queue.last_error = describe_error(e)
+            logger.error(f"{channel} rejected {len(batch)} alerts, not retrying: {e}")
+            for entry in batch:
+                pending.popleft()
+                channel_queue.rejected += 1
+                self._finish(channel_queue, entry)
+            return
+        except Exception as e:
+            channel_queue.failures += 1
+            channel_queue.failed += 1
+            channel_queue.last_error = describe_error(e)
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (channel_queue.failures - 1))
+            delay *= random.uniform(0.5, 1.0)
+            # The channel may know better, e.g. when its circuit breaker will probe
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None:
+                delay = min(RETRY_MAX_SECONDS, retry_after) + random.uniform(0.0, 1.0)
+            channel_queue.next_attempt = time.monotonic() + delay
+            logger.error(f"Error delivering {channel} alert, retrying in {delay:.0f}s: {e}")
+            return
+
+        if channel_queue.failures:
+            channel_queue.retries += channel_queue.failures
+        channel_queue.failures = 0
+        channel_queue.batches += 1
+        now = time.time()
+        channel_queue.last_delivery = now
+        for entry in batch:
+            pending.popleft()
+            channel_queue.delivered += 1
+            channel_queue.latencies.append(now - entry['created'])
+            self._finish(channel_queue, entry)
+
+    def _run(self, channel, channel_queue):
+        while True:
+            # Sleep until the next retry or window close is due, waking for new alerts
+            deadlines = [window['end'] for window in channel_queue.windows.values()]
+            if channel_queue.pending:
+                deadlines.append(max(channel_queue.next_attempt, channel_queue.batch_due))
+            wait = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                item = channel_queue.queue.get(timeout=wait) if wait != 0.0 else channel_queue.queue.get_nowait()
+            except queue.Empty:
+                item = False
+
+            # Spool everything queued before delivering anything
+            while item is not False:
+                channel_queue.queue.task_done()
+                if item is None:
+                    if channel_queue.outbox is not None:
+                        channel_queue.outbox.close()
+                    return
+                self._accept(channel_queue, item)
+                try:
+                    item = channel_queue.queue.get_nowait()
+                except queue.Empty:
+                    item = False
+
+            if channel_queue.windows:
+                self._close_windows(channel_queue)
+            now = time.monotonic()
+            if channel_queue.pending and now >= channel_queue.next_attempt:
+                # Recomputed each pass, so a batch that fills early goes at once
+                wait = self._batch_wait(channel, channel_queue)
+                if wait > 0:
+                    channel_queue.batch_due = now + wait
+                else:
+                    channel_queue.batch_due = 0.0
+                    self._attempt(channel, channel_queue)
+
+    def get_metrics(self):
+        """Get queue depth, pending alerts, delivery counts and latency per channel"""
+        return {channel_queue.name: channel_queue.get_metrics()
+                for channel_queue in list(self._channels.values())}
+
+    def shutdown(self, timeout=5.0):
+        """Stop accepting alerts and spool the queued ones
+
+        Alerts still pending when the workers stop stay in the spools for
+        recover() to replay.
+        """
+        self._stopping = True
+        deadline = time.monotonic() + timeout
+        for channel_queue in list(self._channels.values()):
+            try:
+                channel_queue.queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                continue
+        for channel_queue in list(self._channels.values()):
+            channel_queue.thread.join(max(0.0, deadline - time.monotonic()))
@@ -1,14 +1,24 @@
-import smtplib
-from email.mime.text import MIMEText
-import requests
-import json
+import os
 import time
+import uuid
 import logging
 import threading
+from datetime import datetime
 from ..utils.notification_config import AlertConfig, AlertChannel, AlertType
+from .notification_dispatcher import NotificationDispatcher, PermanentDeliveryError
+from .notification_channels import get_channel_class
+from .channel_health import ChannelHealth
+from ..utils.config_utils import CONFIG_DIR
 
 logger = logging.getLogger(__name__)
 
+# Alerts accepted but not yet delivered, one spool per channel
+OUTBOX_DIR = os.path.join(CONFIG_DIR, 'alert_outbox')
+
+# Alerts listed in a digest; the rest are only counted
+DIGEST_MAX_LINES = 20
+
+
 class NotificationService:
     _instance = None
     _lock = threading.Lock()
@@ -25,22 +35,39 @@ class NotificationService:
             
         self.config = AlertConfig()
         self.last_alert_times = {}  # Track last alert time for rate limiting
+        # Delivery happens on the dispatcher's threads, never the caller's
+        self.dispatcher = NotificationDispatcher(
+            spool_dir=OUTBOX_DIR,
+            coalesce=self._coalesce, make_digest=self._make_digest,
+            deliver_batch=self._deliver_batch, batch_policy=self._batch_policy
+        )
+        self._plugins = {}  # channel -> NotificationChannel
+        self._health = {}  # channel -> ChannelHealth
         self._initialized = True
 
     def send_alert(self, alert_type: AlertType, message: str, data: dict = None):
-        """Send an alert through configured channels
-        
+        """Queue an alert for delivery through configured channels
+
+        Returns as soon as the alert is queued, so it is safe to call from
+        the control loop; see NotificationDispatcher for queueing and drops.
+
         Args:
             alert_type: Type of alert (from AlertType enum)
             message: Alert message
             data: Optional dictionary of additional data
+
+        Returns:
+            bool: True if the alert was queued on at least one channel,
+            False if it was rate limited, had no channels or was dropped
         """
         try:
+            # Pick up changes saved from the alerts page
+            self.config.reload_if_changed()
             channels = self.config.get_channels_for_alert(alert_type)
             
             if not channels:
                 logger.warning(f"No channels configured for alert type: {alert_type}")
-                return
+                return False
 
             # Check rate limiting
             current_time = time.time()
@@ -52,7 +79,7 @@ class NotificationService:
                 
                 if current_time - last_time < rate_limit:
                     logger.info(f"Rate limited alert: {alert_type}")
-                    return
+                    return False
                 
                 self.last_alert_times[alert_key] = current_time
 
@@ -61,115 +88,182 @@ class NotificationService:
             if data:
                 full_message += "\n\nDetails:\n" + "\n".join(f"{k}: {v}" for k, v in data.items())
 
-            # Send through each configured channel
+            # Queue for each configured channel; the dispatcher spools and
+            # retries it, so an alert accepted here is not lost to an outage
+            queued = False
             for channel in channels:
-                try:
-                    channel_config = self.config.get_channel_config(channel)
-                    if not channel_config:
-                        continue
-
-                    if channel == AlertChannel.EMAIL:
-                        self._send_email(alert_type, full_message, channel_config)
-                    elif channel == AlertChannel.SLACK:
-                        self._send_slack(alert_type, full_message, channel_config)
-                    elif channel == AlertChannel.DISCORD:
-                        self._send_discord(alert_type, full_message, channel_config)
-
-                except Exception as e:
-                    logger.error(f"Error sending {channel} alert: {e}")
+                queued = self.dispatcher.submit(channel.value, alert_type.value, full_message) or queued
+            return queued
 
         except Exception as e:
             logger.error(f"Error in send_alert: {e}")
+            return False
 
-    def _send_email(self, alert_type: AlertType, message: str, config: dict):
-        """Send email alert"""
-        try:
-            msg = MIMEText(message)
-            msg['Subject'] = f'Water System Alert: {alert_type.value}'
-            msg['From'] = config['from_email']
-            msg['To'] = ', '.join(config['to_emails'])
+    def start(self):
+        """Resume delivering alerts left in the outbox by a previous run
 
-            with smtplib.SMTP_SSL(config['smtp_server'], config['smtp_port']) as server:
-                server.login(config['username'], config['password'])
-                server.send_message(msg)
+        Called once by the process that owns the mode handlers.
+        """
+        count = self.dispatcher.recover()
+        if count:
+            logger.info(f"Recovered {count} undelivered alerts")
 
-            logger.info(f"Email alert sent: {alert_type}")
+    def _coalesce(self, channel_name: str, args: list):
+        """Dispatcher coalesce policy: batch alerts of one type per channel"""
+        alert_type_name = args[0]
+        window = self.config.get_coalesce_window(AlertType(alert_type_name), AlertChannel(channel_name))
+        return alert_type_name, window
 
-        except Exception as e:
-            logger.error(f"Error sending email: {e}")
-            raise
+    def _make_digest(self, channel_name: str, alert_type_name: str, entries: list):
+        """Build one message summarizing the alerts held in a digest window
 
-    def _send_slack(self, alert_type: AlertType, message: str, config: dict):
-        """Send Slack alert"""
-        try:
-            payload = {
-                "text": f"*Water System Alert: {alert_type.value}*\n{message}"
-            }
-
-            response = requests.post(
-                config['webhook_url'],
-                json=payload,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Slack API error: {response.status_code} - {response.text}")
+        Returns:
+            Deliver arguments (alert type name, digest message)
+        """
+        first = datetime.fromtimestamp(entries[0]['created'])
+        last = datetime.fromtimestamp(entries[-1]['created'])
+        lines = [
+            f"{len(entries)} {alert_type_name} alerts between "
+            f"{first.strftime('%Y-%m-%d %H:%M:%S')} and {last.strftime('%Y-%m-%d %H:%M:%S')}",
+            ""
+        ]
+        for entry in entries[:DIGEST_MAX_LINES]:
+            # First line of each alert; the details are left out
+            summary = entry['args'][1].split('\n', 1)[0]
+            lines.append(f"[{datetime.fromtimestamp(entry['created']).strftime('%H:%M:%S')}] {summary}")
+        if len(entries) > DIGEST_MAX_LINES:
+            lines.append(f"... and {len(entries) - DIGEST_MAX_LINES} more")
+        return alert_type_name, "\n".join(lines)
 
-            logger.info(f"Slack alert sent: {alert_type}")
+    def _deliver_batch(self, channel_name: str, entries: list):
+        """Send pending alerts on one channel; runs on the channel's dispatcher thread
 
-        except Exception as e:
-            logger.error(f"Error sending Slack alert: {e}")
-            raise
+        Events carry the id and creation time the alert was queued with,
+        so a retried alert looks the same to the receiver every time.
 
-    def _send_discord(self, alert_type: AlertType, message: str, config: dict):
-        """Send Discord alert"""
-        try:
-            payload = {
-                "content": f"**Water System Alert: {alert_type.value}**\n{message}"
-            }
-
-            response = requests.post(
-                config['webhook_url'],
-                json=payload,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            if response.status_code != 204:  # Discord returns 204 on success
-                raise Exception(f"Discord API error: {response.status_code} - {response.text}")
+        Raises:
+            Exception: If sending failed, so the dispatcher retries it
+        """
+        channel = AlertChannel(channel_name)
+        channel_config = self.config.get_channel_config(channel)
+        if not channel_config:
+            # Channel removed since the alert was queued
+            return
+
+        events = [{'id': entry['id'], 'created': entry['created'],
+                   'type': entry['args'][0], 'message': entry['args'][1]} for entry in entries]
+        self._send(channel, events, channel_config)
 
-            logger.info(f"Discord alert sent: {alert_type}")
+    def _batch_policy(self, channel_name: str):
+        """Dispatcher batch policy: as the channel's plugin allows"""
+        channel = AlertChannel(channel_name)
+        channel_config = self.config.get_channel_config(channel)
+        plugin = self._get_plugin(channel)
+        if not channel_config or plugin is None:
+            return 1, 0.0
+        return plugin.get_batch_policy(channel_config)
 
+    def _get_plugin(self, channel: AlertChannel):
+        """Get the channel's plugin instance, or None if no plugin is registered for it"""
+        plugin = self._plugins.get(channel)
+        if plugin is None:
+            channel_class = get_channel_class(channel.value)
+            if channel_class is None:
+                return None
+            with self._lock:
+                plugin = self._plugins.get(channel)
+                if plugin is None:
+                    plugin = self._plugins[channel] = channel_class()
+        return plugin
+
+    def _get_health(self, channel: AlertChannel):
+        health = self._health.get(channel)
+        if health is None:
+            with self._lock:
+                health = self._health.setdefault(channel, ChannelHealth(channel.value))
+        return health
+
+    def _send(self, channel: AlertChannel, events: list, config: dict, force=False):
+        """Send events on a channel through its circuit breaker, recording the outcome
+
+        Raises:
+            CircuitOpenError: If the channel's breaker is open
+            Exception: If sending failed
+        """
+        plugin = self._get_plugin(channel)
+        if plugin is None:
+            raise ValueError(f"No plugin registered for channel {channel.value}")
+        health = self._get_health(channel)
+        health.before_attempt(force)
+        start = time.monotonic()
+        try:
+            if len(events) == 1:
+                plugin.send(events[0], config)
+            else:
+                plugin.send_batch(events, config)
+        except PermanentDeliveryError as e:
+            # The endpoint answered, it just won't take these events
+            health.record_rejection(time.monotonic() - start, e)
+            raise
         except Exception as e:
-            logger.error(f"Error sending Discord alert: {e}")
+            health.record_failure(time.monotonic() - start, e)
             raise
+        health.record_success(time.monotonic() - start)
+
+    def get_delivery_metrics(self):
+        """Get queue depth, delivery counts and latency per channel"""
+        return self.dispatcher.get_metrics()
+
+    def get_channel_health(self):
+        """Get breaker state, success rate and send latency per channel"""
+        health = {}
+        for channel, channel_health in list(self._health.items()):
+            plugin = self._plugins.get(channel)
+            health[channel.value] = dict(channel_health.get_stats(),
+                                         transport=plugin.get_stats() if plugin is not None else None)
+        return health
+
+    def get_mail_stats(self):
+        """Get SMTP connection reuse, latency and throughput, or None before the first email"""
+        plugin = self._plugins.get(AlertChannel.EMAIL)
+        return plugin.get_stats() if plugin is not None else None
+
+    def shutdown(self, timeout=5.0):
+        """Stop the delivery threads, leaving undelivered alerts in the outbox"""
+        self.dispatcher.shutdown(timeout)
+        for plugin in list(self._plugins.values()):
+            try:
+                plugin.close()
+            except Exception as e:
+                logger.error(f"Error closing {plugin.name} channel: {e}")
 
     def send_test_message(self, channel: AlertChannel, message: str) -> bool:
         """Send a test message through a specific channel
         
         Args:
-            channel: The channel to test
+            channel: The channel to test, as an AlertChannel or its value
             message: Test message to send
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Get channel config
+            channel = AlertChannel(channel)
+            # Get channel config, as just saved from the alerts page
+            self.config.reload_if_changed(force=True)
             channel_config = self.config.get_channel_config(channel)
             if not channel_config:
                 logger.error(f"Channel {channel} not configured")
                 return False
 
-            if channel == AlertChannel.EMAIL:
-                self._send_email(AlertType.SYSTEM_ERROR, message, channel_config)
-            elif channel == AlertChannel.SLACK:
-                self._send_slack(AlertType.SYSTEM_ERROR, message, channel_config)
-            elif channel == AlertChannel.DISCORD:
-                self._send_discord(AlertType.SYSTEM_ERROR, message, channel_config)
-            else:
+            if self._get_plugin(channel) is None:
                 logger.error(f"Unknown channel type: {channel}")
                 return False
-                
+
+            # Always attempted, so a test shows whether a broken channel is fixed
+            event = {'id': uuid.uuid4().hex, 'created': time.time(),
+                     'type': AlertType.SYSTEM_ERROR.value, 'message': message}
+            self._send(channel, [event], channel_config, force=True)
             return True
 
         except Exception as e:
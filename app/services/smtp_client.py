@@ -0,0 +1,187 @@
+import time
+import smtplib
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait on the mail server before giving up on a connection
+SMTP_TIMEOUT = 10.0
+# An unused connection is closed after this many seconds; channels may
+# override it with 'smtp_idle_timeout' in their config
+SMTP_IDLE_TIMEOUT = 60.0
+# A connection used more recently than this is trusted without a NOOP
+NOOP_AFTER_SECONDS = 2.0
+# Recent sends kept for the latency and throughput figures
+MAIL_SAMPLES = 100
+
+SECURITY_SSL = 'ssl'
+SECURITY_STARTTLS = 'starttls'
+SECURITY_NONE = 'none'
+
+
+class SmtpClient:
+    """Authenticated SMTP connection kept open between alerts
+
+    The first message connects, negotiates TLS and logs in; later messages
+    reuse the session, so a burst of alerts costs one handshake. Before
+    reusing a connection that has been quiet for a while a NOOP checks it
+    is still alive, and a connection idle for longer than the idle timeout
+    is closed and replaced. Messages passed together to send_messages()
+    go out in one session.
+
+    'security' in the config selects 'ssl' (SMTP over TLS, the default),
+    'starttls' or 'none'; 'none' is meant for a local relay, or a stand-in
+    server on localhost when testing.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.idle_timeout = float(config.get('smtp_idle_timeout', SMTP_IDLE_TIMEOUT))
+        self._lock = threading.Lock()
+        self._server = None
+        self._last_used = 0.0
+        self._session_messages = 0
+        self.connects = 0
+        self.reuses = 0
+        self.dead_connections = 0
+        self.idle_closes = 0
+        self.messages_sent = 0
+        self.session_sizes = deque(maxlen=MAIL_SAMPLES)
+        self.connect_latencies = deque(maxlen=MAIL_SAMPLES)
+        self.send_latencies = deque(maxlen=MAIL_SAMPLES)
+        self.send_times = deque(maxlen=MAIL_SAMPLES)
+
+    def _connect(self):
+        """Open and authenticate a new connection. Lock held."""
+        start = time.monotonic()
+        host = self.config['smtp_server']
+        port = int(self.config['smtp_port'])
+        timeout = float(self.config.get('timeout', SMTP_TIMEOUT))
+        security = self.config.get('security', SECURITY_SSL)
+
+        if security == SECURITY_SSL:
+            server = smtplib.SMTP_SSL(host, port, timeout=timeout)
+        else:
+            server = smtplib.SMTP(host, port, timeout=timeout)
+        try:
+            if security == SECURITY_STARTTLS:
+                server.starttls()
+            if self.config.get('username'):
+                server.login(self.config['username'], self.config['password'])
+        except Exception:
+            server.close()
+            raise
+
+        self._server = server
+        self._session_messages = 0
+        self.connects += 1
+        self.connect_latencies.append(time.monotonic() - start)
+
+    def _close(self, polite=True):
+        """Close the connection, with QUIT if it is still usable. Lock held."""
+        if self._server is None:
+            return
+        try:
+            if polite:
+                self._server.quit()
+            else:
+                self._server.close()
+        except Exception:
+            self._server.close()
+        self._server = None
+        if self._session_messages:
+            self.session_sizes.append(self._session_messages)
+        self._session_messages = 0
+
+    def _ensure_connection(self):
+        """Get a live connection, reusing the current one if it still works. Lock held."""
+        if self._server is not None:
+            idle = time.monotonic() - self._last_used
+            if idle > self.idle_timeout:
+                self.idle_closes += 1
+                self._close()
+            elif idle > NOOP_AFTER_SECONDS:
+                try:
+                    if self._server.noop()[0] != 250:
+                        raise smtplib.SMTPException("NOOP refused")
+                except (smtplib.SMTPException, OSError):
+                    logger.info("SMTP connection went stale, reconnecting")
+                    self.dead_connections += 1
+                    self._close(polite=False)
+            if self._server is not None:
+                self.reuses += 1
+                return
+        self._connect()
+
+    def send_messages(self, messages):
+        """Send email messages in one session
+
+        A connection that turns out to be dead mid-batch is replaced once
+        and the unsent messages are retried on the new one.
+
+        Args:
+            messages: email.message.Message objects with From and To set
+
+        Raises:
+            smtplib.SMTPException, OSError: If a message could not be sent;
+                the messages before it have been sent
+        """
+        with self._lock:
+            remaining = list(messages)
+            reconnected = False
+            while remaining:
+                self._ensure_connection()
+                try:
+                    while remaining:
+                        start = time.monotonic()
+                        self._server.send_message(remaining[0])
+                        now = time.monotonic()
+                        self.send_latencies.append(now - start)
+                        self.send_times.append(now)
+                        self.messages_sent += 1
+                        self._session_messages += 1
+                        self._last_used = now
+                        remaining.pop(0)
+                except smtplib.SMTPServerDisconnected:
+                    self._close(polite=False)
+                    self.dead_connections += 1
+                    if reconnected:
+                        raise
+                    logger.info("SMTP server closed the connection, reconnecting")
+                    reconnected = True
+                except (smtplib.SMTPException, OSError):
+                    # The session may be mid-command; start clean next time
+                    self._close(polite=False)
+                    raise
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def get_stats(self):
+        """Get connection reuse, send latency and throughput figures"""
+        with self._lock:
+            send_latencies = sorted(self.send_latencies)
+            send_times = list(self.send_times)
+            connect_latencies = list(self.connect_latencies)
+            session_sizes = list(self.session_sizes) + ([self._session_messages] if self._session_messages else [])
+            connected = self._server is not None
+            idle = time.monotonic() - self._last_used if connected else None
+        span = send_times[-1] - send_times[0] if len(send_times) > 1 else 0
+        return {
+            'connected': connected,
+            'idle_seconds': idle,
+            'connects': self.connects,
+            'reuses': self.reuses,
+            'dead_connections': self.dead_connections,
+            'idle_closes': self.idle_closes,
+            'messages_sent': self.messages_sent,
+            'messages_per_session': sum(session_sizes) / len(session_sizes) if session_sizes else None,
+            'connect_latency_avg': sum(connect_latencies) / len(connect_latencies) if connect_latencies else None,
+            'send_latency_avg': sum(send_latencies) / len(send_latencies) if send_latencies else None,
+            'send_latency_p95': send_latencies[int(0.95 * (len(send_latencies) - 1))] if send_latencies else None,
+            # Over the recent sends; bursts show the rate a reused session achieves
+            'messages_per_second': (len(send_times) - 1) / span if span > 0 else None
+        }
@@ -0,0 +1,205 @@
+import threading
+from app.utils.json_utils import dumps_bytes
+
+# Dashboard sections and the top-level state keys each one carries
+SECTIONS = {
+    'mode': ('current_mode', 'well_pump_reverse', 'mode_specific'),
+    'pumps': ('well_pump', 'distribution_pump', 'thread_running'),
+    'tanks': ('summer_tank', 'winter_tank'),
+    'stats': ('pump_stats', 'pump_config'),
+    'gpio': ('gpio_states',)
+}
+
+
+class StatePublisher:
+    """Latest system state snapshot published by the control loop
+
+    The control loop publishes a fresh snapshot every iteration, but the
+    version only advances when the snapshot differs from the previous one.
+    Readers block in wait_for_change until the version moves, so push
+    streams emit on change instead of on a timer. Each section of the state
+    also records the version at which it last changed, so readers that
+    already hold a version can fetch only what moved since.
+    """
+
+    _condition = threading.Condition()
+    _version = 0
+    _state = None
+    _section_versions = {}
+    _encoded = {}  # cache key -> (version, JSON bytes)
+    _listeners = []
+
+    @classmethod
+    def publish(cls, state):
+        """Publish a state snapshot
+
+        Args:
+            state: Dict in the /api/state response shape. It must not be
+                modified after publishing.
+
+        Returns:
+            True if the state changed and the version advanced
+        """
+        with cls._condition:
+            if state == cls._state:
+                return False
+            previous = cls._state or {}
+            cls._version += 1
+            for section, keys in SECTIONS.items():
+                if any(state.get(key) != previous.get(key) for key in keys):
+                    cls._section_versions[section] = cls._version
+            cls._state = state
+            cls._condition.notify_all()
+            version, section_versions = cls._version, dict(cls._section_versions)
+
+        for listener in cls._listeners:
+            listener(version, state, section_versions)
+        return True
+
+    @classmethod
+    def mirror(cls, version, state, section_versions, reset=False):
+        """Adopt a snapshot published by the controller process
+
+        Args:
+            version: Version assigned by the controller
+            state: The published state
+            section_versions: Section name to the version it last changed at
+            reset: The controller restarted, drop encodings of its old versions
+        """
+        with cls._condition:
+            if reset:
+                cls._encoded = {}
+            cls._version = version
+            cls._state = state
+            cls._section_versions = dict(section_versions)
+            cls._condition.notify_all()
+
+    @classmethod
+    def add_listener(cls, listener):
+        """Call listener(version, state, section_versions) after every change"""
+        cls._listeners.append(listener)
+
+    @classmethod
+    def get_snapshot(cls):
+        """Get the latest snapshot
+
+        Returns:
+            Tuple of (version, state), state is None until first publish
+        """
+        with cls._condition:
+            return cls._version, cls._state
+
+    @classmethod
+    def get_version(cls):
+        return cls._version
+
+    @classmethod
+    def get_section_versions(cls):
+        with cls._condition:
+            return dict(cls._section_versions)
+
+    @classmethod
+    def _changed_sections(cls, since, fields):
+        """Get (state, version, [(section, section version)]) changed after since. Lock held."""
+        if since is not None and since > cls._version:
+            since = None
+        changed = []
+        for section in fields or SECTIONS:
+            section_version = cls._section_versions.get(section, 0)
+            if since is None or section_version > since:
+                changed.append((section, section_version))
+        return cls._state or {}, cls._version, changed
+
+    @classmethod
+    def get_sections(cls, since=None, fields=None):
+        """Get the state sections that changed after a version
+
+        Args:
+            since: Version the caller already has, or None for everything.
+                A version ahead of the current one (from before a restart)
+                is treated as None.
+            fields: Section names to consider, or None for all
+
+        Returns:
+            Tuple of (version, dict of section name to its state keys)
+        """
+        with cls._condition:
+            state, version, changed = cls._changed_sections(since, fields)
+        return version, {section: cls._section_view(state, section) for section, _ in changed}
+
+    @classmethod
+    def get_sections_encoded(cls, since=None, fields=None):
+        """Same as get_sections, with the sections serialized to JSON bytes
+
+        Each section is encoded once per change of that section.
+
+        Returns:
+            Tuple of (version, JSON bytes of the sections object)
+        """
+        with cls._condition:
+            state, version, changed = cls._changed_sections(since, fields)
+
+        parts = []
+        for section, section_version in changed:
+            encoded = cls._cached(('section', section), section_version,
+                                  lambda: cls._section_view(state, section))
+            parts.append(dumps_bytes(section) + b':' + encoded)
+        return version, b'{' + b','.join(parts) + b'}'
+
+    @staticmethod
+    def _section_view(state, section):
+        return {key: state[key] for key in SECTIONS[section] if key in state}
+
+    @classmethod
+    def get_encoded(cls, name, build=None):
+        """Get a view of the latest snapshot serialized to JSON bytes
+
+        Args:
+            name: Cache key of the view
+            build: Function mapping the state to the object to serialize,
+                default the whole state
+
+        Returns:
+            Tuple of (version, JSON bytes), bytes is None until first publish
+        """
+        version, state = cls.get_snapshot()
+        if state is None:
+            return version, None
+        return version, cls._cached(name, version, lambda: build(state) if build else state)
+
+    @classmethod
+    def _cached(cls, key, version, build):
+        cached = cls._encoded.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        encoded = dumps_bytes(build())
+        with cls._condition:
+            # Don't let a slow reader replace a newer entry
+            current = cls._encoded.get(key)
+            if not current or current[0] < version:
+                cls._encoded[key] = (version, encoded)
+        return encoded
+
+    @classmethod
+    def wait_for_change(cls, since, timeout=None):
+        """Wait until the published version differs from `since`
+
+        A different (not just greater) version counts as a change, so a
+        client resuming with a version from before a restart gets the
+        current state straight away.
+
+        Args:
+            since: Version the caller already has, or None for any state
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Tuple of (version, state), or None if the timeout expired
+        """
+        with cls._condition:
+            changed = cls._condition.wait_for(
+                lambda: cls._state is not None and cls._version != since,
+                timeout=timeout
+            )
+            if not changed:
+                return None
+            return cls._version, cls._state
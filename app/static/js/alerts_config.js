@@ -60,7 +60,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 },
                 body: JSON.stringify({
                     alert_type: alertType,
-                    channels: channels
+                    channels: channels,
+                    coalesce_window: parseInt(document.getElementById(`${alertType}_coalesce_window`).value, 10) || 0,
+                    urgent: document.getElementById(`${alertType}_urgent`).checked
                 })
             })
             .then(async response => {
@@ -130,6 +132,8 @@ function loadConfiguration() {
             const channels = data.channels || {};
             const alertTypes = data.alert_types || {};
             const rateLimits = data.rate_limits || {};
+            const coalesceWindows = data.coalesce_windows || {};
+            const urgentTypes = data.urgent_types || [];
 
             // Populate channel configurations
             Object.entries(channels).forEach(([channel, config]) => {
@@ -162,6 +166,20 @@ function loadConfiguration() {
                 }
             });
 
+            // Populate digest windows and urgent flags
+            Object.entries(coalesceWindows).forEach(([alertType, seconds]) => {
+                const input = document.getElementById(`${alertType}_coalesce_window`);
+                if (input && seconds !== null && seconds !== undefined) {
+                    input.value = seconds;
+                }
+            });
+            urgentTypes.forEach(alertType => {
+                const checkbox = document.getElementById(`${alertType}_urgent`);
+                if (checkbox) {
+                    checkbox.checked = true;
+                }
+            });
+
             // Populate rate limits if they exist
             Object.entries(rateLimits).forEach(([alertType, limit]) => {
                 const input = document.querySelector(`input[name="${alertType}"]`);
@@ -1,4 +1,4 @@
-import { initState, updateState } from './modules/state.js';
+import { initState, startStateUpdates } from './modules/state.js';
 import { initGPIO } from './modules/gpio.js';
 import { initPumpControls } from './modules/pumps.js';
 import { initModeControls } from './modules/modes.js';
@@ -11,7 +11,6 @@ document.addEventListener('DOMContentLoaded', function() {
     initPumpControls();
     initModeControls();
     
-    // Set up regular updates
-    updateState(); // Initial state update
-    setInterval(updateState, 1000); // Regular state updates
+    // Push state updates over the event stream (falls back to polling)
+    startStateUpdates();
 });
\ No newline at end of file
@@ -0,0 +1,40 @@
+// Client-side copy of the dashboard state, kept current by merging the
+// sections that changed since the last version we saw.
+const dashboardState = {};
+let dashboardVersion = null;
+
+function flattenSections(sections, target = {}) {
+    Object.values(sections || {}).forEach(section => Object.assign(target, section));
+    return target;
+}
+
+function getDashboard(params) {
+    const query = new URLSearchParams(params).toString();
+    return fetch('/api/dashboard' + (query ? '?' + query : ''))
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        });
+}
+
+// Merge a {version, sections} delta (from the API or the event stream)
+// and return the full state
+export function applyDashboardDelta(payload) {
+    flattenSections(payload.sections, dashboardState);
+    dashboardVersion = payload.version;
+    return dashboardState;
+}
+
+// Fetch only what changed since the last update and return the full state
+export function refreshDashboard() {
+    const params = dashboardVersion ? { since: dashboardVersion } : {};
+    return getDashboard(params).then(applyDashboardDelta);
+}
+
+// One-off fetch of selected sections, flattened into a state-shaped object
+export function fetchDashboard(fields) {
+    return getDashboard({ fields: fields.join(',') })
+        .then(payload => flattenSections(payload.sections));
+}
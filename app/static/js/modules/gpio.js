@@ -1,6 +1,6 @@
 export function initGPIO() {
-    setInterval(updateGPIOStates, 1000);
-    
+    // GPIO states arrive with each state update (see state.js)
+
     // Set up pump inversion buttons
     document.querySelectorAll('.pump-invert-btn').forEach(button => {
         button.addEventListener('click', function() {
@@ -13,14 +13,16 @@ export function initGPIO() {
 function updateGPIOStates() {
     fetch('/api/gpio_states')
         .then(response => response.json())
-        .then(data => {
-            updateSummerTankGPIO(data.summer_tank);
-            updateWinterTankGPIO(data.winter_tank);
-            updatePumpGPIO(data.pumps);
-        })
+        .then(data => updateGPIODisplays(data))
         .catch(error => console.error('Error updating GPIO states:', error));
 }
 
+export function updateGPIODisplays(data) {
+    updateSummerTankGPIO(data.summer_tank);
+    updateWinterTankGPIO(data.winter_tank);
+    updatePumpGPIO(data.pumps);
+}
+
 function updateSummerTankGPIO(data) {
     const html = formatGPIOState('High', data.high) +
                 formatGPIOState('Low', data.low) +
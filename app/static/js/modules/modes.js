@@ -1,3 +1,5 @@
+import { fetchDashboard } from './dashboard.js';
+
 let selectedMode = null;
 let lastModeChange = 'Not changed yet';
 let modeChangeStatus = 'No changes made';
@@ -129,8 +131,7 @@ function confirmModeChange() {
             modeChangeStatus = 'Success: ' + data.message;
             
             // Force an immediate state update
-            fetch('/api/state')
-                .then(response => response.json())
+            fetchDashboard(['mode'])
                 .then(stateData => {
                     console.log('State after mode change:', stateData);
                     updateModeDisplay(stateData.current_mode || selectedMode);
@@ -1,3 +1,5 @@
+import { fetchDashboard } from './dashboard.js';
+
 let wellPumpRunning = false;
 let distPumpRunning = false;
 let wellPumpReverse = false;
@@ -90,18 +92,10 @@ export function initPumpControls() {
 
 function fetchInitialState() {
     console.log('Fetching initial pump state');
-    Promise.all([
-        fetch('/api/state').then(r => r.json()).catch(e => {
-            console.error('Error fetching state:', e);
-            return {};
-        }),
-        fetch('/api/gpio_states').then(r => r.json()).catch(e => {
-            console.error('Error fetching GPIO states:', e);
-            return {};
-        })
-    ])
-    .then(([stateData, gpioData]) => {
-        console.log('Initial state loaded:', { state: stateData, gpio: gpioData });
+    fetchDashboard(['mode', 'pumps', 'gpio'])
+    .then(stateData => {
+        console.log('Initial state loaded:', stateData);
+        const gpioData = stateData.gpio_states || {};
         
         // Update reverse mode toggle
         if (typeof stateData.well_pump_reverse !== 'undefined') {
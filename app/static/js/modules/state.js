@@ -1,53 +1,108 @@
 import { updateTankDisplays } from './tanks.js';
 import { updatePumpDisplays } from './pumps.js';
 import { updateModeDisplay } from './modes.js';
+import { updateGPIODisplays } from './gpio.js';
+import { applyDashboardDelta, refreshDashboard } from './dashboard.js';
+
+const POLL_INTERVAL_MS = 1000;
+// Give up on the stream after this many consecutive failures to connect;
+// the server closes the stream every few minutes by design, and a
+// reconnect that opens again resets the count
+const MAX_STREAM_ERRORS = 3;
+
+let pollTimer = null;
 
 export function initState() {
     console.log('Initializing state module');
     // Any initial state setup if needed
 }
 
+export function startStateUpdates() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    updateState(); // Initial state while the stream connects
+
+    const source = new EventSource('/api/stream');
+    let errors = 0;
+
+    source.onopen = () => {
+        errors = 0;
+    };
+
+    source.addEventListener('state', event => {
+        try {
+            applyState(applyDashboardDelta(JSON.parse(event.data)));
+        } catch (error) {
+            console.error('Error handling state event:', error);
+        }
+    });
+
+    source.onerror = () => {
+        errors += 1;
+        if (source.readyState === EventSource.CLOSED || errors >= MAX_STREAM_ERRORS) {
+            console.warn('State stream unavailable, falling back to polling');
+            source.close();
+            startPolling();
+        }
+    };
+}
+
+function startPolling() {
+    if (pollTimer === null) {
+        updateState();
+        pollTimer = setInterval(updateState, POLL_INTERVAL_MS);
+    }
+}
+
 export function updateState() {
     console.log('Starting state update...');
     
-    fetch('/api/state')
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            return response.json();
-        })
+    refreshDashboard()
         .then(data => {
             console.log('State data received:', data);
-            
-            // Check if we have a modal showing - if so, don't update mode display
-            const modeModal = document.getElementById('modeConfirmModal');
-            const isModalShowing = modeModal?.classList.contains('show');
-            
-            if (!isModalShowing && data.current_mode) {
-                updateModeDisplay(data.current_mode);
-            }
-            
-            // Update tanks and pumps with enhanced error handling
-            try {
-                updateTankDisplays(data);
-            } catch (error) {
-                console.error('Error updating tank displays:', error);
-            }
-            
-            try {
-                updatePumpDisplays(data);
-            } catch (error) {
-                console.error('Error updating pump displays:', error);
-            }
-            
-            // Update reverse mode toggle if it exists
-            const reverseToggle = document.getElementById('well-pump-reverse-toggle');
-            if (reverseToggle && typeof data.well_pump_reverse !== 'undefined') {
-                reverseToggle.checked = data.well_pump_reverse;
-            }
+            applyState(data);
         })
         .catch(error => {
             console.error('Error in updateState:', error);
         });
+}
+
+function applyState(data) {
+    // Check if we have a modal showing - if so, don't update mode display
+    const modeModal = document.getElementById('modeConfirmModal');
+    const isModalShowing = modeModal?.classList.contains('show');
+    
+    if (!isModalShowing && data.current_mode) {
+        updateModeDisplay(data.current_mode);
+    }
+    
+    // Update tanks and pumps with enhanced error handling
+    try {
+        updateTankDisplays(data);
+    } catch (error) {
+        console.error('Error updating tank displays:', error);
+    }
+    
+    try {
+        updatePumpDisplays(data);
+    } catch (error) {
+        console.error('Error updating pump displays:', error);
+    }
+    
+    // Update reverse mode toggle if it exists
+    const reverseToggle = document.getElementById('well-pump-reverse-toggle');
+    if (reverseToggle && typeof data.well_pump_reverse !== 'undefined') {
+        reverseToggle.checked = data.well_pump_reverse;
+    }
+
+    if (data.gpio_states) {
+        try {
+            updateGPIODisplays(data.gpio_states);
+        } catch (error) {
+            console.error('Error updating GPIO displays:', error);
+        }
+    }
 }
\ No newline at end of file
@@ -0,0 +1,236 @@
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .stats_manager import StatsManager
+
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+PUMP_NAMES = ('well_pump', 'dist_pump')
+DWELL_PERCENTILES = (50, 90, 99)
+
+
+def _to_seconds(iso_timestamps):
+    """Convert ISO timestamps to float seconds (local wall clock)
+
+    Timestamps are stored as naive local times, so the hour and day
+    arithmetic below works directly in local time.
+    """
+    if not len(iso_timestamps):
+        return np.empty(0, dtype=np.float64)
+    return np.array(iso_timestamps, dtype='datetime64[ms]').astype(np.int64) / 1000.0
+
+
+def _seconds_by_hour_of_day(starts, ends):
+    """Sum the seconds of [start, end) intervals falling in each hour of day
+
+    Intervals may span any number of hours. The partial first and last
+    hours are added with bincount and the whole hours in between are
+    counted arithmetically per hour of day, so nothing is expanded per hour.
+
+    Returns:
+        Array of 24 totals in seconds
+    """
+    totals = np.zeros(24)
+    if not len(starts):
+        return totals
+
+    first_hour = np.floor_divide(starts, SECONDS_PER_HOUR).astype(np.int64)
+    last_hour = np.floor_divide(ends, SECONDS_PER_HOUR).astype(np.int64)
+
+    same = first_hour == last_hour
+    totals += np.bincount(first_hour[same] % 24, weights=(ends - starts)[same], minlength=24)
+
+    split = ~same
+    fs, fe = starts[split], ends[split]
+    fh, lh = first_hour[split], last_hour[split]
+    totals += np.bincount(fh % 24, weights=(fh + 1) * SECONDS_PER_HOUR - fs, minlength=24)
+    totals += np.bincount(lh % 24, weights=fe - lh * SECONDS_PER_HOUR, minlength=24)
+
+    # Whole hours fh+1 .. lh-1: count how many of them fall on each hour of day
+    hours = np.arange(24)
+    first_full = (fh + 1)[:, None]
+    last_full = (lh - 1)[:, None]
+    full_counts = np.floor_divide(last_full - hours, 24) - np.floor_divide(first_full - 1 - hours, 24)
+    totals += SECONDS_PER_HOUR * full_counts.sum(axis=0)
+
+    return totals
+
+
+def _percentiles(values):
+    if not len(values):
+        return {f'p{p}': None for p in DWELL_PERCENTILES}
+    results = np.percentile(values, DWELL_PERCENTILES)
+    return {f'p{p}': float(v) for p, v in zip(DWELL_PERCENTILES, results)}
+
+
+class AnalyticsEngine:
+    """Vectorized analytics over pump cycles and tank history
+
+    History is loaded into NumPy arrays and every metric is computed with
+    array operations. Results are cached by the version of the stats they
+    were computed from and recomputed at most every few minutes while the
+    data is unchanged (duty cycles depend on the observation window).
+    """
+
+    _cache_lock = threading.Lock()
+    _cache = OrderedDict()  # days -> (key, result), least recently used first
+    _cache_size = 8  # windows kept; days can be anything up to 3650
+    _max_age = 300  # seconds
+
+    @classmethod
+    def get_analytics(cls, days=365):
+        """Get analytics for the last `days` days of history
+
+        Args:
+            days: Length of the analysis window in days
+
+        Returns:
+            Dict of computed metrics
+        """
+        key = StatsManager.get_part_versions('pump_cycles', 'tank_history', 'config') + \
+            (int(time.time() // cls._max_age),)
+
+        with cls._cache_lock:
+            cached = cls._cache.get(days)
+            if cached and cached[0] == key:
+                cls._cache.move_to_end(days)
+                return cached[1]
+
+        result = cls._compute(days)
+
+        with cls._cache_lock:
+            cls._cache[days] = (key, result)
+            cls._cache.move_to_end(days)
+            while len(cls._cache) > cls._cache_size:
+                cls._cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def _compute(cls, days):
+        started = time.perf_counter()
+        now = datetime.now()
+        window_start = now - timedelta(days=days)
+
+        pumps = {}
+        for pump_name in PUMP_NAMES:
+            pump_cycles = StatsManager.get_pump_cycles(pump_name=pump_name, start=window_start,
+                                                       limit=None, newest_first=False)['cycles']
+            pumps[pump_name] = {
+                'starts': _to_seconds([c['start_time'] for c in pump_cycles]),
+                'ends': _to_seconds([c['end_time'] for c in pump_cycles]),
+                'gallons': np.array([c.get('gallons', 0.0) for c in pump_cycles], dtype=np.float64),
+                'fills': np.array([c.get('tank_state_start') in ('LOW', 'EMPTY') and
+                                   c.get('tank_state_end') == 'HIGH' for c in pump_cycles], dtype=bool)
+            }
+
+        # Like the cycles, only tank states that began within the window count
+        # (ISO timestamps of naive local times sort as strings)
+        window_start_iso = window_start.isoformat()
+        history = {
+            tank: [e for e in entries if e['start_time'] >= window_start_iso]
+            for tank, entries in StatsManager.get_tank_history(max_entries=None).items()
+        }
+        current_states = StatsManager.get_current_tank_states()
+        now_seconds = _to_seconds([now.isoformat()])[0]
+
+        # Observation starts at the oldest data we have within the window
+        earliest = [p['starts'][0] for p in pumps.values() if len(p['starts'])]
+        earliest += [_to_seconds([entries[0]['start_time']])[0]
+                     for entries in history.values() if entries]
+        observed_from = max(min(earliest), _to_seconds([window_start.isoformat()])[0]) \
+            if earliest else now_seconds
+
+        observed = _seconds_by_hour_of_day(np.array([observed_from]), np.array([now_seconds]))
+
+        result = {
+            'window': {
+                'days': days,
+                'from': str(np.datetime64(int(observed_from * 1000), 'ms')) if earliest else None,
+                'to': now.isoformat()
+            },
+            'pumps': {
+                name: cls._pump_metrics(data, observed)
+                for name, data in pumps.items()
+            },
+            'tanks': {
+                tank: cls._tank_metrics(entries, current_states.get(tank, {}), now_seconds)
+                for tank, entries in history.items()
+            }
+        }
+        result['compute_time_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    @staticmethod
+    def _pump_metrics(data, observed):
+        starts, ends = data['starts'], data['ends']
+        durations = ends - starts
+
+        run_by_hour = _seconds_by_hour_of_day(starts, ends)
+        duty_cycle = np.divide(run_by_hour, observed, out=np.zeros(24), where=observed > 0)
+
+        day_index = np.floor_divide(starts, SECONDS_PER_DAY).astype(np.int64)
+        if len(day_index):
+            days, counts = np.unique(day_index, return_counts=True)
+        else:
+            days, counts = day_index, day_index
+
+        fill_durations = durations[data['fills']] / 60.0
+        if len(fill_durations):
+            hist_counts, bin_edges = np.histogram(fill_durations, bins='auto')
+        else:
+            hist_counts, bin_edges = np.empty(0), np.empty(0)
+
+        return {
+            'cycle_count': int(len(starts)),
+            'runtime_seconds': float(durations.sum()),
+            'gallons': float(data['gallons'].sum()),
+            'longest_run_seconds': float(durations.max()) if len(durations) else None,
+            'mean_run_seconds': float(durations.mean()) if len(durations) else None,
+            'duty_cycle_by_hour': [round(float(v), 4) for v in duty_cycle],
+            'cycles_per_day': {
+                'dates': [str(d) for d in (days * SECONDS_PER_DAY).astype('datetime64[s]').astype('datetime64[D]')],
+                'counts': counts.tolist(),
+                'mean': float(counts.mean()) if len(counts) else 0.0,
+                'max': int(counts.max()) if len(counts) else 0
+            },
+            'fill_minutes': {
+                'count': int(len(fill_durations)),
+                'mean': float(fill_durations.mean()) if len(fill_durations) else None,
+                **_percentiles(fill_durations),
+                'histogram': {
+                    'bin_edges': [round(float(e), 2) for e in bin_edges],
+                    'counts': [int(c) for c in hist_counts]
+                }
+            }
+        }
+
+    @staticmethod
+    def _tank_metrics(entries, current_state, now_seconds):
+        states = np.array([e['state'] for e in entries], dtype=object)
+        starts = _to_seconds([e['start_time'] for e in entries])
+        durations = np.array([e.get('duration', 0.0) for e in entries], dtype=np.float64)
+
+        dwell = {}
+        for state in np.unique(states) if len(states) else []:
+            state_durations = durations[states == state]
+            dwell[state] = {
+                'count': int(len(state_durations)),
+                'mean': float(state_durations.mean()),
+                **_percentiles(state_durations)
+            }
+
+        low_starts = starts[states == 'LOW'] if len(states) else starts
+        if current_state.get('state') == 'LOW' and current_state.get('since'):
+            low_starts = np.append(low_starts, _to_seconds([current_state['since']]))
+        low_intervals = np.diff(np.sort(low_starts))
+
+        return {
+            'dwell_seconds': dwell,
+            'low_events': int(len(low_starts)),
+            'mean_seconds_between_low': float(low_intervals.mean()) if len(low_intervals) else None
+        }
@@ -0,0 +1,232 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from datetime import datetime
+from ..models.user import User, UserRole
+from .config_utils import CONFIG_DIR, load_secret_key
+
+TOKEN_PREFIX = 'pc1'
+# Seconds between checks of the token file for revocations made by other workers
+RELOAD_CHECK_INTERVAL = 1.0
+MAX_TOKEN_DAYS = 3650
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class ApiTokenManager:
+    """Signed bearer tokens for machine clients of /api and /stats/api
+
+    A token is 'pc1.<claims>.<mac>': base64url JSON claims (token id, user
+    id, username, role and expiry) and an HMAC-SHA256 over them. Checking
+    a token needs only the MAC, the expiry and a lookup in the in-memory
+    set of revoked token ids; neither users.json nor the session is read.
+
+    The token file keeps each issued token's metadata (never the token
+    itself) for the user admin pages, plus the revoked ids. Revoked ids
+    are dropped once their token would have expired anyway, so the deny
+    list stays small.
+    """
+
+    _lock = threading.RLock()
+    _tokens_file = os.path.join(CONFIG_DIR, 'api_tokens.json')
+    _key = None
+    _tokens = {}  # token id -> metadata
+    _revoked = frozenset()
+    _file_mtime = None
+    _next_check = 0.0
+
+    @classmethod
+    def _get_key(cls):
+        if cls._key is None:
+            # Separate from the session key, derived from the same secret
+            cls._key = hmac.new(load_secret_key().encode('utf-8'), b'api-token', hashlib.sha256).digest()
+        return cls._key
+
+    @classmethod
+    def _sign(cls, payload):
+        return hmac.new(cls._get_key(), payload.encode('ascii'), hashlib.sha256).digest()
+
+    @classmethod
+    def _get_file_mtime(cls):
+        try:
+            stat = os.stat(cls._tokens_file)
+            return stat.st_ino, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def _reload_if_changed(cls, force=False):
+        """Reload the token file if another process changed it"""
+        now = time.monotonic()
+        if not force and now < cls._next_check:
+            return
+        cls._next_check = now + RELOAD_CHECK_INTERVAL
+        if cls._get_file_mtime() != cls._file_mtime:
+            with cls._lock:
+                if cls._get_file_mtime() != cls._file_mtime:
+                    cls._load()
+
+    @classmethod
+    def _load(cls):
+        """Load token metadata and revocations. Must be called with the lock held."""
+        cls._file_mtime = cls._get_file_mtime()
+        tokens = {}
+        if cls._file_mtime is not None:
+            try:
+                with open(cls._tokens_file, 'r') as f:
+                    tokens = json.load(f).get('tokens', {})
+            except Exception as e:
+                print(f"Error loading API tokens: {e}")
+        cls._tokens = tokens
+        cls._revoked = frozenset(token_id for token_id, token in tokens.items() if token.get('revoked'))
+
+    @classmethod
+    def _save(cls):
+        """Write the token file, dropping expired tokens. Must be called with the lock held."""
+        now = time.time()
+        cls._tokens = {token_id: token for token_id, token in cls._tokens.items()
+                       if token['expires'] > now}
+        cls._revoked = frozenset(token_id for token_id, token in cls._tokens.items() if token.get('revoked'))
+
+        tmp_path = cls._tokens_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'tokens': cls._tokens}, f, indent=4)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, cls._tokens_file)
+        cls._file_mtime = cls._get_file_mtime()
+
+    @classmethod
+    def issue_token(cls, user, days, label=''):
+        """Issue a token carrying the user's current role
+
+        Args:
+            user: User the token acts as
+            days: Days until the token expires
+            label: Description shown on the admin page
+
+        Returns:
+            Tuple of (token string, token metadata)
+        """
+        if not 0 < days <= MAX_TOKEN_DAYS:
+            raise ValueError(f"Token lifetime must be between 1 and {MAX_TOKEN_DAYS} days")
+
+        now = int(time.time())
+        token_id = secrets.token_hex(8)
+        claims = {
+            'jti': token_id,
+            'sub': user.id,
+            'name': user.username,
+            'role': user.role.value,
+            'exp': now + int(days * 86400)
+        }
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+        token = f"{TOKEN_PREFIX}.{payload}.{_b64encode(cls._sign(payload))}"
+
+        metadata = {
+            'user_id': user.id,
+            'username': user.username,
+            'role': user.role.value,
+            'label': label,
+            'issued': now,
+            'expires': claims['exp'],
+            'revoked': False
+        }
+        with cls._lock:
+            cls._reload_if_changed(force=True)
+            cls._tokens[token_id] = metadata
+            cls._save()
+        return token, dict(metadata, id=token_id)
+
+    @classmethod
+    def revoke_token(cls, token_id):
+        """Revoke a token
+
+        Returns:
+            True if the token was found
+        """
+        with cls._lock:
+            cls._reload_if_changed(force=True)
+            token = cls._tokens.get(token_id)
+            if token is None:
+                return False
+            token['revoked'] = True
+            cls._save()
+            return True
+
+    @classmethod
+    def revoke_user_tokens(cls, user_id):
+        """Revoke all tokens of a user, e.g. when the user is deleted or changes role
+
+        Returns:
+            Number of tokens revoked
+        """
+        with cls._lock:
+            cls._reload_if_changed(force=True)
+            count = 0
+            for token in cls._tokens.values():
+                if token['user_id'] == user_id and not token.get('revoked'):
+                    token['revoked'] = True
+                    count += 1
+            if count:
+                cls._save()
+            return count
+
+    @classmethod
+    def get_user_tokens(cls, user_id):
+        """Get the unexpired tokens issued to a user, newest first"""
+        cls._reload_if_changed()
+        now = time.time()
+        tokens = [dict(token, id=token_id,
+                       issued_at=datetime.fromtimestamp(token['issued']).isoformat(),
+                       expires_at=datetime.fromtimestamp(token['expires']).isoformat())
+                  for token_id, token in list(cls._tokens.items())
+                  if token['user_id'] == user_id and token['expires'] > now]
+        tokens.sort(key=lambda token: token['issued'], reverse=True)
+        return tokens
+
+    @classmethod
+    def verify_token(cls, token):
+        """Check a token and build the user it acts as
+
+        Returns:
+            User with the role from the token, or None if the token is
+            malformed, forged, expired or revoked
+        """
+        prefix, _, rest = token.partition('.')
+        payload, _, mac = rest.partition('.')
+        if prefix != TOKEN_PREFIX or not payload or not mac:
+            return None
+        try:
+            if not hmac.compare_digest(cls._sign(payload), _b64decode(mac)):
+                return None
+            claims = json.loads(_b64decode(payload))
+            if claims['exp'] <= time.time():
+                return None
+            cls._reload_if_changed()
+            if claims['jti'] in cls._revoked:
+                return None
+            return User(id=claims['sub'], username=claims['name'],
+                        role=UserRole(claims['role']), password_hash=None)
+        except (ValueError, KeyError, TypeError):
+            return None
+
+
+def load_user_from_request(request):
+    """Flask-Login request loader for 'Authorization: Bearer <token>' on API paths"""
+    if not (request.path.startswith('/api/') or request.path.startswith('/stats/api/')):
+        return None
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    return ApiTokenManager.verify_token(token.strip())
@@ -0,0 +1,80 @@
+import os
+import json
+import mimetypes
+from flask import abort, request, send_from_directory, url_for
+
+# Built by tools/build_assets.py
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+BUNDLES_FILE = os.path.join(STATIC_DIR, 'bundles.json')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+
+# Built file names change with their content, so they never need revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_cache = {}
+
+
+def _load_json(path):
+    """Load a JSON file, reloading it only when it changes on disk"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path, 'r') as f:
+                cached = (mtime, json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error loading {path}: {e}")
+            return None
+        _cache[path] = cached
+    return cached[1]
+
+
+def asset_urls(name):
+    """Get the URLs to load for a bundle defined in static/bundles.json
+
+    Returns the fingerprinted bundle when the assets have been built, and
+    the bundle's source files otherwise, so development needs no build step.
+
+    Args:
+        name: Bundle name, e.g. 'css/dashboard.css'
+
+    Returns:
+        List of URLs
+    """
+    manifest = _load_json(MANIFEST_FILE) or {}
+    hashed = manifest.get('assets', {}).get(name)
+    if hashed:
+        return [url_for('dist_asset', filename=hashed)]
+
+    bundles = _load_json(BUNDLES_FILE) or {}
+    return [url_for('static', filename=source) for source in bundles.get(name, [name])]
+
+
+def send_dist_asset(filename):
+    """Serve a built asset, precompressed when the client accepts it"""
+    if filename == 'manifest.json':
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            encoding = candidate
+            filename += suffix
+            break
+
+    response = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def init_app(app):
+    """Register the route serving built assets"""
+    app.add_url_rule(f'{app.static_url_path}/dist/<path:filename>', 'dist_asset', send_dist_asset)
@@ -1,11 +1,22 @@
 import os
 import json
 import time
+import secrets
 
 # Use home directory for reliable permissions on Raspberry Pi
 HOME_DIR = os.path.expanduser('~')
 CONFIG_DIR = os.path.join(HOME_DIR, '.pump_control')
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'pump_config.json')
+SECRET_KEY_FILE = os.path.join(CONFIG_DIR, 'secret_key')
+
+# Controller process settings. With PUMP_CONTROL_REMOTE=1 the web app talks
+# to a separate controller process (run_controller.py) instead of owning GPIO.
+CONTROL_REMOTE = os.environ.get('PUMP_CONTROL_REMOTE') == '1'
+CONTROL_SOCKET = os.environ.get('PUMP_CONTROL_SOCKET', os.path.join(CONFIG_DIR, 'control.sock'))
+STATE_SEGMENT = os.environ.get(
+    'PUMP_CONTROL_STATE_SEGMENT',
+    '/dev/shm/pump-control-state' if os.path.isdir('/dev/shm') else os.path.join(CONFIG_DIR, 'state.shm')
+)
 
 # Create config directory if it doesn't exist
 os.makedirs(CONFIG_DIR, exist_ok=True)
@@ -36,6 +47,31 @@ DEFAULT_CONFIG = {
 }
 
 
+def load_secret_key():
+    """Get the secret key signing sessions and API tokens, creating it on first use
+
+    The key is kept in SECRET_KEY_FILE so sessions and tokens survive
+    restarts and are accepted by every worker process.
+    """
+    try:
+        # O_EXCL: when several workers start at once only one creates the key
+        fd = os.open(SECRET_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(SECRET_KEY_FILE, 'r') as f:
+                key = f.read().strip()
+            if key:
+                return key
+            # Another worker has created the file but not written it yet
+            time.sleep(0.1)
+        raise RuntimeError(f"Secret key file {SECRET_KEY_FILE} is empty")
+
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
+
+
 class ConfigManager:
     _config_cache = None
 
@@ -118,6 +154,19 @@ class ConfigManager:
                             pass
                     raise
 
+    @staticmethod
+    def get_config():
+        """Get the current configuration"""
+        return ConfigManager.load_config()
+
+    @staticmethod
+    def set_value(key, value):
+        """Set a single configuration value and save it"""
+        config = dict(ConfigManager.load_config())
+        config[key] = value
+        ConfigManager.save_config(config)
+        return config
+
     @staticmethod
     def reload_config():
         """Force reload of config from disk"""
@@ -0,0 +1,136 @@
+import os
+import json
+import bisect
+import threading
+from datetime import datetime
+
+
+class PumpCycleIndex:
+    """Time-ordered index of pump cycle records
+
+    Records are kept sorted by start time in memory, both across all pumps
+    and per pump, so time range lookups are a binary search (O(log n))
+    followed by a slice of the requested page. Each new record is appended
+    to a JSON lines file, so persisting a cycle never rewrites the history.
+    """
+
+    def __init__(self, file_path, max_records=50000):
+        self._file_path = file_path
+        self._max_records = max_records
+        # Series name (None for all pumps, else pump name) -> (starts, records)
+        # where starts are epoch seconds kept sorted, parallel to records
+        self._series = {None: ([], [])}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(record):
+        return datetime.fromisoformat(record['start_time']).timestamp()
+
+    def load(self):
+        """Load cycle records from file"""
+        try:
+            records = []
+            if os.path.exists(self._file_path):
+                with open(self._file_path, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            print(f"Skipping corrupt pump cycle record: {line[:80]}")
+
+            keyed = sorted(((self._key(r), r) for r in records), key=lambda item: item[0])
+            total_on_disk = len(keyed)
+            keyed = keyed[-self._max_records:]
+
+            series = {None: ([], [])}
+            for key, record in keyed:
+                for name in (None, record.get('pump')):
+                    starts, series_records = series.setdefault(name, ([], []))
+                    starts.append(key)
+                    series_records.append(record)
+
+            with self._lock:
+                self._series = series
+
+            # Compact the file once it has grown well past the retention limit
+            if total_on_disk > self._max_records * 1.25:
+                self._rewrite()
+
+            print(f"Loaded {len(keyed)} pump cycle records")
+        except Exception as e:
+            print(f"Error loading pump cycles: {e}")
+
+    def _rewrite(self):
+        """Rewrite the cycle file with only the retained records"""
+        temp_file = f"{self._file_path}.tmp"
+        with self._lock:
+            records = list(self._series[None][1])
+        with open(temp_file, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        os.replace(temp_file, self._file_path)
+
+    def add(self, record):
+        """Add a cycle record and append it to the cycle file"""
+        key = self._key(record)
+        with self._lock:
+            for name in (None, record.get('pump')):
+                starts, records = self._series.setdefault(name, ([], []))
+                # Cycles of different pumps can finish out of start order
+                position = bisect.bisect_right(starts, key)
+                starts.insert(position, key)
+                records.insert(position, record)
+
+            all_starts, all_records = self._series[None]
+            if len(all_records) > self._max_records:
+                oldest = all_records[0]
+                del all_starts[0]
+                del all_records[0]
+                starts, records = self._series[oldest.get('pump')]
+                del starts[0]
+                del records[0]
+
+        try:
+            with open(self._file_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except Exception as e:
+            print(f"Error saving pump cycle: {e}")
+
+    def query(self, start=None, end=None, pump_name=None, offset=0, limit=None, newest_first=True):
+        """Get cycles that started within [start, end)
+
+        Args:
+            start: datetime lower bound (inclusive), or None for no bound
+            end: datetime upper bound (exclusive), or None for no bound
+            pump_name: Only return cycles of this pump, or None for all
+            offset: Number of matching records to skip
+            limit: Maximum number of records to return, or None for all
+            newest_first: Return the most recent cycles first
+
+        Returns:
+            Tuple of (total matching records, list of records)
+        """
+        with self._lock:
+            starts, records = self._series.get(pump_name, ([], []))
+            lo = bisect.bisect_left(starts, start.timestamp()) if start else 0
+            hi = bisect.bisect_left(starts, end.timestamp()) if end else len(starts)
+            # An end before the start leaves hi below lo: nothing matches
+            total = max(0, hi - lo)
+
+            count = max(0, total - offset)
+            if limit is not None:
+                count = min(count, limit)
+
+            if newest_first:
+                page = records[hi - offset - count:hi - offset]
+                page.reverse()
+            else:
+                page = records[lo + offset:lo + offset + count]
+
+        return total, page
+
+    def __len__(self):
+        return len(self._series[None][1])
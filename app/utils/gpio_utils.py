@@ -1,5 +1,6 @@
 import os
 import json
+import threading
 from RPi import GPIO
 from app.utils.config_utils import (
     SUMMER_HIGH, SUMMER_LOW, SUMMER_EMPTY,
@@ -8,6 +9,10 @@ from app.utils.config_utils import (
 )
 
 class GPIOManager:
+    # Setup, cleanup, the reverse/invert flags and pump outputs change under
+    # _lock so a pump is never driven or read with half-updated flags.
+    # Sensor reads are single GPIO.input calls and take no lock.
+    _lock = threading.RLock()
     _initialized = False
     _reverse_well_pump = False
     _invert_well_output = False  # New attribute for output inversion
@@ -51,71 +56,79 @@ class GPIOManager:
     @classmethod
     def set_well_output_invert(cls, enabled):
         """Enable or disable well pump output inversion"""
-        cls._invert_well_output = enabled
-        cls._save_config()
+        with cls._lock:
+            cls._invert_well_output = enabled
+            cls._save_config()
         print(f"Well pump output inversion {'enabled' if enabled else 'disabled'}")
         return {"status": "success", "invert_mode": enabled}
 
     @classmethod
     def set_pump(cls, pin, state):
         """Set pump state with both reverse mode and output inversion support"""
-        try:
-            desired_logical_state = bool(state)
-            physical_state = desired_logical_state
+        with cls._lock:
+            try:
+                desired_logical_state = bool(state)
+                physical_state = desired_logical_state
             
-            # Apply reverse logic if enabled (for operation mode)
-            if pin == WELL_PUMP and cls._reverse_well_pump:
-                physical_state = not physical_state
+                # Apply reverse logic if enabled (for operation mode)
+                if pin == WELL_PUMP and cls._reverse_well_pump:
+                    physical_state = not physical_state
                 
-            # Apply output inversion if enabled (for hardware)
-            if pin == WELL_PUMP and cls._invert_well_output:
-                physical_state = not physical_state
+                # Apply output inversion if enabled (for hardware)
+                if pin == WELL_PUMP and cls._invert_well_output:
+                    physical_state = not physical_state
             
-            gpio_state = GPIO.HIGH if physical_state else GPIO.LOW
-            GPIO.output(pin, gpio_state)
+                gpio_state = GPIO.HIGH if physical_state else GPIO.LOW
+                GPIO.output(pin, gpio_state)
             
-            actual_physical_state = bool(GPIO.input(pin))
-            success = actual_physical_state == physical_state
+                actual_physical_state = bool(GPIO.input(pin))
+                success = actual_physical_state == physical_state
             
-            print(f"Setting pump - Pin: {pin}, "
-                  f"Desired logical: {desired_logical_state}, "
-                  f"Physical: {physical_state}, "
-                  f"Actual: {actual_physical_state}, "
-                  f"Reverse: {cls._reverse_well_pump}, "
-                  f"Inverted: {cls._invert_well_output}, "
-                  f"Success: {success}")
+                print(f"Setting pump - Pin: {pin}, "
+                      f"Desired logical: {desired_logical_state}, "
+                      f"Physical: {physical_state}, "
+                      f"Actual: {actual_physical_state}, "
+                      f"Reverse: {cls._reverse_well_pump}, "
+                      f"Inverted: {cls._invert_well_output}, "
+                      f"Success: {success}")
             
-            return success
-        except Exception as e:
-            print(f"Error setting pump state: {e}")
-            return False
+                return success
+            except Exception as e:
+                print(f"Error setting pump state: {e}")
+                return False
 
     @classmethod
     def get_pump_state(cls, pin):
         """Get pump state, accounting for both reverse mode and output inversion
         Returns the LOGICAL state (what the user expects to see)
         """
-        try:
-            physical_state = bool(GPIO.input(pin))
-            logical_state = physical_state
+        with cls._lock:
+            try:
+                physical_state = bool(GPIO.input(pin))
+                logical_state = physical_state
             
-            # Apply both reverse logic and output inversion for well pump
-            if pin == WELL_PUMP:
-                if cls._reverse_well_pump:
-                    logical_state = not logical_state
-                if cls._invert_well_output:
-                    logical_state = not logical_state
+                # Apply both reverse logic and output inversion for well pump
+                if pin == WELL_PUMP:
+                    if cls._reverse_well_pump:
+                        logical_state = not logical_state
+                    if cls._invert_well_output:
+                        logical_state = not logical_state
                 
-            print(f"Getting pump state - Pin: {pin}, "
-                  f"Physical: {physical_state}, "
-                  f"Logical: {logical_state}, "
-                  f"Reverse: {cls._reverse_well_pump if pin == WELL_PUMP else False}, "
-                  f"Inverted: {cls._invert_well_output if pin == WELL_PUMP else False}")
+                print(f"Getting pump state - Pin: {pin}, "
+                      f"Physical: {physical_state}, "
+                      f"Logical: {logical_state}, "
+                      f"Reverse: {cls._reverse_well_pump if pin == WELL_PUMP else False}, "
+                      f"Inverted: {cls._invert_well_output if pin == WELL_PUMP else False}")
               
-            return logical_state
-        except Exception as e:
-            print(f"Error getting pump state: {e}")
-            return False
+                return logical_state
+            except Exception as e:
+                print(f"Error getting pump state: {e}")
+                return False
+
+    @staticmethod
+    def read_pin(pin):
+        """Read the raw level of any configured pin, input or output"""
+        return GPIO.input(pin)
 
     @staticmethod
     def get_raw_sensor_state(pin):
@@ -136,46 +149,48 @@ class GPIOManager:
     @classmethod
     def cleanup(cls):
         """Clean up GPIO configuration"""
-        if cls._initialized:
-            GPIO.cleanup()
-            cls._initialized = False
+        with cls._lock:
+            if cls._initialized:
+                GPIO.cleanup()
+                cls._initialized = False
 
     @classmethod
     def initialize(cls):
         """Initialize GPIO if not already initialized"""
-        if not cls._initialized:
-            try:
-                print("Initializing GPIO...")
-                GPIO.setwarnings(False)
-                GPIO.cleanup()
-                GPIO.setmode(GPIO.BCM)
+        with cls._lock:
+            if not cls._initialized:
+                try:
+                    print("Initializing GPIO...")
+                    GPIO.setwarnings(False)
+                    GPIO.cleanup()
+                    GPIO.setmode(GPIO.BCM)
                 
-                # Load saved configuration first
-                cls._load_config()
+                    # Load saved configuration first
+                    cls._load_config()
                 
-                # Setup outputs
-                GPIO.setup(WELL_PUMP, GPIO.OUT)
-                GPIO.setup(DIST_PUMP, GPIO.OUT)
+                    # Setup outputs
+                    GPIO.setup(WELL_PUMP, GPIO.OUT)
+                    GPIO.setup(DIST_PUMP, GPIO.OUT)
                 
-                # Setup inputs with pull-up resistors
-                GPIO.setup(SUMMER_HIGH, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-                GPIO.setup(SUMMER_LOW, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-                GPIO.setup(SUMMER_EMPTY, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-                GPIO.setup(WINTER_HIGH, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-                GPIO.setup(WINTER_LOW, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+                    # Setup inputs with pull-up resistors
+                    GPIO.setup(SUMMER_HIGH, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+                    GPIO.setup(SUMMER_LOW, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+                    GPIO.setup(SUMMER_EMPTY, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+                    GPIO.setup(WINTER_HIGH, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+                    GPIO.setup(WINTER_LOW, GPIO.IN, pull_up_down=GPIO.PUD_UP)
                 
-                # Initialize outputs to OFF
-                GPIO.output(WELL_PUMP, GPIO.LOW)
-                GPIO.output(DIST_PUMP, GPIO.LOW)
+                    # Initialize outputs to OFF
+                    GPIO.output(WELL_PUMP, GPIO.LOW)
+                    GPIO.output(DIST_PUMP, GPIO.LOW)
                 
-                cls._initialized = True
-                print(f"GPIO initialized successfully - Reverse mode: {cls._reverse_well_pump}")
-                return True
-            except Exception as e:
-                print(f"Error initializing GPIO: {e}")
-                cls._initialized = False
-                return False
-        return True
+                    cls._initialized = True
+                    print(f"GPIO initialized successfully - Reverse mode: {cls._reverse_well_pump}")
+                    return True
+                except Exception as e:
+                    print(f"Error initializing GPIO: {e}")
+                    cls._initialized = False
+                    return False
+            return True
 
     @classmethod
     def get_well_pump_reverse_state(cls):
@@ -185,7 +200,8 @@ class GPIOManager:
     @classmethod
     def set_well_pump_reverse(cls, enabled):
         """Enable or disable well pump reverse mode"""
-        cls._reverse_well_pump = enabled
-        cls._save_config()
+        with cls._lock:
+            cls._reverse_well_pump = enabled
+            cls._save_config()
         print(f"Well pump reverse mode {'enabled' if enabled else 'disabled'}")
         return {"status": "success", "reverse_mode": enabled}
\ No newline at end of file
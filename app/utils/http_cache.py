@@ -0,0 +1,55 @@
+import uuid
+from functools import wraps
+from flask import request, make_response
+
+# Versions restart from zero with the process, so tags carry a per-boot id.
+# Web workers mirroring a controller process adopt the controller's id.
+_boot_id = uuid.uuid4().hex[:12]
+
+
+def get_boot_id():
+    return _boot_id
+
+
+def set_boot_id(boot_id):
+    global _boot_id
+    _boot_id = boot_id
+
+
+def make_etag(*versions):
+    """Build a strong ETag value from version counters"""
+    return '-'.join([_boot_id] + [str(v) for v in versions])
+
+
+def conditional(version_func):
+    """Answer conditional GETs from a version counter
+
+    The version is read before the view runs, so a matching If-None-Match
+    gets a bodyless 304 without touching GPIO or stats. Views must serve
+    data at least as new as the version read here.
+
+    Args:
+        version_func: Callable returning a tuple of versions identifying
+            the response content, or None to skip caching
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = version_func()
+            if versions is None:
+                return view(*args, **kwargs)
+
+            etag = make_etag(*versions)
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            # Clients may store the response but must revalidate it every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
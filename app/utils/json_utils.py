@@ -0,0 +1,20 @@
+import json
+from flask import current_app
+
+# orjson is optional; it encodes several times faster than the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(obj):
+    """Serialize an object to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def json_bytes_response(body, status=200):
+    """Build a JSON response from already serialized bytes"""
+    return current_app.response_class(body, status=status, mimetype='application/json')
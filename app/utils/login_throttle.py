@@ -0,0 +1,142 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Bucket (capacity, tokens refilled per second) for each kind of key. Every
+# login attempt takes a token from its IP's, its username's and the global
+# bucket before the password is hashed.
+IP_BUCKET = (10, 1 / 6.0)
+USERNAME_BUCKET = (5, 1 / 30.0)
+# Caps password hashing across all clients so a distributed burst cannot
+# pin the CPU the control loop runs on
+GLOBAL_BUCKET = (5, 2.0)
+
+# Consecutive failures allowed on a key before it is locked out; each
+# further failure doubles the lockout, up to MAX_LOCKOUT_SECONDS
+FAILURES_BEFORE_LOCKOUT = 5
+BASE_LOCKOUT_SECONDS = 2.0
+MAX_LOCKOUT_SECONDS = 900.0
+
+# Keys tracked, least recently used evicted first
+MAX_KEYS = 4096
+
+
+class LoginThrottle:
+    """Token-bucket limiter with exponential lockout for login attempts
+
+    Each key (an IP address or a username) costs one fixed-size list in a
+    bounded LRU: [tokens, last refill time, consecutive failures, locked
+    until]. Evicting an idle key only forgets its history, and a key that
+    has been idle long enough would have refilled anyway.
+    """
+
+    _lock = threading.Lock()
+    _keys = OrderedDict()
+    _global = None
+    _counters = {
+        'attempts': 0,
+        'throttled': 0,
+        'locked_out': 0,
+        'failures': 0,
+        'lockouts': 0
+    }
+
+    @staticmethod
+    def _refill(entry, bucket, now):
+        capacity, rate = bucket
+        entry[0] = min(capacity, entry[0] + (now - entry[1]) * rate)
+        entry[1] = now
+
+    @classmethod
+    def _entry(cls, key, bucket, now):
+        """Get the state of a key, creating it full. Lock held."""
+        entry = cls._keys.get(key)
+        if entry is None:
+            entry = [float(bucket[0]), now, 0, 0.0]
+            cls._keys[key] = entry
+            if len(cls._keys) > MAX_KEYS:
+                cls._keys.popitem(last=False)
+        else:
+            cls._keys.move_to_end(key)
+            cls._refill(entry, bucket, now)
+        return entry
+
+    @classmethod
+    def _keys_for(cls, ip, username):
+        return ((('ip', ip), IP_BUCKET), (('user', username.lower()), USERNAME_BUCKET))
+
+    @classmethod
+    def check(cls, ip, username):
+        """Take a token for a login attempt, before the password is checked
+
+        Args:
+            ip: Client IP address
+            username: Username being tried
+
+        Returns:
+            0 if the attempt may proceed, otherwise the seconds to wait
+        """
+        now = time.monotonic()
+        with cls._lock:
+            cls._counters['attempts'] += 1
+            entries = [(cls._entry(key, bucket, now), bucket) for key, bucket in cls._keys_for(ip, username)]
+
+            locked_until = max(entry[3] for entry, _ in entries)
+            if locked_until > now:
+                cls._counters['locked_out'] += 1
+                return locked_until - now
+
+            if cls._global is None:
+                cls._global = [float(GLOBAL_BUCKET[0]), now, 0, 0.0]
+            else:
+                cls._refill(cls._global, GLOBAL_BUCKET, now)
+
+            # All buckets must have a token; only take them if they do
+            wait = 0.0
+            for entry, (_, rate) in entries + [(cls._global, GLOBAL_BUCKET)]:
+                if entry[0] < 1:
+                    wait = max(wait, (1 - entry[0]) / rate)
+            if wait:
+                cls._counters['throttled'] += 1
+                return wait
+
+            for entry, _ in entries:
+                entry[0] -= 1
+            cls._global[0] -= 1
+            return 0
+
+    @classmethod
+    def record_failure(cls, ip, username):
+        """Count a failed attempt, locking the keys out once they exceed the allowance"""
+        now = time.monotonic()
+        with cls._lock:
+            cls._counters['failures'] += 1
+            for key, bucket in cls._keys_for(ip, username):
+                entry = cls._entry(key, bucket, now)
+                entry[2] += 1
+                excess = entry[2] - FAILURES_BEFORE_LOCKOUT
+                if excess >= 0:
+                    entry[3] = now + min(MAX_LOCKOUT_SECONDS, BASE_LOCKOUT_SECONDS * 2 ** min(excess, 20))
+                    cls._counters['lockouts'] += 1
+
+    @classmethod
+    def record_success(cls, ip, username):
+        """Clear the failure count of the keys after a successful login"""
+        with cls._lock:
+            for key, _ in cls._keys_for(ip, username):
+                entry = cls._keys.get(key)
+                if entry is not None:
+                    entry[2] = 0
+                    entry[3] = 0.0
+
+    @classmethod
+    def get_stats(cls):
+        """Get the attempt counters and the number of tracked keys"""
+        with cls._lock:
+            return dict(cls._counters, tracked_keys=len(cls._keys), max_keys=MAX_KEYS)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._keys.clear()
+            cls._global = None
@@ -2,15 +2,23 @@ from enum import Enum
 from typing import List, Dict, Optional
 import json
 import os
+import time
 import logging
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Seconds between checks of the config file for changes made by the web UI
+RELOAD_CHECK_INTERVAL = 1.0
+
 class AlertChannel(Enum):
+    # Each channel is delivered by the plugin registered under its value,
+    # see app/services/notification_channels.py
     EMAIL = "email"
     SLACK = "slack"
     DISCORD = "discord"
+    WEBHOOK = "webhook"                     # JSON events, batched, to our own collector
+    MQTT = "mqtt"                           # JSON events published to a broker
 
 class AlertType(Enum):
     TANK_ERROR = "tank_error"               # When tank sensors report error state
@@ -23,6 +31,15 @@ class AlertType(Enum):
     SYSTEM_ERROR = "system_error"           # General system errors
     PUMP_STATE_CHANGE = "pump_state_change" # When pumps turn on/off
 
+# Digest windows used when the config file doesn't set one. Only the
+# chatty state change alerts are coalesced out of the box.
+DEFAULT_COALESCE_WINDOWS = {
+    AlertType.TANK_STATE_CHANGE: 300,
+    AlertType.PUMP_STATE_CHANGE: 300
+}
+# Alert types sent at once even when a digest window is set
+DEFAULT_URGENT_TYPES = [AlertType.TANK_EMPTY, AlertType.TANK_ERROR, AlertType.PUMP_ERROR]
+
 class AlertConfig:
     def __init__(self, config_dir: str = None):
         """Initialize alert configuration
@@ -43,6 +60,10 @@ class AlertConfig:
         self.channels: Dict[AlertChannel, Dict] = {}
         self.alert_types: Dict[AlertType, List[AlertChannel]] = {}
         self.rate_limits: Dict[AlertType, int] = {}  # Minimum seconds between alerts of same type
+        self.coalesce_windows: Dict[AlertType, int] = dict(DEFAULT_COALESCE_WINDOWS)  # Seconds alerts are batched into a digest
+        self.urgent_types: List[AlertType] = list(DEFAULT_URGENT_TYPES)  # Never batched
+        self._file_mtime = None
+        self._next_check = 0.0
         
         # Load existing configuration
         self._load_config()
@@ -62,48 +83,69 @@ class AlertConfig:
                 'rate_limits': {
                     alert_type.value: seconds
                     for alert_type, seconds in self.rate_limits.items()
-                } or {}
+                } or {},
+                'coalesce_windows': {
+                    alert_type.value: seconds
+                    for alert_type, seconds in self.coalesce_windows.items()
+                } or {},
+                'urgent_types': [alert_type.value for alert_type in self.urgent_types]
             }
         except Exception as e:
             logger.error(f"Error serializing config: {e}")
             return {
                 'channels': {},
                 'alert_types': {},
-                'rate_limits': {}
+                'rate_limits': {},
+                'coalesce_windows': {},
+                'urgent_types': []
             }
 
+    def _get_file_mtime(self):
+        try:
+            stat = os.stat(self.config_file)
+            return stat.st_ino, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Reload the configuration if the file changed since it was read
+
+        Checks the file at most every RELOAD_CHECK_INTERVAL seconds, so
+        long-lived holders such as the notification service can call this
+        before every alert. A file that fails to parse keeps the current
+        configuration.
+
+        Args:
+            force: Check the file now instead of waiting for the interval
+
+        Returns:
+            True if the configuration was reloaded
+        """
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        self._next_check = now + RELOAD_CHECK_INTERVAL
+        mtime = self._get_file_mtime()
+        if mtime is None or mtime == self._file_mtime:
+            return False
+        try:
+            with open(self.config_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reloading alert configuration: {e}")
+            return False
+        self._apply_config(data)
+        self._file_mtime = mtime
+        return True
+
     def _load_config(self) -> None:
         """Load configuration from file"""
         try:
             if self.config_file.exists():
+                self._file_mtime = self._get_file_mtime()
                 with open(self.config_file, 'r') as f:
                     data = json.load(f)
-                    
-                    # Load channel configurations
-                    if 'channels' in data:
-                        for channel, config in data['channels'].items():
-                            try:
-                                self.channels[AlertChannel(channel)] = config
-                            except ValueError as e:
-                                logger.error(f"Invalid channel type in config: {channel}")
-                    
-                    # Load alert type configurations
-                    if 'alert_types' in data:
-                        for alert_type, channels in data['alert_types'].items():
-                            try:
-                                self.alert_types[AlertType(alert_type)] = [
-                                    AlertChannel(c) for c in channels
-                                ]
-                            except ValueError as e:
-                                logger.error(f"Invalid alert type in config: {alert_type}")
-                    
-                    # Load rate limits
-                    if 'rate_limits' in data:
-                        for alert_type, seconds in data['rate_limits'].items():
-                            try:
-                                self.rate_limits[AlertType(alert_type)] = int(seconds)
-                            except ValueError as e:
-                                logger.error(f"Invalid rate limit in config: {alert_type}")
+                self._apply_config(data)
             else:
                 logger.info("No alert configuration file found. Using empty configuration.")
                 self._create_default_config()
@@ -111,6 +153,58 @@ class AlertConfig:
             logger.error(f"Error loading alert configuration: {e}")
             self._create_default_config()
 
+    def _apply_config(self, data: dict) -> None:
+        """Replace the configuration with the contents of a config file"""
+        channels = {}
+        alert_types = {}
+        rate_limits = {}
+        coalesce_windows = dict(DEFAULT_COALESCE_WINDOWS)
+        urgent_types = list(DEFAULT_URGENT_TYPES)
+
+        # Load channel configurations
+        for channel, config in data.get('channels', {}).items():
+            try:
+                channels[AlertChannel(channel)] = config
+            except ValueError as e:
+                logger.error(f"Invalid channel type in config: {channel}")
+
+        # Load alert type configurations
+        for alert_type, type_channels in data.get('alert_types', {}).items():
+            try:
+                alert_types[AlertType(alert_type)] = [
+                    AlertChannel(c) for c in type_channels
+                ]
+            except ValueError as e:
+                logger.error(f"Invalid alert type in config: {alert_type}")
+
+        # Load rate limits
+        for alert_type, seconds in data.get('rate_limits', {}).items():
+            try:
+                rate_limits[AlertType(alert_type)] = int(seconds)
+            except ValueError as e:
+                logger.error(f"Invalid rate limit in config: {alert_type}")
+
+        # Load digest windows
+        for alert_type, seconds in data.get('coalesce_windows', {}).items():
+            try:
+                coalesce_windows[AlertType(alert_type)] = int(seconds)
+            except ValueError as e:
+                logger.error(f"Invalid digest window in config: {alert_type}")
+
+        if 'urgent_types' in data:
+            urgent_types = []
+            for alert_type in data['urgent_types']:
+                try:
+                    urgent_types.append(AlertType(alert_type))
+                except ValueError as e:
+                    logger.error(f"Invalid urgent alert type in config: {alert_type}")
+
+        self.channels = channels
+        self.alert_types = alert_types
+        self.rate_limits = rate_limits
+        self.coalesce_windows = coalesce_windows
+        self.urgent_types = urgent_types
+
     def _create_default_config(self):
         """Create a default configuration"""
         self.channels = {}
@@ -133,11 +227,21 @@ class AlertConfig:
                 'rate_limits': {
                     alert_type.value: seconds
                     for alert_type, seconds in self.rate_limits.items()
-                }
+                },
+                'coalesce_windows': {
+                    alert_type.value: seconds
+                    for alert_type, seconds in self.coalesce_windows.items()
+                },
+                'urgent_types': [alert_type.value for alert_type in self.urgent_types]
             }
             
-            with open(self.config_file, 'w') as f:
+            # Replace the file in one step so a service reloading it
+            # never reads a partial write
+            tmp_path = str(self.config_file) + '.tmp'
+            with open(tmp_path, 'w') as f:
                 json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.config_file)
+            self._file_mtime = self._get_file_mtime()
                 
         except Exception as e:
             logger.error(f"Error saving alert configuration: {e}")
@@ -179,6 +283,40 @@ class AlertConfig:
         self.rate_limits[alert_type] = seconds
         self.save_config()
 
+    def set_coalesce_window(self, alert_type: AlertType, seconds: int) -> None:
+        """Set how long alerts of a type are batched into a digest; 0 sends each at once"""
+        if seconds < 0:
+            raise ValueError("Digest window cannot be negative")
+
+        self.coalesce_windows[alert_type] = seconds
+        self.save_config()
+
+    def set_urgent(self, alert_type: AlertType, urgent: bool) -> None:
+        """Set whether alerts of a type bypass the digest window"""
+        if urgent and alert_type not in self.urgent_types:
+            self.urgent_types.append(alert_type)
+        elif not urgent and alert_type in self.urgent_types:
+            self.urgent_types.remove(alert_type)
+        self.save_config()
+
+    def get_coalesce_window(self, alert_type: AlertType, channel: AlertChannel = None) -> int:
+        """Get the digest window for an alert type on a channel
+
+        A channel's config may override the windows with a
+        'coalesce_windows' mapping of alert type to seconds. Urgent types
+        are never batched.
+
+        Returns:
+            Window in seconds, 0 to send each alert at once
+        """
+        if alert_type in self.urgent_types:
+            return 0
+        if channel is not None:
+            overrides = (self.channels.get(channel) or {}).get('coalesce_windows') or {}
+            if alert_type.value in overrides:
+                return int(overrides[alert_type.value])
+        return self.coalesce_windows.get(alert_type, 0)
+
     def get_channels_for_alert(self, alert_type: AlertType) -> List[AlertChannel]:
         """Get list of channels configured for an alert type"""
         return self.alert_types.get(alert_type, [])
@@ -192,21 +330,14 @@ class AlertConfig:
         return self.rate_limits.get(alert_type, 0)
 
     def _validate_channel_config(self, channel: AlertChannel, config: Dict) -> bool:
-        """Validate channel-specific configuration"""
+        """Validate channel-specific configuration against the channel's plugin"""
+        from ..services.notification_channels import get_channel_class
         try:
-            if channel == AlertChannel.EMAIL:
-                required = ['smtp_server', 'smtp_port', 'username', 'password', 
-                          'from_email', 'to_emails']
-                return all(key in config for key in required)
-                
-            elif channel == AlertChannel.SLACK:
-                return 'webhook_url' in config
-                
-            elif channel == AlertChannel.DISCORD:
-                return 'webhook_url' in config
-                
-            return False
+            channel_class = get_channel_class(channel.value)
+            if channel_class is None:
+                return False
+            return channel_class.validate(config)
             
         except Exception as e:
             logger.error(f"Error validating channel config: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,104 @@
+import time
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, session, get_flashed_messages
+from flask_login import current_user
+
+# Rendered pages kept, least recently used evicted first
+MAX_ENTRIES = 64
+# Pages show durations relative to now, so even unchanged data is
+# re-rendered after this many seconds
+MAX_AGE_SECONDS = 60
+
+
+class RenderCache:
+    """Bounded LRU cache of rendered HTML pages
+
+    Entries are keyed by endpoint, user and the versions of the data the
+    page was rendered from, so a page is served from the cache until its
+    data changes and stale versions simply age out of the LRU.
+    """
+
+    _lock = threading.Lock()
+    _entries = OrderedDict()  # key -> (rendered at, html)
+    _hits = 0
+    _misses = 0
+
+    @classmethod
+    def get(cls, key):
+        """Get a cached page, or None if absent or expired"""
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > MAX_AGE_SECONDS:
+                cls._misses += 1
+                return None
+            cls._entries.move_to_end(key)
+            cls._hits += 1
+            return entry[1]
+
+    @classmethod
+    def put(cls, key, html):
+        with cls._lock:
+            cls._entries[key] = (time.monotonic(), html)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            return {
+                'entries': len(cls._entries),
+                'max_entries': MAX_ENTRIES,
+                'hits': cls._hits,
+                'misses': cls._misses
+            }
+
+
+def skip_render_cache():
+    """Keep the page rendered by the current request out of the cache
+
+    For views that catch their own errors and render a fallback page.
+    """
+    g.skip_render_cache = True
+
+
+def cached_render(version_func):
+    """Serve a page view from the render cache while its data is unchanged
+
+    The versions are read before the view runs, so the cached page is at
+    least as new as the versions it is stored under. Pages are cached per
+    user, since the navigation shows the user name and role-dependent
+    controls. Requests with flashed messages bypass the cache in both
+    directions.
+
+    Args:
+        version_func: Callable returning a tuple of versions identifying
+            the page's data, or None to skip caching
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = version_func()
+            if versions is None or '_flashes' in session or not current_user.is_authenticated:
+                return view(*args, **kwargs)
+
+            key = (request.endpoint, current_user.role.value, current_user.id,
+                   tuple(sorted(request.args.items(multi=True))), versions)
+            html = RenderCache.get(key)
+            if html is not None:
+                return html
+
+            html = view(*args, **kwargs)
+            if (isinstance(html, str) and not g.get('skip_render_cache')
+                    and not get_flashed_messages()):
+                RenderCache.put(key, html)
+            return html
+        return wrapper
+    return decorator
@@ -1,8 +1,12 @@
 import os
 import json
 import time
+import copy
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from collections import defaultdict
+from .cycle_index import PumpCycleIndex
 
 class StatsManager:
     """Manager for statistics collection and persistence"""
@@ -12,6 +16,7 @@ class StatsManager:
     _pump_stats_file = os.path.join(_stats_dir, 'pump_stats.json')
     _tank_history_file = os.path.join(_stats_dir, 'tank_history.json')
     _config_file = os.path.join(_stats_dir, 'stats_config.json')
+    _pump_cycles_file = os.path.join(_stats_dir, 'pump_cycles.jsonl')
     
     # Default config
     _default_config = {
@@ -60,8 +65,22 @@ class StatsManager:
         'winter': {'state': 'unknown', 'since': None}
     }
     
+    # Pump cycles (one record per ON->OFF transition)
+    _cycle_index = PumpCycleIndex(_pump_cycles_file)
+    _open_cycles = {}  # pump name -> cycle record started but not finished
+    
     _config = _default_config.copy()
     _initialized = False
+
+    # Writers (the control thread and config updates) serialize on this lock.
+    # Readers never take it: they grab the current published snapshot, which
+    # is rebuilt copy-on-write after each mutation batch and never mutated.
+    _lock = threading.RLock()
+    _snapshot = None
+    _version = 0
+    _batch_depth = 0
+    _dirty_parts = set()
+    _listeners = []
     
     @classmethod
     def initialize(cls):
@@ -69,12 +88,126 @@ class StatsManager:
         if cls._initialized:
             return
         
-        os.makedirs(cls._stats_dir, exist_ok=True)
-        cls._load_config()
-        cls._load_pump_stats()
-        cls._load_tank_history()
-        cls._check_reset_periods()
-        cls._initialized = True
+        with cls._lock:
+            if cls._initialized:
+                return
+
+            os.makedirs(cls._stats_dir, exist_ok=True)
+            cls._load_config()
+            cls._load_pump_stats()
+            cls._load_tank_history()
+            cls._cycle_index.load()
+            cls._check_reset_periods()
+            cls._changed('pump_stats', 'tank_history', 'current_tank_states', 'config', 'pump_cycles')
+            cls._initialized = True
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """Group several updates so readers see them as one snapshot
+
+        Usage:
+            with StatsManager.batch():
+                StatsManager.update_pump_stats('well_pump', True, 1.0)
+                StatsManager.update_pump_stats('dist_pump', False, 1.0)
+        """
+        with cls._lock:
+            cls._batch_depth += 1
+            try:
+                yield
+            finally:
+                cls._batch_depth -= 1
+                if cls._batch_depth == 0 and cls._dirty_parts:
+                    cls._publish_snapshot()
+
+    @classmethod
+    def _changed(cls, *parts):
+        """Mark parts of the stats as modified and publish unless batching
+
+        Must be called with the lock held.
+        """
+        cls._dirty_parts.update(parts)
+        if cls._batch_depth == 0:
+            cls._publish_snapshot()
+
+    @classmethod
+    def _publish_snapshot(cls):
+        """Publish a new immutable snapshot for lock-free readers
+
+        Only the modified parts are copied; unchanged parts are shared with
+        the previous snapshot. Must be called with the lock held.
+        """
+        previous = cls._snapshot or {}
+        dirty = cls._dirty_parts if previous else {
+            'pump_stats', 'tank_history', 'current_tank_states', 'config', 'pump_cycles'
+        }
+
+        snapshot = {
+            'pump_stats': (copy.deepcopy(cls._pump_stats)
+                           if 'pump_stats' in dirty else previous['pump_stats']),
+            'tank_history': ({tank: tuple(history) for tank, history in cls._tank_history.items()}
+                             if 'tank_history' in dirty else previous['tank_history']),
+            'current_tank_states': ({tank: dict(info) for tank, info in cls._current_tank_states.items()}
+                                    if 'current_tank_states' in dirty else previous['current_tank_states']),
+            'config': dict(cls._config) if 'config' in dirty else previous['config'],
+            'pump_cycle_count': len(cls._cycle_index),
+        }
+
+        cls._version += 1
+        snapshot['version'] = cls._version
+
+        # Version at which each part last changed, for caches that only
+        # depend on some of the stats
+        part_versions = dict(previous.get('part_versions', {}))
+        for part in dirty:
+            part_versions[part] = cls._version
+        snapshot['part_versions'] = part_versions
+        cls._dirty_parts = set()
+
+        # Single reference assignment - atomic for readers
+        cls._snapshot = snapshot
+
+        for listener in cls._listeners:
+            listener(cls._version, part_versions)
+
+    @classmethod
+    def add_listener(cls, listener):
+        """Call listener(version, part_versions) after every new snapshot
+
+        Listeners run with the writer lock held, so they must be quick and
+        must not call back into StatsManager.
+        """
+        cls._listeners.append(listener)
+
+    @classmethod
+    def get_snapshot(cls):
+        """Get the current stats snapshot
+
+        The returned structure is shared between readers and must be
+        treated as read-only.
+        """
+        if not cls._initialized:
+            cls.initialize()
+        return cls._snapshot
+
+    @classmethod
+    def get_version(cls):
+        """Get the version number of the current stats snapshot"""
+        return cls.get_snapshot()['version']
+
+    @classmethod
+    def get_part_versions(cls, *parts):
+        """Get the versions at which the given snapshot parts last changed
+
+        Args:
+            parts: Part names ('pump_stats', 'tank_history',
+                'current_tank_states', 'config', 'pump_cycles')
+
+        Returns:
+            Tuple of versions, one per part
+        """
+        part_versions = cls.get_snapshot()['part_versions']
+        return tuple(part_versions.get(part, 0) for part in parts)
     
     @classmethod
     def _load_config(cls):
@@ -220,7 +353,9 @@ class StatsManager:
             # Keep only last 30 entries per tank
             for tank in cls._tank_history:
                 cls._tank_history[tank] = cls._tank_history[tank][-30:]
+            cls._dirty_parts.add('tank_history')
         
+        cls._dirty_parts.add('pump_stats')
         cls._save_pump_stats()
     
     @classmethod
@@ -240,23 +375,26 @@ class StatsManager:
         
         # Update last active timestamp if running
         if running:
-            cls._pump_stats[pump_name]['last_active'] = datetime.now().isoformat()
-            
-            # Calculate volume based on GPM rate
-            gpm = cls._config.get(f'{pump_name}_gpm', 
-                                 40.0 if pump_name == 'well_pump' else 15.0)
-            volume = (gpm / 60.0) * elapsed_seconds
-            
-            # Update all periods
-            for period in ['today', 'week', 'month', 'year', 'total']:
-                cls._pump_stats[pump_name][period]['runtime'] += elapsed_seconds
-                cls._pump_stats[pump_name][period]['volume'] += volume
+            with cls._lock:
+                cls._pump_stats[pump_name]['last_active'] = datetime.now().isoformat()
                 
-            # Save updated stats (every 5 minutes to reduce disk writes)
-            total_runtime = cls._pump_stats[pump_name]['today']['runtime']
-            if total_runtime % 300 < elapsed_seconds:
-                cls._save_pump_stats()
-                cls._check_reset_periods()
+                # Calculate volume based on GPM rate
+                gpm = cls._config.get(f'{pump_name}_gpm', 
+                                     40.0 if pump_name == 'well_pump' else 15.0)
+                volume = (gpm / 60.0) * elapsed_seconds
+                
+                # Update all periods
+                for period in ['today', 'week', 'month', 'year', 'total']:
+                    cls._pump_stats[pump_name][period]['runtime'] += elapsed_seconds
+                    cls._pump_stats[pump_name][period]['volume'] += volume
+                    
+                # Save updated stats (every 5 minutes to reduce disk writes)
+                total_runtime = cls._pump_stats[pump_name]['today']['runtime']
+                if total_runtime % 300 < elapsed_seconds:
+                    cls._save_pump_stats()
+                    cls._check_reset_periods()
+
+                cls._changed('pump_stats')
     
     @classmethod
     def update_tank_state(cls, tank_name, state):
@@ -272,38 +410,125 @@ class StatsManager:
         if tank_name not in cls._current_tank_states:
             return
         
-        now = datetime.now()
-        current = cls._current_tank_states[tank_name]
-        
-        # If state has changed
-        if current['state'] != state:
-            # Record previous state duration if it exists
-            if current['since']:
-                try:
-                    start_time = datetime.fromisoformat(current['since'])
-                    duration = (now - start_time).total_seconds()
-                    
-                    # Add to history
-                    cls._tank_history[tank_name].append({
-                        'state': current['state'],
-                        'start_time': current['since'],
-                        'duration': duration,
-                        'end_time': now.isoformat()
-                    })
-                    
-                    # Save history (not too frequently)
-                    if len(cls._tank_history[tank_name]) % 5 == 0:
-                        cls._save_tank_history()
-                except Exception as e:
-                    print(f"Error updating tank history: {e}")
+        with cls._lock:
+            now = datetime.now()
+            current = cls._current_tank_states[tank_name]
             
-            # Update current state
-            cls._current_tank_states[tank_name] = {
-                'state': state,
-                'since': now.isoformat()
-            }
-            cls._save_tank_history()
+            # If state has changed
+            if current['state'] != state:
+                # Record previous state duration if it exists
+                if current['since']:
+                    try:
+                        start_time = datetime.fromisoformat(current['since'])
+                        duration = (now - start_time).total_seconds()
+                        
+                        # Add to history
+                        cls._tank_history[tank_name].append({
+                            'state': current['state'],
+                            'start_time': current['since'],
+                            'duration': duration,
+                            'end_time': now.isoformat()
+                        })
+                        
+                        # Save history (not too frequently)
+                        if len(cls._tank_history[tank_name]) % 5 == 0:
+                            cls._save_tank_history()
+                    except Exception as e:
+                        print(f"Error updating tank history: {e}")
+                
+                # Update current state
+                cls._current_tank_states[tank_name] = {
+                    'state': state,
+                    'since': now.isoformat()
+                }
+                cls._save_tank_history()
+                cls._changed('tank_history', 'current_tank_states')
     
+    @classmethod
+    def start_pump_cycle(cls, pump_name, mode, tank_state):
+        """Record that a pump has turned on
+
+        Args:
+            pump_name: Name of the pump ('well_pump' or 'dist_pump')
+            mode: Current system mode
+            tank_state: Tank state when the pump started
+        """
+        if not cls._initialized:
+            cls.initialize()
+
+        if pump_name not in cls._pump_stats:
+            return
+
+        with cls._lock:
+            cls._open_cycles[pump_name] = {
+                'pump': pump_name,
+                'start_time': datetime.now().isoformat(),
+                'mode': mode,
+                'tank_state_start': tank_state
+            }
+
+    @classmethod
+    def end_pump_cycle(cls, pump_name, tank_state):
+        """Record that a pump has turned off and store the completed cycle
+
+        Args:
+            pump_name: Name of the pump ('well_pump' or 'dist_pump')
+            tank_state: Tank state when the pump stopped
+
+        Returns:
+            The cycle record, or None if no cycle was in progress
+        """
+        if not cls._initialized:
+            cls.initialize()
+
+        with cls._lock:
+            cycle = cls._open_cycles.pop(pump_name, None)
+            if cycle is None:
+                return None
+
+            now = datetime.now()
+            duration = (now - datetime.fromisoformat(cycle['start_time'])).total_seconds()
+            gpm = cls._config.get(f'{pump_name}_gpm',
+                                  40.0 if pump_name == 'well_pump' else 15.0)
+
+            cycle.update({
+                'end_time': now.isoformat(),
+                'duration': duration,
+                'gallons': (gpm / 60.0) * duration,
+                'tank_state_end': tank_state
+            })
+            cls._cycle_index.add(cycle)
+            cls._changed('pump_cycles')
+            return cycle
+
+    @classmethod
+    def get_pump_cycles(cls, pump_name=None, start=None, end=None, offset=0, limit=50, newest_first=True):
+        """Get completed pump cycles that started within a time range
+
+        Args:
+            pump_name: Name of the pump, or None for all pumps
+            start: datetime lower bound (inclusive), or None
+            end: datetime upper bound (exclusive), or None
+            offset: Number of matching cycles to skip
+            limit: Maximum number of cycles to return
+            newest_first: Return the most recent cycles first
+
+        Returns:
+            Dict with the total number of matching cycles and the requested page
+        """
+        if not cls._initialized:
+            cls.initialize()
+
+        total, cycles = cls._cycle_index.query(start, end, pump_name=pump_name,
+                                               offset=offset, limit=limit,
+                                               newest_first=newest_first)
+        return {
+            'total': total,
+            'cycles': cycles,
+            'open_cycles': {name: dict(cycle) for name, cycle in list(cls._open_cycles.items())
+                            if pump_name is None or name == pump_name}
+        }
+
     @classmethod
     def get_pump_stats(cls, pump_name=None):
         """Get pump statistics
@@ -314,12 +539,11 @@ class StatsManager:
         Returns:
             Dict with pump statistics
         """
-        if not cls._initialized:
-            cls.initialize()
+        pump_stats = cls.get_snapshot()['pump_stats']
             
         if pump_name:
-            return cls._pump_stats.get(pump_name, {})
-        return cls._pump_stats
+            return pump_stats.get(pump_name, {})
+        return pump_stats
     
     @classmethod
     def get_tank_history(cls, tank_name=None, max_entries=10):
@@ -332,28 +556,26 @@ class StatsManager:
         Returns:
             Dict with tank history
         """
-        if not cls._initialized:
-            cls.initialize()
+        tank_history = cls.get_snapshot()['tank_history']
             
         if tank_name:
-            history = cls._tank_history.get(tank_name, [])
+            history = tank_history.get(tank_name, ())
             return history[-max_entries:] if max_entries else history
         
         result = {}
-        for tank, history in cls._tank_history.items():
+        for tank, history in tank_history.items():
             result[tank] = history[-max_entries:] if max_entries else history
         return result
     
     @classmethod
     def get_current_tank_states(cls):
         """Get current tank states with duration"""
-        if not cls._initialized:
-            cls.initialize()
+        current_tank_states = cls.get_snapshot()['current_tank_states']
             
         result = {}
         now = datetime.now()
         
-        for tank, state_info in cls._current_tank_states.items():
+        for tank, state_info in current_tank_states.items():
             result[tank] = state_info.copy()
             if state_info['since']:
                 try:
@@ -372,19 +594,28 @@ class StatsManager:
         if not cls._initialized:
             cls.initialize()
             
-        if well_gpm is not None:
-            cls._config['well_pump_gpm'] = float(well_gpm)
-        
-        if dist_gpm is not None:
-            cls._config['dist_pump_gpm'] = float(dist_gpm)
+        with cls._lock:
+            if well_gpm is not None:
+                cls._config['well_pump_gpm'] = float(well_gpm)
             
-        cls._save_config()
-        return cls._config
+            if dist_gpm is not None:
+                cls._config['dist_pump_gpm'] = float(dist_gpm)
+                
+            cls._save_config()
+            cls._changed('config')
+        return cls.get_config()
     
     @classmethod
     def get_config(cls):
-        """Get current configuration"""
-        if not cls._initialized:
-            cls.initialize()
-            
-        return cls._config.copy()
\ No newline at end of file
+        """Get current configuration
+
+        Returns a copy, so callers may modify it without touching the
+        snapshot shared with other readers.
+        """
+        return dict(cls.get_snapshot()['config'])
+
+    @classmethod
+    def get_analytics(cls, days=365):
+        """Get pump and tank analytics for the last `days` days (see AnalyticsEngine)"""
+        from .analytics import AnalyticsEngine
+        return AnalyticsEngine.get_analytics(days)
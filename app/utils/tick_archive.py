@@ -0,0 +1,459 @@
+import os
+import lzma
+import math
+import struct
+import threading
+from datetime import datetime, date, time as dt_time, timedelta
+
+import numpy as np
+
+from app.utils.config_utils import (
+    CONFIG_DIR,
+    SUMMER_HIGH, SUMMER_LOW, SUMMER_EMPTY,
+    WINTER_HIGH, WINTER_LOW
+)
+
+# Input bitmask layout (sensor triggered = bit set)
+INPUT_BITS = {
+    SUMMER_HIGH: 0x01,
+    SUMMER_LOW: 0x02,
+    SUMMER_EMPTY: 0x04,
+    WINTER_HIGH: 0x08,
+    WINTER_LOW: 0x10
+}
+
+# Output bitmask layout (logical pump state, ON = bit set)
+OUTPUT_WELL_PUMP = 0x01
+OUTPUT_DIST_PUMP = 0x02
+
+MODE_CODES = {'SUMMER': 1, 'WINTER': 2, 'CHANGEOVER': 3}
+MODE_NAMES = {code: name for name, code in MODE_CODES.items()}
+
+# Columns stored per tick, in file order
+COLUMNS = (
+    ('time', np.uint32),    # Deciseconds since local midnight of the file's day
+    ('inputs', np.uint8),
+    ('outputs', np.uint8),
+    ('mode', np.uint8)
+)
+
+LIVE_MAGIC = b'PCTICK1\x00'
+SEALED_MAGIC = b'PCTICKZ1'
+# magic, day start (epoch seconds), capacity, row count
+LIVE_HEADER = struct.Struct('<8sqII')
+LIVE_HEADER_SIZE = 64
+# magic, day start, row count, block count
+SEALED_HEADER = struct.Struct('<8sqII')
+# first time, last time, rows, data offset, compressed length per column
+BLOCK_ENTRY = struct.Struct('<IIIQ' + 'I' * len(COLUMNS))
+
+ROWS_PER_DAY_CAPACITY = 86400 * 2  # Room for ticks faster than 1 Hz
+SEALED_BLOCK_ROWS = 3600
+
+
+class TickArchive:
+    """Columnar archive of raw per-tick sensor and pump levels
+
+    Each day is written to a fixed-width columnar file that is memory-mapped
+    and appended to in place. When the day is over the file is sealed:
+    every column is cut into blocks of an hour's worth of ticks and each
+    block is compressed on its own (time deltas first, so steady ticks
+    compress to almost nothing). A block table at the head of the sealed
+    file lets the reader decompress only the blocks that overlap the
+    requested time range.
+    """
+
+    _archive_dir = os.path.join(CONFIG_DIR, 'archive')
+    _retention_days = 5 * 365
+
+    _lock = threading.Lock()
+    _initialized = False
+    _day = None
+    _day_start = None
+    _header = None
+    _columns = None
+    _count = 0
+    _capacity = 0
+
+    @classmethod
+    def initialize(cls):
+        """Create the archive directory and seal days left open by a restart"""
+        with cls._lock:
+            if cls._initialized:
+                return
+            os.makedirs(cls._archive_dir, exist_ok=True)
+            cls._initialized = True
+
+        cls._seal_in_background(cls._unsealed_past_days(date.today()))
+
+    @classmethod
+    def _live_path(cls, day):
+        return os.path.join(cls._archive_dir, f'ticks-{day.isoformat()}.col')
+
+    @classmethod
+    def _sealed_path(cls, day):
+        return os.path.join(cls._archive_dir, f'ticks-{day.isoformat()}.colz')
+
+    @staticmethod
+    def _day_start_epoch(day):
+        return int(datetime.combine(day, dt_time()).timestamp())
+
+    @staticmethod
+    def encode_inputs(sensor_states):
+        """Pack sensor states into an input bitmask
+
+        Args:
+            sensor_states: Dict mapping sensor pin to triggered state
+        """
+        bits = 0
+        for pin, triggered in sensor_states.items():
+            if triggered:
+                bits |= INPUT_BITS.get(pin, 0)
+        return bits
+
+    @staticmethod
+    def encode_outputs(well_running, dist_running):
+        """Pack pump states into an output bitmask"""
+        return (OUTPUT_WELL_PUMP if well_running else 0) | (OUTPUT_DIST_PUMP if dist_running else 0)
+
+    @classmethod
+    def record_tick(cls, timestamp, inputs, outputs, mode):
+        """Append one tick to the archive
+
+        Args:
+            timestamp: Epoch seconds of the tick
+            inputs: Input bitmask (see encode_inputs)
+            outputs: Output bitmask (see encode_outputs)
+            mode: Mode name (SUMMER, WINTER or CHANGEOVER)
+        """
+        if not cls._initialized:
+            cls.initialize()
+
+        try:
+            with cls._lock:
+                day = datetime.fromtimestamp(timestamp).date()
+                if day != cls._day:
+                    cls._open_day(day)
+
+                if cls._count >= cls._capacity:
+                    return
+
+                row = cls._count
+                cls._columns['time'][row] = int((timestamp - cls._day_start) * 10)
+                cls._columns['inputs'][row] = inputs
+                cls._columns['outputs'][row] = outputs
+                cls._columns['mode'][row] = MODE_CODES.get(mode, 0)
+
+                # Publish the row to readers by bumping the count last
+                cls._count = row + 1
+                cls._header[0] = cls._count
+        except Exception as e:
+            print(f"Error recording tick: {e}")
+
+    @classmethod
+    def _open_day(cls, day):
+        """Map the live file for a day, creating it if needed. Lock held."""
+        previous_day = cls._day
+        cls._close_day()
+
+        path = cls._live_path(day)
+        day_start = cls._day_start_epoch(day)
+        capacity = ROWS_PER_DAY_CAPACITY
+
+        if not os.path.exists(path):
+            size = LIVE_HEADER_SIZE + sum(np.dtype(dtype).itemsize * capacity for _, dtype in COLUMNS)
+            with open(path, 'wb') as f:
+                f.write(LIVE_HEADER.pack(LIVE_MAGIC, day_start, capacity, 0))
+                f.truncate(size)  # Sparse until written
+
+        columns, header, capacity = cls._map_live_file(path, mode='r+')
+        cls._day = day
+        cls._day_start = day_start
+        cls._columns = columns
+        cls._header = header
+        cls._capacity = capacity
+        cls._count = int(header[0])
+
+        if previous_day is not None and previous_day != day:
+            cls._seal_in_background([previous_day])
+
+    @classmethod
+    def _close_day(cls):
+        if cls._columns is not None:
+            for column in cls._columns.values():
+                column.flush()
+        cls._day = None
+        cls._columns = None
+        cls._header = None
+        cls._count = 0
+
+    @staticmethod
+    def _map_live_file(path, mode='r'):
+        """Memory-map the columns of a live file
+
+        Returns:
+            Tuple of (dict of column arrays, one-element row count array, capacity)
+        """
+        with open(path, 'rb') as f:
+            magic, day_start, capacity, count = LIVE_HEADER.unpack(f.read(LIVE_HEADER.size))
+        if magic != LIVE_MAGIC:
+            raise ValueError(f"Not a tick archive file: {path}")
+
+        header = np.memmap(path, dtype=np.uint32, mode=mode,
+                           offset=LIVE_HEADER.size - 4, shape=(1,))
+        columns = {}
+        offset = LIVE_HEADER_SIZE
+        for name, dtype in COLUMNS:
+            columns[name] = np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=(capacity,))
+            offset += np.dtype(dtype).itemsize * capacity
+        return columns, header, capacity
+
+    @classmethod
+    def _unsealed_past_days(cls, today):
+        days = []
+        try:
+            for filename in os.listdir(cls._archive_dir):
+                if filename.startswith('ticks-') and filename.endswith('.col'):
+                    day = date.fromisoformat(filename[6:-4])
+                    if day < today:
+                        days.append(day)
+        except Exception as e:
+            print(f"Error scanning tick archive: {e}")
+        return sorted(days)
+
+    @classmethod
+    def _seal_in_background(cls, days):
+        if days:
+            threading.Thread(target=cls._seal_days, args=(days,), daemon=True).start()
+
+    @classmethod
+    def _seal_days(cls, days):
+        for day in days:
+            try:
+                cls.seal_day(day)
+            except Exception as e:
+                print(f"Error sealing tick archive for {day}: {e}")
+        cls._apply_retention()
+
+    @classmethod
+    def seal_day(cls, day):
+        """Compress a finished day's live file into a sealed block file"""
+        live_path = cls._live_path(day)
+        sealed_path = cls._sealed_path(day)
+        if not os.path.exists(live_path):
+            return
+
+        columns, header, _ = cls._map_live_file(live_path)
+        count = int(header[0])
+        day_start = cls._day_start_epoch(day)
+
+        blocks = []
+        payload = []
+        offset = 0
+        for first in range(0, count, SEALED_BLOCK_ROWS):
+            last = min(first + SEALED_BLOCK_ROWS, count)
+            times = np.array(columns['time'][first:last])
+            lengths = []
+            for name, dtype in COLUMNS:
+                data = np.array(columns[name][first:last])
+                if name == 'time':
+                    data = np.diff(data, prepend=np.uint32(0)).astype(np.uint32)
+                compressed = lzma.compress(data.tobytes(), preset=6)
+                payload.append(compressed)
+                lengths.append(len(compressed))
+            blocks.append((int(times[0]), int(times[-1]), last - first, offset, *lengths))
+            offset += sum(lengths)
+
+        table_size = SEALED_HEADER.size + BLOCK_ENTRY.size * len(blocks)
+        temp_path = f"{sealed_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(SEALED_HEADER.pack(SEALED_MAGIC, day_start, count, len(blocks)))
+            for block in blocks:
+                first_time, last_time, rows, data_offset, *lengths = block
+                f.write(BLOCK_ENTRY.pack(first_time, last_time, rows, table_size + data_offset, *lengths))
+            for chunk in payload:
+                f.write(chunk)
+        os.replace(temp_path, sealed_path)
+
+        del columns, header
+        os.remove(live_path)
+        print(f"Sealed tick archive for {day}: {count} ticks, {os.path.getsize(sealed_path)} bytes")
+
+    @classmethod
+    def _apply_retention(cls):
+        cutoff = date.today() - timedelta(days=cls._retention_days)
+        for filename in os.listdir(cls._archive_dir):
+            if filename.startswith('ticks-') and filename.endswith('.colz'):
+                try:
+                    if date.fromisoformat(filename[6:-5]) < cutoff:
+                        os.remove(os.path.join(cls._archive_dir, filename))
+                except (ValueError, OSError) as e:
+                    print(f"Error applying tick archive retention to {filename}: {e}")
+
+    @staticmethod
+    def to_deciseconds(moment):
+        """Convert a datetime to epoch deciseconds, rounding up"""
+        return int(math.ceil(round(moment.timestamp() * 10, 6)))
+
+    @classmethod
+    def _iter_days(cls, start_ds, end_ds, names=None):
+        """Yield (day start in epoch deciseconds, rows) for each day in [start_ds, end_ds)
+
+        Rows are dicts of NumPy arrays for the requested columns, with
+        'time' in deciseconds since the day start. Days without ticks in
+        the range are skipped.
+        """
+        day = datetime.fromtimestamp(start_ds / 10).date()
+        last_day = datetime.fromtimestamp(max(start_ds, end_ds - 1) / 10).date()
+        while day <= last_day:
+            day_start_ds = cls._day_start_epoch(day) * 10
+            lo = max(0, start_ds - day_start_ds)
+            hi = max(0, end_ds - day_start_ds)
+            part = cls._read_day(day, lo, hi, names)
+            if part is not None and len(part['time']):
+                yield day_start_ds, part
+            day += timedelta(days=1)
+
+    @classmethod
+    def iter_range(cls, start, end, skip=0):
+        """Yield ticks with start <= time < end, one day at a time
+
+        Memory use is bounded by a day of ticks however long the range is.
+
+        Args:
+            start: datetime or epoch deciseconds lower bound (inclusive)
+            end: datetime or epoch deciseconds upper bound (exclusive)
+            skip: Number of leading ticks to skip
+
+        Yields:
+            Dicts of NumPy arrays: 'timestamp' (epoch seconds), 'inputs',
+            'outputs' and 'mode'
+        """
+        start_ds = start if isinstance(start, int) else cls.to_deciseconds(start)
+        end_ds = end if isinstance(end, int) else cls.to_deciseconds(end)
+        for day_start_ds, part in cls._iter_days(start_ds, end_ds):
+            if skip:
+                dropped = min(skip, len(part['time']))
+                part = {name: values[dropped:] for name, values in part.items()}
+                skip -= dropped
+                if not len(part['time']):
+                    continue
+            part['timestamp'] = (day_start_ds + part.pop('time').astype(np.int64)) / 10.0
+            yield part
+
+    @classmethod
+    def read_range(cls, start, end, limit=None):
+        """Read ticks with start <= time < end
+
+        Only the pages (live days) or blocks (sealed days) that overlap the
+        range are read.
+
+        Args:
+            start: datetime lower bound (inclusive)
+            end: datetime upper bound (exclusive)
+            limit: Maximum number of ticks to return, or None for all
+
+        Returns:
+            Dict of NumPy arrays: 'timestamp' (epoch seconds), 'inputs',
+            'outputs' and 'mode'
+        """
+        parts = []
+        remaining = limit
+        for part in cls.iter_range(start, end):
+            if remaining is not None:
+                part = {name: values[:remaining] for name, values in part.items()}
+                remaining -= len(part['timestamp'])
+            parts.append(part)
+            if remaining is not None and remaining <= 0:
+                break
+
+        names = ['timestamp'] + [name for name, _ in COLUMNS if name != 'time']
+        if not parts:
+            return {name: np.empty(0, dtype=np.float64 if name == 'timestamp' else np.uint8)
+                    for name in names}
+        return {name: np.concatenate([part[name] for part in parts]) for name in names}
+
+    @classmethod
+    def locate(cls, start_ds, end_ds, n):
+        """Find the n-th tick (counting from 0) with start_ds <= time < end_ds
+
+        Only the time column is read.
+
+        Returns:
+            Tuple of (its time in epoch deciseconds, number of ticks before
+            it in the range with the same time), or None if the range has
+            n ticks or fewer
+        """
+        for day_start_ds, part in cls._iter_days(start_ds, end_ds, names=('time',)):
+            times = part['time']
+            if n < len(times):
+                time = int(times[n])
+                ties = n - int(np.searchsorted(times, time))
+                return day_start_ds + time, ties
+            n -= len(times)
+        return None
+
+    @classmethod
+    def _read_day(cls, day, lo, hi, names=None):
+        """Read the rows of a day whose time column is within [lo, hi)"""
+        for _ in range(2):
+            sealed_path = cls._sealed_path(day)
+            if os.path.exists(sealed_path):
+                return cls._read_sealed(sealed_path, lo, hi, names)
+            try:
+                return cls._read_live(cls._live_path(day), lo, hi, names)
+            except FileNotFoundError:
+                continue  # Sealed while we were looking, try again
+        return None
+
+    @staticmethod
+    def _read_live(path, lo, hi, names=None):
+        columns, header, _ = TickArchive._map_live_file(path)
+        count = int(header[0])
+        times = columns['time'][:count]
+        first, last = np.searchsorted(times, [lo, hi])
+        return {name: np.array(values[first:last]) for name, values in columns.items()
+                if names is None or name in names}
+
+    @staticmethod
+    def _read_sealed(path, lo, hi, names=None):
+        wanted = [(name, dtype) for name, dtype in COLUMNS
+                  if names is None or name in names or name == 'time']
+        parts = {name: [] for name, _ in wanted}
+        with open(path, 'rb') as f:
+            magic, _, _, block_count = SEALED_HEADER.unpack(f.read(SEALED_HEADER.size))
+            if magic != SEALED_MAGIC:
+                raise ValueError(f"Not a sealed tick archive file: {path}")
+            table = [BLOCK_ENTRY.unpack(f.read(BLOCK_ENTRY.size)) for _ in range(block_count)]
+
+            for first_time, last_time, rows, data_offset, *lengths in table:
+                if last_time < lo or first_time >= hi:
+                    continue
+                block = {}
+                offset = data_offset
+                for (name, dtype), length in zip(COLUMNS, lengths):
+                    if name in parts:
+                        f.seek(offset)
+                        block[name] = np.frombuffer(lzma.decompress(f.read(length)), dtype=dtype)
+                    offset += length
+                block['time'] = np.cumsum(block['time'], dtype=np.uint32)
+                first, last = np.searchsorted(block['time'], [lo, hi])
+                for name in parts:
+                    parts[name].append(block[name][first:last])
+
+        return {name: np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=dtype)
+                for name, dtype in wanted}
+
+    @staticmethod
+    def decode_rows(ticks):
+        """Convert read_range output into JSON-friendly columns"""
+        inputs = ticks['inputs']
+        outputs = ticks['outputs']
+        return {
+            'timestamp': [datetime.fromtimestamp(t).isoformat() for t in ticks['timestamp'].tolist()],
+            'inputs': inputs.tolist(),
+            'outputs': outputs.tolist(),
+            'mode': [MODE_NAMES.get(code, 'UNKNOWN') for code in ticks['mode'].tolist()],
+            'well_pump': ((outputs & OUTPUT_WELL_PUMP) != 0).tolist(),
+            'dist_pump': ((outputs & OUTPUT_DIST_PUMP) != 0).tolist()
+        }
@@ -1,136 +1,255 @@
 import os
 import json
+import time
+import threading
+from contextlib import contextmanager
 from ..models.user import User, UserRole
 
+# Seconds between checks of users.json for changes made by other processes
+RELOAD_CHECK_INTERVAL = 1.0
+
+
 class UserManager:
+    # Users are indexed by id and by username. Readers (every authenticated
+    # request) look up the current dicts without locking; a reload swaps in
+    # new dicts, and changes made here update both under _lock. users.json
+    # is shared with the other web workers, so it is re-read when its mtime
+    # changes, at most every RELOAD_CHECK_INTERVAL seconds.
+    _lock = threading.RLock()
     _users = {}
+    _users_by_name = {}
     _users_file = os.path.join(os.path.expanduser('~'), '.pump_control', 'users.json')
+    _file_mtime = None
+    _next_check = 0.0
+    _batch_depth = 0
+    _dirty = False
 
     @classmethod
-    def save_users(cls):
-        """Save users to file"""
+    def _set_users(cls, users):
+        cls._users_by_name = {user.username: user for user in users.values()}
+        cls._users = users
+
+    @classmethod
+    def _get_file_mtime(cls):
+        # Saves replace the file, so the inode changes even when the
+        # filesystem's mtime resolution is too coarse to tell writes apart
         try:
-            # Convert users to serializable format
-            users_data = {
-                str(user_id): {
-                    'id': user.id,
-                    'username': user.username,
-                    'role': user.role.value,
-                    'password_hash': user.password_hash
+            stat = os.stat(cls._users_file)
+            return stat.st_ino, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def _reload_if_changed(cls, force=False):
+        """Reload users.json if another process changed it
+
+        Args:
+            force: Check the file now instead of waiting for the interval
+        """
+        now = time.monotonic()
+        if not force and now < cls._next_check:
+            return
+        cls._next_check = now + RELOAD_CHECK_INTERVAL
+        if cls._get_file_mtime() != cls._file_mtime:
+            with cls._lock:
+                # Unsaved changes in a batch win over the file
+                if not cls._dirty and cls._get_file_mtime() != cls._file_mtime:
+                    cls.load_users()
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """Group several changes into a single write of users.json
+
+        Usage:
+            with UserManager.batch():
+                UserManager.create_user('a', 'secret', UserRole.VIEWER)
+                UserManager.create_user('b', 'secret', UserRole.VIEWER)
+        """
+        with cls._lock:
+            cls._batch_depth += 1
+            try:
+                yield
+            finally:
+                cls._batch_depth -= 1
+                if cls._batch_depth == 0 and cls._dirty:
+                    cls._save_or_revert()
+
+    @classmethod
+    def _changed(cls):
+        """Save the users unless batching. Must be called with the lock held."""
+        cls._dirty = True
+        if cls._batch_depth == 0:
+            cls._save_or_revert()
+
+    @classmethod
+    def _save_or_revert(cls):
+        """Save pending changes, or drop them if users.json can't be written
+
+        Keeping changes that only this worker knows about would leave it
+        disagreeing with the others, and would stop it picking up their
+        changes. Must be called with the lock held.
+
+        Raises:
+            OSError: If users.json could not be written
+        """
+        try:
+            cls.save_users()
+        except Exception:
+            cls._dirty = False
+            cls.load_users()
+            raise
+
+    @classmethod
+    def save_users(cls):
+        """Save users to file
+
+        Raises:
+            OSError: If users.json could not be written
+        """
+        with cls._lock:
+            try:
+                # Convert users to serializable format
+                users_data = {
+                    str(user_id): {
+                        'id': user.id,
+                        'username': user.username,
+                        'role': user.role.value,
+                        'password_hash': user.password_hash
+                    }
+                    for user_id, user in cls._users.items()
                 }
-                for user_id, user in cls._users.items()
-            }
 
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(cls._users_file), exist_ok=True)
+                # Create directory if it doesn't exist
+                os.makedirs(os.path.dirname(cls._users_file), exist_ok=True)
 
-            # Save to file
-            with open(cls._users_file, 'w') as f:
-                json.dump(users_data, f, indent=4)
-            print("Users saved successfully")
-        except Exception as e:
-            print(f"Error saving users: {str(e)}")
+                # Write a temporary file and rename it over users.json, so
+                # other workers never read a partially written file
+                tmp_path = cls._users_file + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(users_data, f, indent=4)
+                os.replace(tmp_path, cls._users_file)
+                cls._file_mtime = cls._get_file_mtime()
+                cls._dirty = False
+            except Exception as e:
+                print(f"Error saving users: {str(e)}")
+                raise
 
     @classmethod
     def load_users(cls):
         """Load users from file"""
-        try:
-            if os.path.exists(cls._users_file):
-                with open(cls._users_file, 'r') as f:
-                    users_data = json.load(f)
-                
-                cls._users = {
-                    int(user_id): User(
-                        id=data['id'],
-                        username=data['username'],
-                        role=UserRole(data['role']),
-                        password_hash=data['password_hash']
-                    )
-                    for user_id, data in users_data.items()
-                }
-                print("Users loaded successfully")
-            else:
-                print("No users file found, will create with defaults")
-                cls._users = {}
-        except Exception as e:
-            print(f"Error loading users: {str(e)}")
-            cls._users = {}
+        with cls._lock:
+            try:
+                cls._file_mtime = cls._get_file_mtime()
+                if cls._file_mtime is not None:
+                    with open(cls._users_file, 'r') as f:
+                        users_data = json.load(f)
+
+                    cls._set_users({
+                        int(user_id): User(
+                            id=data['id'],
+                            username=data['username'],
+                            role=UserRole(data['role']),
+                            password_hash=data['password_hash']
+                        )
+                        for user_id, data in users_data.items()
+                    })
+                    print("Users loaded successfully")
+                else:
+                    print("No users file found, will create with defaults")
+                    cls._set_users({})
+            except Exception as e:
+                print(f"Error loading users: {str(e)}")
+                cls._set_users({})
 
     @classmethod
     def init_default_users(cls):
         """Initialize default users if none exist"""
         cls.load_users()  # First load any existing users
-        
+
         if not cls._users:
             print("Creating default users")
-            # Create default admin user
-            cls.create_user("admin", "admin", UserRole.ADMINISTRATOR)
-            # Create default operator user
-            cls.create_user("operator", "operator", UserRole.OPERATOR)
-            # Create default viewer user
-            cls.create_user("viewer", "viewer", UserRole.VIEWER)
-            
-            # Save the default users
-            cls.save_users()
+            try:
+                with cls.batch():
+                    # Create default admin user
+                    cls.create_user("admin", "admin", UserRole.ADMINISTRATOR)
+                    # Create default operator user
+                    cls.create_user("operator", "operator", UserRole.OPERATOR)
+                    # Create default viewer user
+                    cls.create_user("viewer", "viewer", UserRole.VIEWER)
+            except OSError as e:
+                print(f"Error creating default users: {str(e)}")
 
     @classmethod
     def create_user(cls, username, password, role):
         """Create a new user and save to file"""
-        if cls.get_user_by_username(username):
-            raise ValueError("Username already exists")
+        password_hash = User.set_password(password)
+        with cls._lock:
+            cls._reload_if_changed(force=True)
+            if username in cls._users_by_name:
+                raise ValueError("Username already exists")
 
-        user_id = max(cls._users.keys()) + 1 if cls._users else 1
-        user = User(
-            id=user_id,
-            username=username,
-            role=role,
-            password_hash=User.set_password(password)
-        )
-        cls._users[user_id] = user
-        cls.save_users()  # Save after creating new user
-        return user
+            user_id = max(cls._users.keys()) + 1 if cls._users else 1
+            user = User(
+                id=user_id,
+                username=username,
+                role=role,
+                password_hash=password_hash
+            )
+            cls._users[user_id] = user
+            cls._users_by_name[username] = user
+            cls._changed()
+            return user
 
     @classmethod
     def get_user_by_id(cls, user_id):
+        cls._reload_if_changed()
         return cls._users.get(user_id)
 
     @classmethod
     def get_user_by_username(cls, username):
-        for user in cls._users.values():
-            if user.username == username:
-                return user
-        return None
+        cls._reload_if_changed()
+        return cls._users_by_name.get(username)
 
     @classmethod
     def delete_user(cls, user_id):
         """Delete a user and save changes"""
-        if user_id in cls._users:
-            del cls._users[user_id]
-            cls.save_users()
+        with cls._lock:
+            cls._reload_if_changed(force=True)
+            user = cls._users.pop(user_id, None)
+            if user is None:
+                return False
+            cls._users_by_name.pop(user.username, None)
+            cls._changed()
+            return True
+
+    @classmethod
+    def reset_password(cls, user_id, new_password):
+        """Reset a user's password"""
+        password_hash = User.set_password(new_password)
+        with cls._lock:
+            cls._reload_if_changed(force=True)
+            user = cls._users.get(user_id)
+            if user is None:
+                return False
+            user.password_hash = password_hash
+            cls._changed()
+            return True
+
+    @classmethod
+    def get_all_users(cls):
+        """Get all users"""
+        cls._reload_if_changed()
+        return list(cls._users.values())
+
+    @classmethod
+    def update_user_role(cls, user_id, new_role):
+        """Update a user's role"""
+        with cls._lock:
+            cls._reload_if_changed(force=True)
+            user = cls._users.get(user_id)
+            if user is None:
+                return False
+            user.role = new_role
+            cls._changed()
             return True
-        return False
-
-@classmethod
-def reset_password(cls, user_id, new_password):
-    """Reset a user's password"""
-    if user_id in cls._users:
-        user = cls._users[user_id]
-        user.password_hash = User.set_password(new_password)
-        cls.save_users()
-        return True
-    return False
-
-@classmethod
-def get_all_users(cls):
-    """Get all users"""
-    return list(cls._users.values())
-
-@classmethod
-def update_user_role(cls, user_id, new_role):
-    """Update a user's role"""
-    if user_id in cls._users:
-        user = cls._users[user_id]
-        user.role = new_role
-        cls.save_users()
-        return True
-    return False
\ No newline at end of file
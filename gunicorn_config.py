@@ -8,9 +8,17 @@ from jinja2.lexer import TOKEN_DOT
 bind = "127.0.0.1:8000"
 backlog = 2048
 
+# The control loop runs in its own process (run_controller.py). Workers
+# read its published state and send it commands, so they can scale freely.
+raw_env = ['PUMP_CONTROL_REMOTE=1']
+
 # Worker settings
-workers = 1
-worker_class = 'sync'
+workers = 2
+# Threaded worker so long-lived /api/stream connections and slow requests
+# don't block the dashboard. Relies on the controllers and managers being
+# thread-safe (see the threading rules in PumpController and StatsManager).
+worker_class = 'gthread'
+threads = 16
 worker_connections = 1000
 timeout = 120  # Increased timeout
 keepalive = 2
@@ -45,30 +53,3 @@ def on_starting(server):
 def on_exit(server):
     """Run when the master process is stopped."""
     print("Shutting down Gunicorn server...")
-
-def post_fork(server, worker):
-    """Run after a worker has been forked."""
-    try:
-        from app.controllers.pump_controller import PumpController
-        
-        # Initialize the pump controller in the worker
-        controller = PumpController()
-        if not controller.is_running:
-            controller.start()
-        
-        print(f"Worker initialized. Current mode: {controller.current_mode}")
-    except Exception as e:
-        print(f"Error initializing worker: {e}")
-        
-def worker_exit(server, worker):
-    """Run when a worker exits."""
-    try:
-        from app.controllers.pump_controller import PumpController
-        
-        # Clean up the pump controller
-        controller = PumpController()
-        if controller.is_running:
-            controller.stop()
-        print("Worker shutting down, pump controller stopped.")
-    except Exception as e:
-        print(f"Error during worker cleanup: {e}")
\ No newline at end of file
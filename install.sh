@@ -126,6 +126,11 @@ else
   fi
 fi
 
+# Build fingerprinted, precompressed static bundles
+section "Building static assets"
+$VENV_DIR/bin/pip install brotli || echo "brotli not available, serving gzip only"
+$VENV_DIR/bin/python "$INSTALL_DIR/tools/build_assets.py"
+
 # Configure GPIO access if we're on a Raspberry Pi
 if [ -e "/dev/gpiomem" ]; then
   echo "GPIO device found, setting permissions..."
@@ -209,6 +214,18 @@ server {
         proxy_set_header Connection "upgrade";
     }
 
+    # Fingerprinted bundles from tools/build_assets.py never change in place
+    location /static/dist/ {
+        root ${INSTALL_DIR}/app/;
+        gzip_static on;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        add_header Vary Accept-Encoding;
+    }
+
+    location = /static/dist/manifest.json {
+        return 404;
+    }
+
     location /static/ {
         root ${INSTALL_DIR}/app/;
         add_header Cache-Control "public, no-transform";
@@ -222,12 +239,40 @@ if [ -f /etc/nginx/sites-enabled/default ]; then
   rm /etc/nginx/sites-enabled/default
 fi
 
-# Configure systemd service
-section "Configuring systemd service"
+# Configure systemd services
+section "Configuring systemd services"
+
+# The controller owns GPIO and runs the control loop; the web service talks to it
+cat > /etc/systemd/system/pump-control-controller.service << EOF
+[Unit]
+Description=Pump Control Controller
+After=network.target
+
+[Service]
+Type=simple
+User=${SERVICE_USER}
+Group=${SERVICE_USER}
+WorkingDirectory=${INSTALL_DIR}
+Environment="PATH=${VENV_DIR}/bin:/usr/local/bin:/usr/bin:/bin"
+Environment="PYTHONPATH=${INSTALL_DIR}"
+# Pre-execution steps to ensure proper permissions
+ExecStartPre=/bin/bash -c 'for i in /dev/gpiomem /dev/mem /dev/i2c-*; do [ -e \$i ] && chmod 660 \$i && chgrp gpio \$i || true; done'
+# Main executable
+ExecStart=${VENV_DIR}/bin/python ${INSTALL_DIR}/run_controller.py
+Restart=always
+RestartSec=5
+StandardOutput=append:${LOG_DIR}/controller.log
+StandardError=append:${LOG_DIR}/controller.err
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 cat > /etc/systemd/system/pump-control.service << EOF
 [Unit]
 Description=Pump Control System
-After=network.target
+After=network.target pump-control-controller.service
+Wants=pump-control-controller.service
 
 [Service]
 Type=simple
@@ -238,8 +283,6 @@ Environment="PATH=${VENV_DIR}/bin:/usr/local/bin:/usr/bin:/bin"
 Environment="PYTHONPATH=${INSTALL_DIR}"
 Environment="FLASK_APP=app"
 Environment="FLASK_ENV=production"
-# Pre-execution steps to ensure proper permissions
-ExecStartPre=/bin/bash -c 'for i in /dev/gpiomem /dev/mem /dev/i2c-*; do [ -e \$i ] && chmod 660 \$i && chgrp gpio \$i || true; done'
 # Main executable
 ExecStart=${VENV_DIR}/bin/gunicorn --config ${INSTALL_DIR}/gunicorn_config.py 'app:create_app()'
 Restart=always
@@ -257,6 +300,8 @@ touch "$LOG_DIR/nginx-access.log"
 touch "$LOG_DIR/nginx-error.log"
 touch "$LOG_DIR/gunicorn.log"
 touch "$LOG_DIR/gunicorn.err"
+touch "$LOG_DIR/controller.log"
+touch "$LOG_DIR/controller.err"
 touch "$LOG_DIR/error.log"
 
 # Create helper scripts
@@ -279,9 +324,9 @@ chmod +x "$INSTALL_DIR/fix-permissions.sh"
 cat > "$INSTALL_DIR/restart.sh" << EOF
 #!/bin/bash
 echo "Restarting services..."
-sudo systemctl restart nginx pump-control
+sudo systemctl restart nginx pump-control-controller pump-control
 echo "Service status:"
-sudo systemctl status pump-control --no-pager
+sudo systemctl status pump-control-controller pump-control --no-pager
 EOF
 chmod +x "$INSTALL_DIR/restart.sh"
 
@@ -301,8 +346,11 @@ sudo -u ${SERVICE_USER} git pull
 echo "Updating dependencies..."
 ${VENV_DIR}/bin/pip install --upgrade -r requirements.txt
 
-echo "Restarting service..."
-sudo systemctl restart pump-control
+echo "Building static assets..."
+sudo -u ${SERVICE_USER} ${VENV_DIR}/bin/python ${INSTALL_DIR}/tools/build_assets.py
+
+echo "Restarting services..."
+sudo systemctl restart pump-control-controller pump-control
 echo "Update complete!"
 EOF
 chmod +x "$INSTALL_DIR/update.sh"
@@ -406,8 +454,9 @@ chmod 755 "$VENV_DIR/bin/pip"
 # Enable and start services
 section "Starting services"
 systemctl daemon-reload
-systemctl enable pump-control
+systemctl enable pump-control-controller pump-control
 systemctl restart nginx
+systemctl restart pump-control-controller || echo "Warning: pump-control-controller service failed to start. Check the logs for details."
 systemctl restart pump-control || echo "Warning: pump-control service failed to start. Check the logs for details."
 
 # Display summary
@@ -424,13 +473,13 @@ echo "- Update application: $INSTALL_DIR/update.sh"
 echo "- Test GPIO: $INSTALL_DIR/test-gpio.py"
 echo
 echo "To check service status:"
-echo "  sudo systemctl status pump-control"
+echo "  sudo systemctl status pump-control-controller pump-control"
 echo
 echo "To view logs:"
-echo "  sudo journalctl -u pump-control -f"
+echo "  sudo journalctl -u pump-control-controller -u pump-control -f"
 echo
 echo "==================================================="
 
 # Final service status check
 echo "Current service status:"
-systemctl status pump-control --no-pager || true
\ No newline at end of file
+systemctl status pump-control-controller pump-control --no-pager || true
\ No newline at end of file
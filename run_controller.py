@@ -0,0 +1,51 @@
+"""Run the pump controller in its own process
+
+The controller owns GPIO, stats and notifications. It publishes state to a
+shared memory segment and accepts commands on a Unix socket; web workers
+started with PUMP_CONTROL_REMOTE=1 connect to it instead of driving the
+hardware themselves.
+"""
+import os
+import signal
+import threading
+
+# This process is the controller, never a client of another one
+os.environ.pop('PUMP_CONTROL_REMOTE', None)
+
+from app.controllers import pump_controller, mode_controller
+from app.services.control_service import ControlServer
+from app.services.notification_service import NotificationService
+from app.utils.gpio_utils import GPIOManager
+from app.utils.stats_manager import StatsManager
+
+
+def main():
+    server = ControlServer({
+        'pump': pump_controller,
+        'mode': mode_controller,
+        'gpio': GPIOManager,
+        'stats': StatsManager,
+        'notifications': NotificationService()
+    })
+
+    def handle_signal(signum, frame):
+        print(f"Received signal {signum}, shutting down controller")
+        # shutdown() blocks until serve_forever returns, so not from this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    server.start()
+    pump_controller.start()
+    try:
+        server.serve_forever()
+    finally:
+        pump_controller.stop()
+        NotificationService().shutdown()
+        GPIOManager.cleanup()
+        print("Controller stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Exercise the MQTT and webhook alert channels against local stand-ins
+
+Starts a stand-in MQTT broker and a webhook collector on localhost.
+
+The MQTT part publishes batches of alerts at QoS 1 through MqttClient.
+The broker hangs up partway through one batch, so the client reconnects
+and resends that batch with the DUP flag set; the broker's log shows the
+connections, the DUP count and the resulting duplicates.
+
+The webhook part queues a burst of alerts on a NotificationDispatcher
+delivering through WebhookChannel, and reports how many POSTs the burst
+took and how many events each one carried.
+
+Usage:
+    python tools/bench_alert_sinks.py --alerts 50 --batch-size 20
+"""
+import argparse
+import http.server
+import json
+import os
+import socketserver
+import struct
+import sys
+import threading
+import time
+import types
+
+SERVICES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'services')
+
+
+def load_services():
+    """Import app/services as a package of its own
+
+    Importing it through app would run app/__init__.py, which sets up
+    GPIO and the controllers.
+    """
+    package = types.ModuleType('services')
+    package.__path__ = [SERVICES_DIR]
+    sys.modules['services'] = package
+
+
+class StandInBroker(socketserver.ThreadingTCPServer):
+    """Just enough of an MQTT 3.1.1 broker to accept publishes: CONNECT, PUBLISH, PINGREQ and DISCONNECT"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_at=0):
+        super().__init__(('127.0.0.1', 0), BrokerHandler)
+        self.drop_at = drop_at  # Hang up on receiving this publish (0 never)
+        self.connections = 0
+        self.publishes = 0
+        self.duplicates = 0
+        self.received = []
+
+
+class BrokerHandler(socketserver.BaseRequestHandler):
+    def read(self, count):
+        data = b''
+        while len(data) < count:
+            chunk = self.request.recv(count - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def handle(self):
+        broker = self.server
+        broker.connections += 1
+        try:
+            while True:
+                header = self.read(1)[0]
+                length, shift = 0, 0
+                while True:
+                    byte = self.read(1)[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = self.read(length)
+                packet_type = header & 0xF0
+                if packet_type == 0x10:
+                    self.request.sendall(b'\x20\x02\x00\x00')  # CONNACK, accepted
+                elif packet_type == 0x30:
+                    broker.publishes += 1
+                    if broker.publishes == broker.drop_at:
+                        return  # Drop the connection before acking
+                    if header & 0x08:
+                        broker.duplicates += 1
+                    qos = (header >> 1) & 0x03
+                    topic_length = struct.unpack('!H', body[:2])[0]
+                    payload = body[2 + topic_length:]
+                    if qos:
+                        self.request.sendall(b'\x40\x02' + payload[:2])  # PUBACK
+                        payload = payload[2:]
+                    broker.received.append(json.loads(payload)['id'])
+                elif packet_type == 0xC0:
+                    self.request.sendall(b'\xd0\x00')  # PINGRESP
+                elif packet_type == 0xE0:
+                    return
+        except (EOFError, OSError):
+            pass
+
+
+class Collector(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), CollectorHandler)
+        self.batches = []
+
+
+class CollectorHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.batches.append(len(body['events']))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_mqtt(alerts, batch_size):
+    from services.mqtt_client import MqttClient
+
+    # Hang up partway through the second batch, or the only one
+    broker = StandInBroker(drop_at=min(alerts, batch_size + batch_size // 2 + 1))
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    client = MqttClient('127.0.0.1', port=broker.server_address[1], client_id=f'bench-{os.getpid()}')
+
+    start = time.perf_counter()
+    for first in range(0, alerts, batch_size):
+        payloads = [json.dumps({'id': i, 'type': 'BENCH', 'message': f'Alert {i}'}).encode()
+                    for i in range(first, min(alerts, first + batch_size))]
+        client.publish_many('pump_control/alerts', payloads, qos=1)
+    elapsed = time.perf_counter() - start
+    client.close()
+    broker.shutdown()
+
+    print("MQTT client:", json.dumps(client.get_stats()))
+    print(f"MQTT broker: {broker.connections} connections, {broker.publishes} publishes "
+          f"({broker.duplicates} with DUP), {len(set(broker.received))} of {alerts} alerts received, "
+          f"{len(broker.received) - len(set(broker.received))} duplicates, {elapsed:.3f}s")
+
+
+def run_webhook(alerts, batch_size, batch_delay):
+    from services.notification_channels import WebhookChannel
+    from services.notification_dispatcher import NotificationDispatcher
+
+    collector = Collector()
+    threading.Thread(target=collector.serve_forever, daemon=True).start()
+    config = {'webhook_url': f'http://127.0.0.1:{collector.server_address[1]}/alerts',
+              'batch_size': batch_size, 'batch_delay': batch_delay}
+    channel = WebhookChannel()
+
+    def deliver_batch(channel_name, entries):
+        channel.send_batch([{'id': entry['id'], 'created': entry['created'], 'type': entry['args'][0],
+                             'message': entry['args'][1]} for entry in entries], config)
+
+    dispatcher = NotificationDispatcher(deliver_batch=deliver_batch,
+                                        batch_policy=lambda channel_name: channel.get_batch_policy(config))
+    start = time.perf_counter()
+    for i in range(alerts):
+        dispatcher.submit('webhook', 'BENCH', f'Alert {i}')
+    while dispatcher.get_metrics()['webhook']['delivered'] < alerts and time.perf_counter() - start < 30:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    dispatcher.shutdown()
+    channel.close()
+    collector.shutdown()
+
+    print(f"Webhook: {alerts} alerts in {len(collector.batches)} POSTs, events per POST "
+          f"{collector.batches}, {elapsed:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=50, help='Alerts per channel')
+    parser.add_argument('--batch-size', type=int, default=20, help='Alerts per MQTT batch and webhook POST')
+    parser.add_argument('--batch-delay', type=float, default=0.2,
+                        help='Seconds the first webhook alert waits for others to join it')
+    args = parser.parse_args()
+
+    load_services()
+    run_mqtt(args.alerts, args.batch_size)
+    run_webhook(args.alerts, args.batch_size, args.batch_delay)
+
+
+if __name__ == '__main__':
+    main()
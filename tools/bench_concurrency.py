@@ -0,0 +1,126 @@
+"""Measure dashboard request latency as the number of concurrent clients grows
+
+Logs in once, then for each concurrency level runs that many client threads
+against the given paths for a fixed time and reports throughput and latency
+percentiles. Whether p99 stays flat as clients are added only shows on a
+host with a core to spare for each process; on a single CPU every
+percentile grows with the queue.
+
+Usage:
+    python tools/bench_concurrency.py --url http://127.0.0.1:8000 \\
+        --username admin --password admin --clients 1,4,16,32 --duration 10
+
+Pass --slow-path to keep one extra client busy with a slow request (for
+example /alerts/test) and check that it does not hold up the others.
+"""
+import argparse
+import http.cookiejar
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+DEFAULT_PATHS = ['/api/state', '/api/dashboard', '/api/gpio_states', '/stats/api/pump_stats']
+
+
+def login(base_url, username, password):
+    """Log in and return the session cookie header"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    data = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    opener.open(base_url + '/auth/login', data=data, timeout=10).read()
+    cookie = '; '.join(f'{c.name}={c.value}' for c in jar)
+    if not cookie:
+        raise RuntimeError('Login failed: no session cookie returned')
+    return cookie
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_client(base_url, paths, cookie, deadline, latencies, errors, method='GET'):
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        req = urllib.request.Request(base_url + path, method=method, headers={'Cookie': cookie})
+        if method == 'POST':
+            req.data = b'{}'
+            req.add_header('Content-Type', 'application/json')
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, OSError):
+            errors.append(path)
+
+
+def run_level(base_url, paths, cookie, clients, duration, slow_path=None):
+    """Run one concurrency level
+
+    Returns:
+        Dict with request count, errors, throughput and latency percentiles
+    """
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=run_client,
+                                args=(base_url, paths, cookie, deadline, latencies, errors))
+               for _ in range(clients)]
+    if slow_path:
+        threads.append(threading.Thread(target=run_client,
+                                        args=(base_url, [slow_path], cookie, deadline, [], []),
+                                        kwargs={'method': 'POST'}))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / duration,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'max': (latencies[-1] if latencies else 0) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--clients', default='1,2,4,8,16,32',
+                        help='Comma separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds per concurrency level')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='Path to request (repeatable)')
+    parser.add_argument('--slow-path', help='Path POSTed by one extra background client')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    paths = args.paths or DEFAULT_PATHS
+    cookie = login(base_url, args.username, args.password)
+
+    print(f"{'clients':>7} {'requests':>9} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for clients in [int(c) for c in args.clients.split(',') if c.strip()]:
+        result = run_level(base_url, paths, cookie, clients, args.duration, args.slow_path)
+        print(f"{result['clients']:>7} {result['requests']:>9} {result['errors']:>6} "
+              f"{result['rps']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+              f"{result['p99']:>8.1f} {result['max']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Measure email alert throughput with a persistent SMTP connection
+
+Starts a stand-in SMTP server on localhost, sends a burst of alerts
+through SmtpClient and prints its get_stats(), then sends the same burst
+with a new connection per message (how alerts were sent before the
+client kept its session) for comparison. --latency adds a delay to every
+server reply, to stand in for a mail server across the internet, and
+--drop-after makes the server close the connection after that many
+messages to show the client reconnecting mid-burst.
+
+Usage:
+    python tools/bench_smtp.py --messages 50 --latency 0.02
+"""
+import argparse
+import json
+import os
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+import types
+from email.mime.text import MIMEText
+
+SERVICES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'services')
+
+
+def load_services():
+    """Import app/services as a package of its own
+
+    Importing it through app would run app/__init__.py, which sets up
+    GPIO and the controllers.
+    """
+    package = types.ModuleType('services')
+    package.__path__ = [SERVICES_DIR]
+    sys.modules['services'] = package
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    """Just enough SMTP to accept mail: EHLO, AUTH, MAIL, RCPT, DATA, NOOP and QUIT"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0, drop_after=0):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.drop_after = drop_after
+        self.connections = 0
+        self.messages = 0
+
+
+class StandInHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 stand-in ESMTP')
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            if in_data:
+                if line == '.':
+                    in_data = False
+                    server.messages += 1
+                    self.reply('250 queued')
+                    if server.drop_after and server.messages % server.drop_after == 0:
+                        return  # Hang up without QUIT, like a server timing us out
+                continue
+            command = line.split(' ', 1)[0].upper()
+            if command == 'EHLO':
+                self.wfile.write(b'250-stand-in\r\n')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif command == 'AUTH':
+                self.reply('235 authenticated')
+            elif command == 'DATA':
+                in_data = True
+                self.reply('354 end with .')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+def build_message(i):
+    msg = MIMEText(f"Benchmark alert {i}")
+    msg['Subject'] = f"Water System Alert: BENCH {i}"
+    msg['From'] = 'pump@example.com'
+    msg['To'] = 'operator@example.com'
+    return msg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=50, help='Alerts in the burst')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Seconds the stand-in server waits before each reply')
+    parser.add_argument('--drop-after', type=int, default=0,
+                        help='Messages after which the server hangs up (0 never)')
+    args = parser.parse_args()
+
+    load_services()
+    from services.smtp_client import SmtpClient
+
+    server = StandInServer(args.latency, args.drop_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    config = {'smtp_server': host, 'smtp_port': port, 'security': 'none',
+              'username': 'pump', 'password': 'secret'}
+
+    client = SmtpClient(config)
+    start = time.perf_counter()
+    for i in range(args.messages):
+        # One call per alert, as the email channel sends them
+        client.send_messages([build_message(i)])
+    reused = time.perf_counter() - start
+    stats = client.get_stats()
+    client.close()
+    reused_connections = server.connections
+
+    start = time.perf_counter()
+    for i in range(args.messages):
+        with smtplib.SMTP(host, port, timeout=10) as smtp:
+            smtp.login(config['username'], config['password'])
+            smtp.send_message(build_message(i))
+    fresh = time.perf_counter() - start
+    fresh_connections = server.connections - reused_connections
+    server.shutdown()
+
+    print(json.dumps(stats, indent=2))
+    print()
+    print(f"{'mode':<22} {'messages':>8} {'connects':>8} {'seconds':>8} {'msg/s':>8}")
+    print(f"{'persistent':<22} {args.messages:>8} {reused_connections:>8} {reused:>8.2f} "
+          f"{args.messages / reused:>8.1f}")
+    print(f"{'connect per message':<22} {args.messages:>8} {fresh_connections:>8} {fresh:>8.2f} "
+          f"{args.messages / fresh:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
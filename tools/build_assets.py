@@ -0,0 +1,359 @@
+"""Build fingerprinted, precompressed static asset bundles
+
+Reads the bundle definitions in app/static/bundles.json and, for each one,
+writes a minified bundle named after its content hash to app/static/dist,
+with .gz (and .br, when the brotli module is installed) siblings. A
+manifest maps each bundle name to its hashed file for the asset_urls()
+template helper.
+
+JavaScript bundles name a single entry file. Entries that use ES module
+imports are bundled with their dependencies, each module in its own
+function scope. Entries without imports are only minified, so classic
+scripts keep their globals. CSS bundles list files that are concatenated
+in order.
+
+Usage:
+    python tools/build_assets.py
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT_DIR, 'app', 'static')
+BUNDLES_FILE = os.path.join(STATIC_DIR, 'bundles.json')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+
+HASH_LENGTH = 10
+
+IMPORT_RE = re.compile(r'^[ \t]*import\s*\{([^}]*)\}\s*from\s*[\'"]([^\'"]+)[\'"][ \t]*;?[ \t]*$', re.M)
+BARE_IMPORT_RE = re.compile(r'^\s*import\b', re.M)
+EXPORT_RE = re.compile(r'^export\s+(?:async\s+)?(function\*?|const|let|var|class)\s+([A-Za-z_$][\w$]*)', re.M)
+OTHER_EXPORT_RE = re.compile(r'^\s*export\b', re.M)
+
+# Characters after which a '/' starts a regular expression rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORD_RE = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|new|delete|void|throw)$')
+
+
+class BuildError(Exception):
+    """Raised when a bundle cannot be built"""
+    pass
+
+
+def minify_js(source):
+    """Strip comments, indentation and blank lines from JavaScript
+
+    Line breaks are kept so automatic semicolon insertion behaves exactly
+    as in the source, and template literals are copied verbatim.
+    """
+    out = []
+    i = 0
+    n = len(source)
+    # Stack of open template literals; each entry counts the braces of the
+    # ${...} expression currently being scanned inside it
+    template_braces = []
+
+    def last_significant():
+        return ''.join(out[-16:]).rstrip()
+
+    def emit_space():
+        if out and out[-1] not in (' ', '\n'):
+            out.append(' ')
+
+    def emit_newline():
+        while out and out[-1] == ' ':
+            out.pop()
+        if out and out[-1] != '\n':
+            out.append('\n')
+
+    while i < n:
+        c = source[i]
+        nxt = source[i + 1] if i + 1 < n else ''
+
+        if c == '`' or (c == '}' and template_braces and template_braces[-1] == 0):
+            # Copy template literal text verbatim up to its end or next ${
+            if c == '`':
+                template_braces.append(0)
+            start = i
+            i += 1
+            while i < n:
+                if source[i] == '\\':
+                    i += 2
+                    continue
+                if source[i] == '`':
+                    template_braces.pop()
+                    i += 1
+                    break
+                if source[i] == '$' and i + 1 < n and source[i + 1] == '{':
+                    i += 2
+                    break
+                i += 1
+            out.append(source[start:i])
+            continue
+
+        if c in '{}' and template_braces:
+            template_braces[-1] += 1 if c == '{' else -1
+
+        if c in '\'"':
+            start = i
+            i += 1
+            while i < n and source[i] != c:
+                if source[i] == '\\':
+                    i += 1
+                elif source[i] == '\n':
+                    raise BuildError('Unterminated string literal')
+                i += 1
+            i += 1
+            out.append(source[start:i])
+            continue
+
+        if c == '/' and nxt == '/':
+            while i < n and source[i] != '\n':
+                i += 1
+            continue
+
+        if c == '/' and nxt == '*':
+            end = source.find('*/', i + 2)
+            if end == -1:
+                raise BuildError('Unterminated block comment')
+            newline = '\n' in source[i:end]
+            i = end + 2
+            emit_newline() if newline else emit_space()
+            continue
+
+        if c == '/':
+            previous = last_significant()
+            if not previous or previous[-1] in REGEX_PRECEDERS or REGEX_KEYWORD_RE.search(previous):
+                # Regular expression literal, including any character classes
+                start = i
+                i += 1
+                in_class = False
+                while i < n:
+                    ch = source[i]
+                    if ch == '\\':
+                        i += 2
+                        continue
+                    if ch == '\n':
+                        raise BuildError('Unterminated regular expression literal')
+                    if ch == '[':
+                        in_class = True
+                    elif ch == ']':
+                        in_class = False
+                    elif ch == '/' and not in_class:
+                        i += 1
+                        break
+                    i += 1
+                while i < n and (source[i].isalnum() or source[i] == '_'):
+                    i += 1
+                out.append(source[start:i])
+                continue
+
+        if c == '\n':
+            emit_newline()
+            i += 1
+            continue
+
+        if c in ' \t\r':
+            if out and out[-1] != '\n':
+                emit_space()
+            i += 1
+            continue
+
+        out.append(c)
+        i += 1
+
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from CSS"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = source.replace(';}', '}')
+    return source.strip() + '\n'
+
+
+def _module_var(path):
+    relative = os.path.relpath(path, STATIC_DIR)
+    return '__module_' + re.sub(r'\W', '_', os.path.splitext(relative)[0])
+
+
+def bundle_js_modules(entry_path):
+    """Bundle an ES module and its static imports into one script
+
+    Each module runs in its own function scope, in dependency order, and
+    hands its exports to the modules importing it.
+    """
+    order = []
+    visiting = set()
+    modules = {}
+
+    def visit(path):
+        if path in modules:
+            return
+        if path in visiting:
+            raise BuildError(f'Circular import involving {os.path.relpath(path, STATIC_DIR)}')
+        visiting.add(path)
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+
+        imports = []
+
+        def replace_import(match):
+            names = [name.strip() for name in match.group(1).split(',') if name.strip()]
+            dependency = os.path.normpath(os.path.join(os.path.dirname(path), match.group(2)))
+            imports.append(dependency)
+            bindings = ', '.join(name.replace(' as ', ': ') for name in names)
+            return f'const {{ {bindings} }} = {_module_var(dependency)};'
+
+        body = IMPORT_RE.sub(replace_import, source)
+        if BARE_IMPORT_RE.search(body):
+            raise BuildError(f'Unsupported import form in {os.path.relpath(path, STATIC_DIR)}')
+
+        exports = [name for _, name in EXPORT_RE.findall(body)]
+        body = EXPORT_RE.sub(lambda m: m.group(0)[len('export '):], body)
+        if OTHER_EXPORT_RE.search(body):
+            raise BuildError(f'Unsupported export form in {os.path.relpath(path, STATIC_DIR)}')
+
+        for dependency in imports:
+            visit(dependency)
+        visiting.discard(path)
+        modules[path] = (body, exports)
+        order.append(path)
+
+    visit(entry_path)
+
+    parts = []
+    for path in order:
+        body, exports = modules[path]
+        parts.append(f'const {_module_var(path)} = (() => {{\n{body}\n'
+                     f'return {{ {", ".join(exports)} }};\n}})();\n')
+    return ''.join(parts)
+
+
+def build_bundle(name, sources):
+    """Build the minified content of one bundle
+
+    Returns:
+        Bundle content as bytes
+    """
+    paths = [os.path.join(STATIC_DIR, source) for source in sources]
+    for path in paths:
+        if not os.path.isfile(path):
+            raise BuildError(f'{name}: source {os.path.relpath(path, STATIC_DIR)} not found')
+
+    if name.endswith('.js'):
+        if len(paths) != 1:
+            raise BuildError(f'{name}: JavaScript bundles take a single entry file')
+        with open(paths[0], encoding='utf-8') as f:
+            source = f.read()
+        if BARE_IMPORT_RE.search(source) or OTHER_EXPORT_RE.search(source):
+            source = bundle_js_modules(paths[0])
+        return minify_js(source).encode('utf-8')
+
+    if name.endswith('.css'):
+        source = ''
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                source += f.read() + '\n'
+        return minify_css(source).encode('utf-8')
+
+    raise BuildError(f'{name}: unsupported bundle type')
+
+
+def write_asset(relative_path, content):
+    """Write an asset and its precompressed siblings under DIST_DIR"""
+    path = os.path.join(DIST_DIR, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    # mtime=0 keeps the .gz output reproducible between builds
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=11))
+
+
+def remove_stale_files(keep):
+    """Delete built files that no kept manifest refers to"""
+    for dirpath, _, filenames in os.walk(DIST_DIR):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relative = os.path.relpath(path, DIST_DIR).replace(os.sep, '/')
+            if relative == 'manifest.json':
+                continue
+            base = re.sub(r'\.(gz|br)$', '', relative)
+            if base not in keep:
+                os.remove(path)
+
+
+def build(verbose=True):
+    """Build all bundles and write the manifest
+
+    Returns:
+        The new manifest
+    """
+    with open(BUNDLES_FILE, encoding='utf-8') as f:
+        bundles = json.load(f)
+
+    previous = {}
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    assets = {}
+    for name, sources in bundles.items():
+        content = build_bundle(name, sources)
+        digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        stem, ext = os.path.splitext(name)
+        hashed = f'{stem}.{digest}{ext}'
+        write_asset(hashed, content)
+        assets[name] = hashed
+        if verbose:
+            print(f'{name} -> dist/{hashed} ({len(content)} bytes)')
+
+    # Keep the previous build's files so pages rendered before a deploy can
+    # still load their assets
+    previous_assets = previous.get('assets', {})
+    if previous_assets == assets:
+        previous_assets = previous.get('previous', {})
+    manifest = {'assets': assets, 'previous': previous_assets}
+    remove_stale_files(set(assets.values()) | set(previous_assets.values()))
+
+    tmp_path = MANIFEST_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+    if verbose and brotli is None:
+        print('brotli module not installed, skipped .br files')
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only report errors')
+    args = parser.parse_args()
+    try:
+        build(verbose=not args.quiet)
+    except (BuildError, OSError, ValueError) as e:
+        print(f'Asset build failed: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())